@@ -19,47 +19,33 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # Rename table from 'project' to 'projects' if it doesn't exist
+    # All steps are conditional and run in order inside a single DO block,
+    # so the whole upgrade is one client/server round-trip.
     op.execute("""
         DO $$ 
         BEGIN
+            -- Rename table from 'project' to 'projects' if it doesn't exist
             IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'project')
                AND NOT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'projects')
             THEN
                 ALTER TABLE project RENAME TO projects;
             END IF;
-        END $$;
-    """)
-    
-    # Add color column if it doesn't exist
-    op.execute("""
-        DO $$ 
-        BEGIN
+
+            -- Add color column if it doesn't exist
             IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
                           WHERE table_name = 'projects' AND column_name = 'color')
             THEN
                 ALTER TABLE projects ADD COLUMN color VARCHAR NOT NULL DEFAULT '#7c3aed';
             END IF;
-        END $$;
-    """)
-    
-    # Add icon column if it doesn't exist
-    op.execute("""
-        DO $$ 
-        BEGIN
+
+            -- Add icon column if it doesn't exist
             IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
                           WHERE table_name = 'projects' AND column_name = 'icon')
             THEN
                 ALTER TABLE projects ADD COLUMN icon VARCHAR NOT NULL DEFAULT '📁';
             END IF;
-        END $$;
-    """)
-    
-    # Update foreign key constraint
-    op.execute("""
-        DO $$ 
-        BEGIN
-            -- Drop old constraint if exists
+
+            -- Update foreign key constraint: drop old constraint if exists
             IF EXISTS (SELECT 1 FROM information_schema.table_constraints 
                       WHERE constraint_name = 'chatsession_project_id_fkey'
                       AND table_name = 'chatsession')
@@ -75,12 +61,12 @@ def upgrade() -> None:
                 ALTER TABLE chatsession ADD CONSTRAINT chatsession_project_id_fkey 
                     FOREIGN KEY (project_id) REFERENCES projects(id);
             END IF;
+
+            -- Update existing rows with null values to have defaults
+            UPDATE projects SET color = COALESCE(color, '#7c3aed'), icon = COALESCE(icon, '📁')
+            WHERE color IS NULL OR icon IS NULL;
         END $$;
     """)
-    
-    # Update existing rows with null values to have defaults
-    op.execute("UPDATE projects SET color = '#7c3aed' WHERE color IS NULL;")
-    op.execute("UPDATE projects SET icon = '📁' WHERE icon IS NULL;")
 
 
 def downgrade() -> None:
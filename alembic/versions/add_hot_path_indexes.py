@@ -0,0 +1,33 @@
+"""Index the columns chat history queries filter and sort on
+
+Revision ID: hot_path_indexes
+Revises: update_nulls
+Create Date: 2026-10-15
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'hot_path_indexes'
+down_revision = 'update_nulls'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create the indexes declared on ChatSession and ChatMessage."""
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_chatmessage_session_id_created_at
+            ON chatmessage (session_id, created_at);
+        CREATE INDEX IF NOT EXISTS ix_chatsession_project_id ON chatsession (project_id);
+        CREATE INDEX IF NOT EXISTS ix_chatsession_created_at ON chatsession (created_at);
+    """)
+
+
+def downgrade():
+    """Drop the indexes."""
+    op.execute("""
+        DROP INDEX IF EXISTS ix_chatmessage_session_id_created_at;
+        DROP INDEX IF EXISTS ix_chatsession_project_id;
+        DROP INDEX IF EXISTS ix_chatsession_created_at;
+    """)
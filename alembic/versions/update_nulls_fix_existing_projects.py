@@ -16,8 +16,10 @@ depends_on = None
 
 def upgrade():
     """Update existing null values with defaults."""
-    op.execute("UPDATE projects SET color = '#7c3aed' WHERE color IS NULL;")
-    op.execute("UPDATE projects SET icon = '📁' WHERE icon IS NULL;")
+    op.execute(
+        "UPDATE projects SET color = COALESCE(color, '#7c3aed'), icon = COALESCE(icon, '📁') "
+        "WHERE color IS NULL OR icon IS NULL;"
+    )
     print("✅ Updated existing projects with default values")
 
 
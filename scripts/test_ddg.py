@@ -1,5 +1,5 @@
 from duckduckgo_search import DDGS
-import json
+import orjson
 
 def test_search():
     print("Testing DDGS...")
@@ -11,7 +11,7 @@ def test_search():
     try:
         results = list(ddgs.text(query, max_results=3))
         print(f"Found {len(results)} results:")
-        print(json.dumps(results, indent=2))
+        print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
     except Exception as e:
         print(f"Error: {e}")
 
@@ -19,14 +19,12 @@ async def main():
     engine = get_async_postgres_engine()
     async with engine.begin() as conn:
         result = await conn.execute(
-            text("UPDATE projects SET color = '#7c3aed' WHERE color IS NULL")
+            text(
+                "UPDATE projects SET color = COALESCE(color, '#7c3aed'), icon = COALESCE(icon, '📁') "
+                "WHERE color IS NULL OR icon IS NULL"
+            )
         )
-        print(f"✅ Updated {result.rowcount} projects with default color")
-        
-        result = await conn.execute(
-            text("UPDATE projects SET icon = '📁' WHERE icon IS NULL")
-        )
-        print(f"✅ Updated {result.rowcount} projects with default icon")
+        print(f"✅ Updated {result.rowcount} projects with default color/icon")
         
         # Verify
         result = await conn.execute(
@@ -37,6 +35,8 @@ async def main():
         for p in projects:
             print(f"  - {p[0]}: {p[2]} {p[1]}")
 
+    await engine.dispose()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,7 +1,7 @@
 from datetime import datetime
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 from typing import List, Optional
 from src.core.agents.coordinator import coordinator
 from src.core.agents.enhanced_coordinator import enhanced_coordinator  # With web search
@@ -10,7 +10,16 @@ from src.core.memory.manager import memory_manager
 from src.core.memory.models import ChatSession, Project
 from src.core.agents.project_manager import project_summarizer
 from src.core.agents.title_generator import title_generator
+from src.core.memory.user_profile import user_profile_manager
+from src.core.llm.ollama_client import get_llm
+from src.core.agents.scraper_agent import close_scraper_agent
+from src.core.database.qdrant import close_qdrant
+from src.core.config import settings
 from pydantic import BaseModel
+import logging
+import orjson
+
+logging.basicConfig(level=settings.LOG_LEVEL)
 
 app = FastAPI(title="Mask Agent API", version="1.0.0")
 
@@ -48,10 +57,19 @@ class MessageResponse(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     tool_registry.initialize()
+    user_profile_manager.start_worker()
+    llm = await get_llm()
+    await llm.warmup()
     # Tables are now managed by Alembic migrations
     # Run: alembic upgrade head
     # memory_manager.create_tables()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await user_profile_manager.stop_worker()
+    await close_scraper_agent()
+    await close_qdrant()
+
 # --- Projects ---
 @app.post("/api/projects", response_model=Project)
 async def create_project(request: CreateProjectRequest):
@@ -116,21 +134,31 @@ async def generate_session_title(session_id: str, first_message: str = Body(...,
 
 @app.get("/api/sessions/{session_id}/messages", response_model=List[MessageResponse])
 async def get_session_messages(session_id: str):
+    # Polled by the UI: serialize rows directly instead of validating each
+    # one through MessageResponse (the schema stays for the OpenAPI docs)
     messages = memory_manager.get_messages(session_id)
-    return messages
+    return Response(orjson.dumps([
+        {
+            "id": m.id,
+            "role": m.role,
+            "content": m.content,
+            "created_at": m.created_at,
+            "session_id": m.session_id,
+        }
+        for m in messages
+    ]), media_type="application/json")
 
 @app.post("/api/chat")
 async def chat_endpoint(request: ChatRequest):
     """Stream chat responses with web search capabilities using Server-Sent Events (SSE)."""
     async def generate():
-        import json
         async for event in enhanced_coordinator.run_stream(request.session_id, request.message):
             # Event is a dictionary: {"type": "status"|"token", "content": ...}
-            # SSE format: data: <json>\n\n
-            yield f"data: {json.dumps(event)}\n\n"
+            # SSE format: data: <json>\n\n (encoded once per token, so use orjson)
+            yield b"data: " + orjson.dumps(event) + b"\n\n"
         
         # Signal end of stream
-        yield "data: [DONE]\n\n"
+        yield b"data: [DONE]\n\n"
     
     return StreamingResponse(generate(), media_type="text/event-stream")
 
@@ -41,7 +41,7 @@ def check_health():
 @app.command()
 def chat():
     """Starts an interactive chat session with the Coordinator Agent."""
-    tool_registry.initialize()
+    tool_registry.initialize_cached()
     console.print("[bold yellow]Starting Multi-Agent Framework...[/bold yellow]")
     console.print(f"Loaded tools: {[t['name'] for t in tool_registry.list_tools()]}")
     console.print("[bold green]Chat started. Type 'exit' to quit.[/bold green]")
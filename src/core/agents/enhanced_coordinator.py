@@ -1,13 +1,14 @@
 """New coordinator with LangGraph workflow integration."""
 
-from typing import AsyncGenerator, List
+import asyncio
+from typing import AsyncGenerator, List, Optional
 from src.core.graph.workflow import get_workflow
 from src.core.memory.manager import memory_manager
 from src.core.llm.ollama_client import get_llm
 from src.core.agents.summarizer import summarizer
 from src.core.config import settings
 from src.core.memory.user_profile import user_profile_manager
-import asyncio
+from src.core.cache.semantic_cache import context_key, semantic_cache, split_chunks
 
 
 class EnhancedCoordinator:
@@ -26,21 +27,27 @@ class EnhancedCoordinator:
         Yields:
             Response chunks
         """
+        # The query embedding only depends on the input: overlap it with the DB reads
+        embed_task = None
+        if settings.SEMANTIC_CACHE_ENABLED:
+            embed_task = asyncio.create_task(semantic_cache.embed(user_input))
+
         # 1. Retrieve history & Project Context
-        session = memory_manager.get_session(session_id)
+        session, cached_history = await asyncio.gather(
+            memory_manager.get_session_async(session_id),
+            memory_manager.get_history_async(session_id),
+        )
         project_context = ""
 
         if session and session.project_id:
-            project = memory_manager.get_project(session.project_id)
+            project = await memory_manager.get_project_async(session.project_id)
             if project and project.context_summary:
                 project_context = f"\n\nPROJECT CONTEXT (Summary of other related chats):\n{project.context_summary}\n"
 
-        db_messages = memory_manager.get_messages(session_id)
-        history = [{"role": m.role, "content": m.content} for m in db_messages]
+        history = list(cached_history)
 
         # 2. Check token count & Summarize if needed
-        full_text = "".join([m["content"] for m in history])
-        approx_tokens = len(full_text) / 4
+        approx_tokens = sum(len(m["content"]) for m in history) / 4
 
         if approx_tokens > settings.MAX_HISTORY_TOKENS:
             print("[EnhancedCoordinator] History too long. Summarizing...")
@@ -49,7 +56,7 @@ class EnhancedCoordinator:
             new_history = [
                 {"role": "system", "content": f"Previous conversation summary: {summary}"}
             ]
-            memory_manager.update_messages(session_id, new_history)
+            await memory_manager.update_messages_async(session_id, new_history)
             history = new_history
 
         if project_context:
@@ -61,23 +68,62 @@ class EnhancedCoordinator:
             profile_prompt = f"\n\nUSER PROFILE (WHO.md - Always strictly follow this context about the user):\n{user_profile_content}\n"
             history.insert(0, {"role": "system", "content": profile_prompt})
 
-            # Trigger background update of profile based on the NEW user input
-            # We use asyncio.create_task to run it without blocking the stream
-            asyncio.create_task(user_profile_manager.update_profile(user_input))
+            # Queue a background update of the profile based on the NEW user input
+            # A single worker drains the queue so it never blocks the stream
+            user_profile_manager.enqueue_update(user_input)
         except Exception as e:
             print(f"[EnhancedCoordinator] Failed to process user profile: {e}")
 
         # 3. Add user message to memory
+        # Written before the workflow runs, so an interrupted turn keeps it
         await memory_manager.add_message_async(session_id, "user", user_input)
+
+        # This request's answer; saved even if the client disconnects mid-stream
+        reply: List[str] = []
+        try:
+            async for event in self._respond(session, session_id, user_input, history, embed_task, reply):
+                yield event
+        finally:
+            if reply:
+                await memory_manager.add_message_async(session_id, "assistant", reply[0])
+
+    async def _respond(
+        self,
+        session,
+        session_id: str,
+        user_input: str,
+        history: List[dict],
+        embed_task: Optional[asyncio.Task],
+        reply: List[str],
+    ) -> AsyncGenerator[dict, None]:
+        """Produce the answer (cache or workflow) and append it to reply for persistence."""
         # Note: History already has the user input if we appended it? No, history comes from DB which doesn't have it yet.
         # Check line 36-50. History is built from DB.
         # So we need to append current user input to history for the workflow.
+        # Cached answers are only reused after the same preceding exchange
+        cache_context = context_key(history)
         history.append({"role": "user", "content": user_input})
 
-        # 4. Run LangGraph workflow with streaming
+        # 4. Semantic cache: replay the answer to a near-duplicate query
+        cache_namespace = (session.project_id if session else None) or session_id
+        query_embedding = []
+        if embed_task is not None:
+            query_embedding = await embed_task
+            cached_response = await semantic_cache.lookup(query_embedding, cache_namespace, cache_context)
+            if cached_response:
+                print("[EnhancedCoordinator] Semantic cache hit")
+                for piece in split_chunks(cached_response):
+                    yield {"type": "token", "content": piece}
+                reply.append(cached_response)
+                return
+
+        # 5. Run LangGraph workflow with streaming
         print(f"[EnhancedCoordinator] Running workflow for: {user_input[:50]}...")
 
-        final_response_accumulator = ""
+        # Streamed pieces, joined once at the end (repeated += re-copies the
+        # whole answer on every token)
+        response_chunks = []
+        workflow_failed = False
 
         try:
             # Stream workflow updates
@@ -108,25 +154,29 @@ class EnhancedCoordinator:
                                 content = chunk.get("message", {}).get("content", "")
                                 if content:
                                     yield {"type": "token", "content": content}
-                                    final_response_accumulator += content
+                                    response_chunks.append(content)
                                     
                         # Fallback for non-streaming (if ever used)
                         elif node_state.get("final_response"):
                             response = node_state.get("final_response", "")
                             yield {"type": "token", "content": response}
-                            final_response_accumulator = response
+                            response_chunks = [response]
         except Exception as e:
             import traceback
             print(f"[EnhancedCoordinator] Error in workflow stream: {e}")
             traceback.print_exc()
+            workflow_failed = True
             yield {"type": "token", "content": f"\n[Error] Something went wrong: {str(e)}"}
 
-        # 5. Save assistant message to memory
-
-        # 5. Save assistant message to memory
+        # 6. Save assistant message to memory
         # Use the accumulated response from the stream instead of re-running
+        final_response_accumulator = "".join(response_chunks)
         if final_response_accumulator:
-            await memory_manager.add_message_async(session_id, "assistant", final_response_accumulator)
+            reply.append(final_response_accumulator)
+            if query_embedding and not workflow_failed:
+                await semantic_cache.store(
+                    query_embedding, cache_namespace, user_input, final_response_accumulator, cache_context
+                )
         else:
              print("[EnhancedCoordinator] Warning: No response generated to persist.")
 
@@ -1,10 +1,133 @@
 """Scraper Agent - Scrapes and extracts content from web pages."""
 
+import asyncio
+import hashlib
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Optional
+from urllib.parse import SplitResult, urldefrag, urljoin, urlsplit
 from pydantic import BaseModel
-import httpx
-from bs4 import BeautifulSoup
+import aiohttp
+import lxml.etree
+import lxml.html
 from src.core.llm.ollama_client import get_llm
+from src.core.cache.ttl_cache import TTLCache
+from src.core.config import settings
+
+
+# Download/parse at most this much HTML, and keep at most this much extracted text
+MAX_HTML_BYTES = 512 * 1024
+MAX_CONTENT_CHARS = 20000
+_READ_CHUNK_SIZE = 64 * 1024
+# Pages fetched in parallel by crawl()
+CRAWL_CONCURRENCY = 8
+# Redirect hops followed per fetch; loops fail fast instead of using up the timeout
+MAX_REDIRECTS = 5
+# How long ETag/Last-Modified validators are kept for conditional re-fetches
+VALIDATOR_TTL = 24 * 3600
+# Parsing is CPU-bound and holds the GIL, so it runs in worker processes
+_parse_pool: Optional[ProcessPoolExecutor] = None
+# Workers start from a clean interpreter rather than a fork of this process,
+# which would copy its event loop, sockets and driver threads
+_PARSE_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_HTML_CONTENT_TYPES = ("text/html", "application/xhtml")
+# Links to these are never HTML, so they are dropped before anything is fetched
+_NON_HTML_EXTENSIONS = (
+    ".pdf", ".zip", ".gz", ".tar", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp",
+    ".ico", ".mp3", ".mp4", ".webm", ".css", ".js", ".json", ".xml", ".csv",
+)
+
+# Compiled once; lxml evaluates these in C instead of walking a Python tree
+_LINK_XPATH = lxml.etree.XPath("//a/@href")
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# Main-content candidates, highest priority first
+_CONTENT_CANDIDATES = (
+    "self::main",
+    "self::article",
+    "@role='main'",
+    _has_class('main-content'),
+    "@id='content'",
+    _has_class('content'),
+    _has_class('documentation'),
+    "self::body",
+)
+# One walk over the tree collects every candidate (in document order) ...
+_CONTENT_XPATH = lxml.etree.XPath(
+    "//*[" + " or ".join(f"({cond})" for cond in _CONTENT_CANDIDATES) + "]"
+)
+# ... and these (cheap, single-node) checks rank them
+_CANDIDATE_CHECKS = [lxml.etree.XPath(f"boolean({cond})") for cond in _CONTENT_CANDIDATES]
+
+
+def _find_main_content(tree):
+    """Return the highest-priority content element (first in document order on ties)."""
+    best, best_rank = None, len(_CANDIDATE_CHECKS)
+    for el in _CONTENT_XPATH(tree):
+        for rank, check in enumerate(_CANDIDATE_CHECKS[:best_rank]):
+            if check(el):
+                best, best_rank = el, rank
+                break
+        if best_rank == 0:
+            break
+    return best
+
+_STRIPPED_TAGS = ('script', 'style', 'nav', 'footer', 'aside', 'iframe', 'noscript')
+
+# Elements that sit on their own line(s) when flattening to text
+_BLOCK_TAGS = (
+    'p', 'div', 'section', 'br', 'li', 'tr', 'pre', 'blockquote',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'table', 'ul', 'ol', 'dd', 'dt'
+)
+
+# Any whitespace run containing a line break: trims line ends/starts and drops blank lines
+_LINE_BREAKS = re.compile(r"\s*\n\s*")
+
+# Markdown-style line prefixes, so the LLM still sees the page structure
+_LINE_PREFIXES = {
+    'h1': '# ', 'h2': '## ', 'h3': '### ', 'h4': '#### ', 'h5': '##### ', 'h6': '###### ',
+    'li': '- ',
+}
+
+
+def _element_to_text(element, limit: int) -> tuple[str, bool]:
+    """Flatten an lxml element to text with heading/list prefixes (mutates the tree).
+
+    Stops once more than `limit` characters have been collected; the flag
+    tells whether text was left out.
+    """
+    for el in element.iter(*_BLOCK_TAGS):
+        el.text = "\n" + _LINE_PREFIXES.get(el.tag, "") + (el.text or "")
+        el.tail = "\n" + (el.tail or "")
+
+    parts = []
+    total = 0
+    for piece in element.itertext():
+        parts.append(piece)
+        total += len(piece)
+        if total > limit:
+            return "".join(parts), True
+    return "".join(parts), False
+
+
+def _canonical_url(url: str) -> SplitResult:
+    """Canonical form of an absolute URL, used only as a dedup key.
+
+    Scheme and host are lower-cased and the fragment and any trailing slash
+    dropped, so different spellings of one page share a key. Never fetch
+    it: the trailing slash changes how the page's relative links resolve.
+    """
+    parts = urlsplit(url)
+    return SplitResult(parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/') or '/', parts.query, '')
+
+
+def _url_digest(url: str) -> bytes:
+    """Fixed-size crawl dedup key, so long URLs aren't held in memory."""
+    return hashlib.blake2b(url.encode(), digest_size=16).digest()
 
 
 class ScrapedContent(BaseModel):
@@ -16,6 +139,95 @@ class ScrapedContent(BaseModel):
     error: Optional[str] = None
 
 
+def _parse_html(text: str, url: str, truncated: bool, base_url: Optional[str] = None) -> ScrapedContent:
+    """Parse a downloaded page into title, text and same-site links.
+
+    Pure and CPU-bound, so it runs in the parse pool; `truncated` tells
+    whether the download stopped at the byte budget. Links are resolved
+    against `base_url` (the final URL after redirects), defaulting to `url`.
+    """
+    try:
+        try:
+            tree = lxml.html.fromstring(text)
+        except ValueError:
+            # Unicode input with an XML encoding declaration: let lxml decode bytes
+            tree = lxml.html.fromstring(text.encode("utf-8"))
+    except lxml.etree.ParserError:
+        return ScrapedContent(
+            url=url,
+            title="Error",
+            content="",
+            error="Could not find content"
+        )
+
+    # Extract title
+    title = (tree.findtext('.//title') or "").strip() or url
+
+    # Extract links BEFORE stripping tags
+    base_url = base_url or url
+    base_domain = urlsplit(base_url).netloc.lower()
+    # canonical form -> first resolved spelling; the latter is what gets fetched
+    links = {}
+    for href in _LINK_XPATH(tree):
+        resolved = urldefrag(urljoin(base_url, href)).url
+        key = _canonical_url(resolved)
+        # Keep only internal HTML links
+        if (
+            key.netloc == base_domain
+            and key.scheme in ('http', 'https')
+            and not key.path.lower().endswith(_NON_HTML_EXTENSIONS)
+        ):
+            links.setdefault(key.geturl(), resolved)
+
+    # Remove unnecessary tags (their tail text belongs to the parent)
+    lxml.etree.strip_elements(tree, *_STRIPPED_TAGS, with_tail=False)
+
+    # Find main content
+    main_content = _find_main_content(tree)
+
+    if main_content is None:
+        return ScrapedContent(
+            url=url,
+            title=title,
+            content="",
+            error="Could not find content"
+        )
+
+    # Flatten to Markdown-ish text (headings and list items keep their markers),
+    # stopping once the content budget is used up
+    page_text, text_cut = _element_to_text(main_content, MAX_CONTENT_CHARS)
+
+    # Clean up whitespace
+    clean_text = _LINE_BREAKS.sub("\n", page_text).strip()
+
+    # Truncate if too long
+    if truncated or text_cut or len(clean_text) > MAX_CONTENT_CHARS:
+        clean_text = clean_text[:MAX_CONTENT_CHARS] + "...[truncated]"
+
+    return ScrapedContent(
+        url=url,
+        title=title,
+        content=clean_text,
+        links=list(links.values())
+    )
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Worker processes for _parse_html, started on first use (one per CPU)."""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context(_PARSE_START_METHOD))
+    return _parse_pool
+
+
+def _discard_parse_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next _get_parse_pool() call starts a fresh one."""
+    global _parse_pool
+    if _parse_pool is pool:
+        _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
 class ScraperAgent:
     """Agent that scrapes web content and extracts relevant information."""
 
@@ -26,6 +238,30 @@ class ScraperAgent:
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
             "Accept-Language": "en-US,en;q=0.9,it;q=0.8"
         }
+        # Successfully scraped pages, keyed by URL
+        self.cache = TTLCache(maxsize=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL)
+        # (etag, last_modified, result) per URL, kept past the cache TTL so an
+        # expired page is revalidated and a 304 skips the download and parse
+        self.validators = TTLCache(maxsize=settings.SEARCH_CACHE_SIZE, ttl=VALIDATOR_TTL)
+        # Shared HTTP session, created on first use (it must be built inside the
+        # event loop) so sockets and DNS lookups are reused across scrapes
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=32, limit_per_host=8, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.headers
+            )
+        return self._session
+
+    async def aclose(self):
+        """Close the shared HTTP session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     async def scrape_url(self, url: str) -> ScrapedContent:
         """Scrape content from a single URL.
@@ -36,13 +272,57 @@ class ScraperAgent:
         Returns:
             Scraped content or error
         """
+        cached = self.cache.get(url)
+        if cached is not None:
+            return cached
+
+        validator = self.validators.get(url)
+        conditional_headers = {}
+        if validator is not None:
+            etag, last_modified, _ = validator
+            if etag:
+                conditional_headers["If-None-Match"] = etag
+            if last_modified:
+                conditional_headers["If-Modified-Since"] = last_modified
+
         text = ""
         try:
-            # print(f"DEBUG: httpx.AsyncClient is {httpx.AsyncClient}")
-            async with httpx.AsyncClient(timeout=self.timeout, headers=self.headers, follow_redirects=True) as client:
-                response = await client.get(url)
+            async with self._get_session().get(
+                url,
+                allow_redirects=True,
+                max_redirects=MAX_REDIRECTS,
+                headers=conditional_headers
+            ) as response:
+                if response.status == 304 and validator is not None:
+                    result = validator[2]
+                    self.cache.set(url, result)
+                    return result
+
                 response.raise_for_status()
-                text = response.text
+
+                content_type = response.headers.get("Content-Type", "").lower()
+                if content_type and not content_type.startswith(_HTML_CONTENT_TYPES):
+                    return ScrapedContent(
+                        url=url,
+                        title="Error",
+                        content="",
+                        error=f"Unsupported content type: {content_type.split(';')[0]}"
+                    )
+
+                # Stream the body and stop at the byte budget: memory per page is
+                # bounded and the rest of an oversized response is never downloaded
+                buf = bytearray()
+                truncated = False
+                async for chunk in response.content.iter_chunked(_READ_CHUNK_SIZE):
+                    buf.extend(chunk)
+                    if len(buf) > MAX_HTML_BYTES:
+                        del buf[MAX_HTML_BYTES:]
+                        truncated = True
+                        break
+                text = buf.decode(response.charset or "utf-8", errors="replace")
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                final_url = str(response.url)
 
             if not text:
                  return ScrapedContent(
@@ -52,72 +332,37 @@ class ScraperAgent:
                     error="No content received"
                 )
 
-            # Parse HTML
-            soup = BeautifulSoup(text, 'lxml')
-
-            # Extract title
-            title = soup.title.string if soup.title else url
-            
-            # Extract links BEFORE decomposing tags
-            from urllib.parse import urljoin, urlparse
-            base_domain = urlparse(url).netloc
-            links = set()
-            for a in soup.find_all('a', href=True):
-                href = a['href']
-                full_url = urljoin(url, href)
-                parsed = urlparse(full_url)
-                # Keep only internal links and ignore fragments/queries for simplicity
-                if parsed.netloc == base_domain and parsed.scheme in ('http', 'https'):
-                    links.add(full_url.split('#')[0])
-
-            # Remove unnecessary tags
-            for tag in soup(['script', 'style', 'nav', 'footer', 'aside', 'iframe', 'noscript']):
-                tag.decompose()
-
-            # Find main content
-            main_content = None
-            for selector in ['main', 'article', '[role="main"]', '.main-content', '#content', '.content', '.documentation', 'body']:
-                main_content = soup.select_one(selector)
-                if main_content:
-                    break
-            
-            if not main_content:
-                main_content = soup.body
-
-            if not main_content:
-                return ScrapedContent(
-                    url=url,
-                    title=title,
-                    content="",
-                    error="Could not find content"
-                )
-
-            # Convert to Markdown using markdownify
-            from markdownify import markdownify
-            markdown_text = markdownify(str(main_content), heading_style="ATX", strip=['a', 'img']) # Strip links/imgs for cleaner pure text
-            
-            # Clean up whitespace
-            clean_text = "\n".join([line.strip() for line in markdown_text.splitlines() if line.strip()])
-
-            # Truncate if too long
-            if len(clean_text) > 20000:
-                clean_text = clean_text[:20000] + "...[truncated]"
-
+            # Parse off the event loop so other fetches keep progressing
+            loop = asyncio.get_running_loop()
+            pool = _get_parse_pool()
+            try:
+                result = await loop.run_in_executor(pool, _parse_html, text, url, truncated, final_url)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); replace the pool once and retry
+                _discard_parse_pool(pool)
+                result = await loop.run_in_executor(_get_parse_pool(), _parse_html, text, url, truncated, final_url)
+            if result.error:
+                return result
+            self.cache.set(url, result)
+            if etag or last_modified:
+                self.validators.set(url, (etag, last_modified, result))
+            return result
+
+        except aiohttp.TooManyRedirects:
             return ScrapedContent(
                 url=url,
-                title=title, # .strip() might be good
-                content=clean_text,
-                links=list(links)
+                title="Error",
+                content="",
+                error="Too many redirects"
             )
-
-        except httpx.HTTPStatusError as e:
+        except aiohttp.ClientResponseError as e:
             return ScrapedContent(
                 url=url,
                 title="Error",
                 content="",
-                error=f"HTTP {e.response.status_code}"
+                error=f"HTTP {e.status}"
             )
-        except httpx.TimeoutException:
+        except asyncio.TimeoutError:
             return ScrapedContent(
                 url=url,
                 title="Error",
@@ -143,68 +388,72 @@ class ScraperAgent:
         Returns:
             List of scraped content from visited pages
         """
-        from urllib.parse import urlparse, urljoin
-        import asyncio
-
-        visited_urls = set()
-        queue = [(start_url, 0)] # (url, depth)
+        # Digests of every URL ever queued: 16 bytes per entry however long
+        # the URL, and each URL enters the frontier at most once
+        seen_urls = {_url_digest(_canonical_url(start_url).geturl())}
         results = []
-        
-        domain = urlparse(start_url).netloc
-
-        while queue and len(results) < max_pages:
-            # Get next specific number of URLs to process concurrently
-            # For simplicity, we process one batch (level) at a time or just pop?
-            # Let's simple pop one for now, or batch properly. 
-            # To go fast, let's grab up to 3 compatible tasks
-            
-            batch = []
-            while queue and len(batch) < 3 and len(results) + len(batch) < max_pages:
-                url, depth = queue.pop(0)
-                if url in visited_urls:
-                    continue
-                visited_urls.add(url)
-                batch.append((url, depth))
-
-            if not batch:
-                break
-
-            # Scrape batch concurrently
-            tasks = [self.scrape_url(url) for url, _ in batch]
-            scraped_items = await asyncio.gather(*tasks, return_exceptions=True)
-
-            for i, item in enumerate(scraped_items):
-                url, depth = batch[i]
-                
-                if isinstance(item, Exception):
-                    print(f"Error crawling {url}: {item}")
-                    continue
-                
-                if item.error:
-                     print(f"Skipping {url}: {item.error}")
-                     continue
-
-                results.append(item)
-                print(f"✅ Crawled: {item.title} ({url})")
-
-                # If we haven't reached max depth, find links
-                if depth < max_depth:
+        frontier: asyncio.Queue = asyncio.Queue()  # (url, depth)
+        frontier.put_nowait((start_url, 0))
+
+        # Result slots: a worker reserves one before fetching, so concurrent
+        # fetches never overshoot max_pages; failed fetches hand theirs back
+        slots = asyncio.Condition()
+        in_flight = 0
+
+        async def worker():
+            nonlocal in_flight
+            while True:
+                url, depth = await frontier.get()
+                try:
+                    async with slots:
+                        await slots.wait_for(lambda: len(results) + in_flight < max_pages or len(results) >= max_pages)
+                        if len(results) >= max_pages:
+                            continue
+                        in_flight += 1
+
+                    item = None
                     try:
-                        # Add new links to queue
-                        new_links = item.links
-                        for link in new_links:
-                            if link not in visited_urls:
-                                # Prioritize shorter URLs (likely higher in hierarchy) or just append
-                                queue.append((link, depth + 1))
-                                
+                        item = await self.scrape_url(url)
                     except Exception as e:
-                       print(f"Error extracting links from {url}: {e}")
+                        print(f"Error crawling {url}: {e}")
+                    finally:
+                        async with slots:
+                            in_flight -= 1
+                            if item is not None and not item.error:
+                                results.append(item)
+                            slots.notify_all()
+
+                    if item is None:
+                        continue
+                    if item.error:
+                        print(f"Skipping {url}: {item.error}")
+                        continue
+
+                    print(f"✅ Crawled: {item.title} ({url})")
+
+                    # If we haven't reached max depth (or the page budget), queue
+                    # the page's links
+                    if depth < max_depth and len(results) < max_pages:
+                        for link in item.links:
+                            key = _url_digest(_canonical_url(link).geturl())
+                            if key not in seen_urls:
+                                seen_urls.add(key)
+                                frontier.put_nowait((link, depth + 1))
+                finally:
+                    frontier.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(max_pages, CRAWL_CONCURRENCY))]
+        try:
+            await frontier.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
 
         return results
 
     async def scrape_multiple(self, urls: List[str], max_urls: int = 3) -> List[ScrapedContent]:
         # Legacy support wrapper
-        import asyncio
         tasks = [self.scrape_url(url) for url in urls[:max_urls]]
         return await asyncio.gather(*tasks)
 
@@ -252,6 +501,48 @@ Relevant summary:"""
             # Return truncated raw content as fallback
             return scraped.content[:1000]
 
+    async def extract_relevant_content_many(
+        self,
+        pages: List[ScrapedContent],
+        query: str,
+        timeout: float = settings.SCRAPER_EXTRACT_TIMEOUT
+    ) -> List[str]:
+        """Run extract_relevant_content over several pages concurrently.
+
+        Ollama batches up to OLLAMA_NUM_PARALLEL requests together and queues
+        the rest, so at most that many are in flight; queued requests would
+        otherwise spend their client timeout waiting. Each extraction gets
+        `timeout` seconds once it starts, so one huge page can't hold up the
+        others.
+
+        Args:
+            pages: Scraped pages
+            query: Original user query
+            timeout: Seconds allowed per extraction
+
+        Returns:
+            Relevant summaries, in the same order as `pages` ("" for a page
+            whose extraction failed)
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.OLLAMA_NUM_PARALLEL))
+
+        async def extract(page: ScrapedContent) -> str:
+            async with semaphore:
+                return await asyncio.wait_for(self.extract_relevant_content(page, query), timeout)
+
+        results = await asyncio.gather(*(extract(page) for page in pages), return_exceptions=True)
+
+        summaries = []
+        for page, result in zip(pages, results):
+            if isinstance(result, asyncio.TimeoutError):
+                print(f"Extraction from {page.url} timed out after {timeout}s, skipping")
+                result = ""
+            elif isinstance(result, Exception):
+                print(f"Error extracting relevant content from {page.url}: {result}")
+                result = ""
+            summaries.append(result)
+        return summaries
+
 # Singleton instance
 _scraper_agent = None
 
@@ -261,3 +552,13 @@ async def get_scraper_agent() -> ScraperAgent:
     if _scraper_agent is None:
         _scraper_agent = ScraperAgent()
     return _scraper_agent
+
+
+async def close_scraper_agent():
+    """Release the singleton's HTTP connections and parse workers (app shutdown)."""
+    global _parse_pool
+    if _scraper_agent is not None:
+        await _scraper_agent.aclose()
+    if _parse_pool is not None:
+        _parse_pool.shutdown(cancel_futures=True)
+        _parse_pool = None
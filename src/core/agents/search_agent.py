@@ -1,9 +1,31 @@
 """Search Agent - Performs web searches when information is needed."""
 
+import asyncio
+import random
 from typing import List, Optional
 from pydantic import BaseModel
 from ddgs import DDGS
+from ddgs.exceptions import RatelimitException
 from src.core.llm.ollama_client import get_llm
+from src.core.cache.ttl_cache import TTLCache
+from src.core.config import settings
+
+
+# Retries on DuckDuckGo rate limiting, with exponential backoff plus jitter
+SEARCH_MAX_RETRIES = 3
+SEARCH_BACKOFF_BASE = 1.0
+
+# One client for the whole process so the HTTP connection pool and cookies
+# survive across searches instead of being re-negotiated every time
+_ddgs: Optional[DDGS] = None
+
+
+def _get_ddgs() -> DDGS:
+    """Return the shared DDGS client, building it on first use (not at import)."""
+    global _ddgs
+    if _ddgs is None:
+        _ddgs = DDGS()
+    return _ddgs
 
 
 class SearchResult(BaseModel):
@@ -13,14 +35,26 @@ class SearchResult(BaseModel):
     snippet: str
     
 
+def normalize_query(query: str) -> str:
+    """Normalize a search query for cache lookups (case and whitespace)."""
+    return " ".join(query.lower().split())
+
+
 class SearchAgent:
     """Agent that performs web searches using DuckDuckGo."""
     
     def __init__(self):
-        self.ddgs = DDGS()
+        self.ddgs = _get_ddgs()
+        # Repeated queries skip the network and DuckDuckGo's rate limiter
+        self.cache = TTLCache(maxsize=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL)
+        # The search decision only depends on the query, so repeats skip the LLM
+        self.decision_cache = TTLCache(maxsize=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL)
     
     async def should_search(self, query: str, conversation_history: List[dict] = None) -> bool:
         """Determine if web search is needed using LLM.
+
+        Decisions are cached per normalized query. The cache never awaits, so
+        this is safe to run concurrently with extract_search_queries.
         
         Args:
             query: User's question
@@ -29,6 +63,11 @@ class SearchAgent:
         Returns:
             True if search is needed, False otherwise
         """
+        cache_key = normalize_query(query)
+        cached = self.decision_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         llm = await get_llm()
         
         prompt = f"""Analyze if this question requires current web information or if you can answer from general knowledge.
@@ -60,8 +99,9 @@ Answer (YES/NO):"""
             ])
             
             response = response_msg.get("content", "")
-            decision = response.strip().upper()
-            return "YES" in decision
+            decision = "YES" in response.strip().upper()
+            self.decision_cache.set(cache_key, decision)
+            return decision
         except Exception as e:
             print(f"Error in should_search: {e}")
             # Default to not searching on error
@@ -69,6 +109,9 @@ Answer (YES/NO):"""
     
     async def extract_search_queries(self, user_query: str) -> List[str]:
         """Generate optimal search queries from user question.
+
+        Mutates no agent state, so it is safe to run concurrently with
+        should_search.
         
         Args:
             user_query: Original user question
@@ -133,10 +176,15 @@ Search queries:"""
         Returns:
             List of search results
         """
+        cache_key = (normalize_query(query), max_results)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
         try:
             results = []
             # DuckDuckGo text search
-            ddg_results = self.ddgs.text(query, max_results=max_results)
+            ddg_results = await self._text_with_backoff(query, max_results)
             
             for result in ddg_results:
                 results.append(SearchResult(
@@ -145,11 +193,26 @@ Search queries:"""
                     snippet=result.get('body', result.get('snippet', ''))
                 ))
             
-            return results
+            if results:
+                self.cache.set(cache_key, results)
+            return list(results)
         except Exception as e:
             print(f"Error during search: {e}")
             return []
     
+    async def _text_with_backoff(self, query: str, max_results: int) -> list:
+        """Run a text search, backing off and retrying when rate limited."""
+        for attempt in range(SEARCH_MAX_RETRIES + 1):
+            try:
+                # ddgs is blocking I/O: keep it off the event loop
+                return await asyncio.to_thread(self.ddgs.text, query, max_results=max_results)
+            except RatelimitException:
+                if attempt == SEARCH_MAX_RETRIES:
+                    raise
+                delay = SEARCH_BACKOFF_BASE * (2 ** attempt) + random.uniform(0, SEARCH_BACKOFF_BASE)
+                print(f"Search rate limited, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
     async def search_multiple(self, queries: List[str], max_results_per_query: int = 3) -> List[SearchResult]:
         """Search multiple queries and combine results.
         
@@ -160,18 +223,23 @@ Search queries:"""
         Returns:
             Combined unique search results
         """
-        all_results = []
-        seen_urls = set()
+        # First result per URL, in insertion order
+        unique_results = {}
         
-        for query in queries:
-            results = await self.search(query, max_results_per_query)
+        # Queries run concurrently: wall time is the slowest query, not the sum
+        batches = await asyncio.gather(
+            *(self.search(query, max_results_per_query) for query in queries),
+            return_exceptions=True
+        )
+        for results in batches:
+            if isinstance(results, Exception):
+                print(f"Error during search: {results}")
+                continue
             for result in results:
                 # Deduplicate by URL
-                if result.url not in seen_urls:
-                    all_results.append(result)
-                    seen_urls.add(result.url)
+                unique_results.setdefault(result.url, result)
         
-        return all_results
+        return list(unique_results.values())
 
 
 # Singleton instance
@@ -10,9 +10,7 @@ Output ONLY the summary text.
     async def summarize(self, history: list[dict]) -> str:
         llm = await get_llm()
         
-        conversation_text = ""
-        for msg in history:
-            conversation_text += f"{msg['role']}: {msg['content']}\n"
+        conversation_text = "".join(f"{msg['role']}: {msg['content']}\n" for msg in history)
             
         prompt = f"Summarize the following conversation:\n\n{conversation_text}"
         
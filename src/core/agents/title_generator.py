@@ -1,10 +1,26 @@
+import hashlib
 from src.core.llm.ollama_client import get_llm
+from src.core.cache.ttl_cache import TTLCache
+from src.core.config import settings
 
 class TitleGenerator:
     """Generates concise chat titles from the first user message."""
+
+    def __init__(self):
+        # Keyed on a digest so long first messages aren't kept in memory
+        self.cache = TTLCache(maxsize=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL)
     
     async def generate_title(self, first_message: str) -> str:
-        """Generate a 3-5 word title from the first user message."""
+        """Generate a 3-5 word title from the first user message.
+
+        Titles are cached per message. The cache never awaits, so this is safe
+        to run concurrently with other LLM calls.
+        """
+        cache_key = hashlib.sha256(first_message.encode()).hexdigest()
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         llm = await get_llm()
         
         prompt = f"""Generate a concise, descriptive title (3-5 words maximum) for a chat conversation that starts with this message:
@@ -24,6 +40,8 @@ Return ONLY the title, nothing else. No quotes, no extra explanation."""
             # Fallback: truncate first message if LLM fails
             if not title or len(title) > 50:
                 title = first_message[:47] + "..." if len(first_message) > 50 else first_message
+            else:
+                self.cache.set(cache_key, title)
             
             return title
         except Exception as e:
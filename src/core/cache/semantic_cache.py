@@ -0,0 +1,119 @@
+"""Semantic cache - Reuses final responses for near-duplicate user queries."""
+
+import hashlib
+import time
+from typing import List, Optional
+from src.core.config import settings
+from src.core.llm.ollama_client import get_llm
+import src.core.database.qdrant as qdrant
+
+# Preceding messages a cached answer is tied to (the last exchange)
+CONTEXT_MESSAGES = 2
+
+
+class SemanticCache:
+    """Response cache keyed on the embedding of the user query.
+
+    Entries live in a dedicated Qdrant collection and are scoped by a
+    namespace (project or session id) so answers never leak across projects,
+    and by the conversation context they were given in, so a follow-up like
+    "and the second one?" never replays an answer from another thread.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "semantic_cache",
+        threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+        ttl: int = settings.SEMANTIC_CACHE_TTL,
+    ):
+        self.collection_name = collection_name
+        self.threshold = threshold
+        self.ttl = ttl
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed a user query. Returns an empty list on failure."""
+        try:
+            llm = await get_llm()
+            return await llm.embeddings(text, model=settings.OLLAMA_EMBEDDING_MODEL)
+        except Exception as e:
+            print(f"[SemanticCache] Embedding error: {e}")
+            return []
+
+    async def lookup(self, embedding: List[float], namespace: str, context: str = "") -> Optional[str]:
+        """Return the cached response closest to the embedding, if similar enough.
+
+        Args:
+            embedding: Query embedding
+            namespace: Cache scope (project or session id)
+            context: context_key() of the conversation the query was asked in
+
+        Returns:
+            Cached response or None on miss
+        """
+        if not embedding:
+            return None
+
+        # The namespace is filtered by Qdrant, so other projects' entries can't
+        # push this one's out of the top results
+        results = await qdrant.search_memory(
+            self.collection_name,
+            embedding,
+            limit=5,
+            score_threshold=self.threshold,
+            query_filter=qdrant.payload_filter(namespace=namespace, context=context)
+        )
+
+        now = time.time()
+        for res in results:
+            payload = res.payload
+            if payload.get("namespace") != namespace or payload.get("context") != context:
+                continue
+            if now - payload.get("timestamp", 0) > self.ttl:
+                continue
+            return payload.get("response")
+        return None
+
+    async def store(self, embedding: List[float], namespace: str, query: str, response: str, context: str = ""):
+        """Store a final response for later reuse."""
+        if not embedding or not response:
+            return
+
+        await qdrant.ensure_collection(self.collection_name, len(embedding))
+        await qdrant.store_memory(
+            self.collection_name,
+            query,
+            {"namespace": namespace, "context": context, "response": response},
+            embedding
+        )
+
+
+def context_key(history: List[dict]) -> str:
+    """Digest of the last conversation turns before a query ("" for a fresh conversation).
+
+    System messages (profile, project context, summaries) are left out.
+    """
+    turns = [m for m in history if m.get("role") in ("user", "assistant")][-CONTEXT_MESSAGES:]
+    if not turns:
+        return ""
+    digest = hashlib.sha1()
+    for message in turns:
+        digest.update(f"{message['role']}\0{message['content']}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def split_chunks(text: str, size: int = 40) -> List[str]:
+    """Split a cached response into stream-sized chunks, preferring word boundaries."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start, end)
+            if space > start:
+                end = space + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+semantic_cache = SemanticCache()
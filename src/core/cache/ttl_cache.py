@@ -0,0 +1,71 @@
+"""In-memory LRU cache with per-entry time-to-live."""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """LRU cache whose entries expire `ttl` seconds after being stored.
+
+    Reads and writes never await, so a single event loop can share an
+    instance without locking.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value, or `default` if missing or expired."""
+        item = self._lookup(key)
+        if item is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return item[1]
+
+    def _lookup(self, key: Hashable) -> Optional[tuple[float, Any]]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        if item[0] < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return item
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries if full."""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters of get() since creation."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
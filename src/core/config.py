@@ -7,26 +7,78 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
     POSTGRES_DB: str = "agents_db"
+    POSTGRES_POOL_SIZE: int = 20
+    POSTGRES_MAX_OVERFLOW: int = 10
 
     # Neo4j
     NEO4J_URI: str = "bolt://localhost:7687"
     NEO4J_USER: str = "neo4j"
     NEO4J_PASSWORD: str = "password"
+    NEO4J_POOL_SIZE: int = 50  # Bolt connections kept open and reused across sessions
+    NEO4J_ACQUISITION_TIMEOUT: float = 30.0  # Seconds to wait for a free pooled connection
 
     # Qdrant
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = True
+    QDRANT_POOL_SIZE: int = 100  # Connections shared by concurrent upserts/searches
+    QDRANT_MAX_INFLIGHT: int = 64  # Upserts/searches sent at once; the rest wait their turn
+    QDRANT_QUANTIZE: bool = True  # int8 scalar quantization for new collections
+    QDRANT_VECTORS_ON_DISK: bool = False  # Keep original vectors on disk (only the int8 copy in RAM)
+    QDRANT_PAYLOAD_ON_DISK: bool = True  # Payloads are only read for the final hits
+    # Keep the HNSW graph on disk too; only worth it with the server's io_uring
+    # reader enabled (storage.performance.async_scorer: true)
+    QDRANT_HNSW_ON_DISK: bool = False
+    QDRANT_HNSW_EF: int = 64  # Search-time HNSW beam width; higher is more accurate but slower
 
     # Ollama
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "ministral-3:8b"
     OLLAMA_EMBEDDING_MODEL: str = "embeddinggemma:300m"
     MAX_HISTORY_TOKENS: int = 4000
+    COORDINATOR_TEMPERATURE: float = 0.7
+    OLLAMA_KEEP_ALIVE: str = "24h"  # How long Ollama keeps models loaded after a request
+    OLLAMA_NUM_PARALLEL: int = 1  # Keep in sync with the Ollama server's OLLAMA_NUM_PARALLEL
+
+    # Semantic response cache
+    SEMANTIC_CACHE_ENABLED: bool = False  # Opt-in: replays stored answers for similar queries
+    SEMANTIC_CACHE_THRESHOLD: float = 0.85  # Minimum cosine similarity for a hit
+    SEMANTIC_CACHE_TTL: int = 3600  # Seconds
+
+    # Web search / scrape cache
+    SEARCH_CACHE_SIZE: int = 1024
+    SEARCH_CACHE_TTL: int = 3600  # Seconds
+    SCRAPER_EXTRACT_TIMEOUT: float = 15.0  # Seconds per page extraction; slower pages are dropped
+
+    # Logging (the workflow logs per-node progress at INFO, details at DEBUG)
+    LOG_LEVEL: str = "WARNING"
+
+    # Tool manifest cache (lets the CLI start without importing plugins)
+    TOOL_MANIFEST_PATH: str = "~/.cache/mask/tools.json"
 
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
-        extra="ignore"
+        extra="ignore",
+        frozen=True  # Shared by every task; nothing may reconfigure it at runtime
     )
 
+    @property
+    def POSTGRES_DSN(self) -> str:
+        """SQLAlchemy URL for the sync driver (psycopg2)."""
+        return (
+            f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
+            f"@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+        )
+
+    @property
+    def POSTGRES_ASYNC_DSN(self) -> str:
+        """SQLAlchemy URL for the async driver (asyncpg)."""
+        return self.POSTGRES_DSN.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+    @property
+    def NEO4J_AUTH(self) -> tuple[str, str]:
+        return (self.NEO4J_USER, self.NEO4J_PASSWORD)
+
 settings = Settings()
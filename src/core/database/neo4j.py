@@ -5,7 +5,9 @@ class Neo4jDatabase:
     def __init__(self):
         self.driver = AsyncGraphDatabase.driver(
             settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+            auth=settings.NEO4J_AUTH,
+            max_connection_pool_size=settings.NEO4J_POOL_SIZE,
+            connection_acquisition_timeout=settings.NEO4J_ACQUISITION_TIMEOUT
         )
 
     async def close(self):
@@ -38,6 +40,16 @@ class Neo4jDatabase:
         async with self.driver.session() as session:
             return await session.execute_write(work)
 
+    async def execute_write_many(self, statements: list[tuple[str, dict]]):
+        """Execute several write queries in one transaction (a single commit)."""
+        async def work(tx):
+            for query, parameters in statements:
+                result = await tx.run(query, parameters)
+                await result.consume()
+
+        async with self.driver.session() as session:
+            await session.execute_write(work)
+
 neo4j_db = Neo4jDatabase()
 
 async def get_neo4j():
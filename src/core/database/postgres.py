@@ -1,11 +1,20 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy import text
 from src.core.config import settings
 
-DATABASE_URL = f"postgresql+asyncpg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+DATABASE_URL = settings.POSTGRES_ASYNC_DSN
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Single process-wide pool; a plain QueuePool can hang under asyncio
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=settings.POSTGRES_POOL_SIZE,
+    max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -26,8 +35,22 @@ async def check_postgres_connection():
         print(f"Postgres connection failed: {e}")
         return False
 
+def get_async_postgres_engine():
+    """Return the shared async SQLAlchemy engine for PostgreSQL"""
+    return engine
+
+_sync_engine = None
+
 def get_postgres_engine():
-    """Return the SQLAlchemy engine for PostgreSQL (sync version for SQLModel)"""
-    from sqlalchemy import create_engine
-    sync_url = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-    return create_engine(sync_url, echo=False)
+    """Return the shared SQLAlchemy engine for PostgreSQL (sync version for SQLModel)"""
+    global _sync_engine
+    if _sync_engine is None:
+        from sqlalchemy import create_engine
+        _sync_engine = create_engine(
+            settings.POSTGRES_DSN,
+            echo=False,
+            pool_size=settings.POSTGRES_POOL_SIZE,
+            max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+    return _sync_engine
@@ -1,85 +1,304 @@
 from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
 from src.core.config import settings
-import uuid
+from src.core.cache.ttl_cache import TTLCache
+from array import array
+import asyncio
+import functools
+import hashlib
+import secrets
 import time
+from typing import Optional
 
-# Async client for actual usage
-qdrant_client = AsyncQdrantClient(
-    host=settings.QDRANT_HOST,
-    port=settings.QDRANT_PORT,
-)
+# store_memory() points are written in batches of up to this many, after
+# waiting at most this long for concurrent writers to join
+UPSERT_BATCH_SIZE = 64
+UPSERT_FLUSH_INTERVAL = 0.05  # Seconds
+
+# Stored point content is cut to this many characters; the hash of the full
+# text is kept alongside it
+MAX_PAYLOAD_CONTENT = 16 * 1024
+
+# Repeated searches (same vector, limit and threshold) are answered from memory
+MEMORY_SEARCH_CACHE_SIZE = 1000
+MEMORY_SEARCH_CACHE_TTL = 300  # Seconds
+_search_cache = TTLCache(maxsize=MEMORY_SEARCH_CACHE_SIZE, ttl=MEMORY_SEARCH_CACHE_TTL)
+# Bumped on every write to a collection; part of the search cache key, so
+# cached results of a collection go stale as soon as it changes
+_collection_versions: dict[str, int] = {}
+# Collections known to exist, so ensure_collection() skips the round trip;
+# a collection is dropped again when a write to it fails
+_known_collections: set[str] = set()
+
+# Bounds the searches/upserts in flight at once, so a burst of concurrent
+# callers queues here instead of piling onto the Qdrant server
+_inflight: Optional[asyncio.Semaphore] = None
+_inflight_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _limiter() -> asyncio.Semaphore:
+    """The in-flight semaphore of the running event loop."""
+    global _inflight, _inflight_loop
+    loop = asyncio.get_running_loop()
+    if _inflight is None or _inflight_loop is not loop:
+        _inflight = asyncio.Semaphore(max(1, settings.QDRANT_MAX_INFLIGHT))
+        _inflight_loop = loop
+    return _inflight
+
+@functools.lru_cache(maxsize=1)
+def _client() -> AsyncQdrantClient:
+    """The process-wide async client, built on first use rather than at import.
+
+    gRPC with a large pool keeps concurrent upserts/searches from queueing on a
+    handful of HTTP connections; the version check is skipped because it is a
+    blocking request.
+    """
+    return AsyncQdrantClient(
+        host=settings.QDRANT_HOST,
+        port=settings.QDRANT_PORT,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+        prefer_grpc=settings.QDRANT_PREFER_GRPC,
+        pool_size=settings.QDRANT_POOL_SIZE,
+        timeout=60,
+        check_compatibility=False,
+    )
+
+async def close_qdrant():
+    """Write pending points, then close the client's channels and connections (app shutdown)."""
+    await _upserter.close()
+    if _client.cache_info().currsize:
+        await _client().close()
+        _client.cache_clear()
 
 async def check_qdrant_connection():
     try:
         # get_collections returns a list of collections, if we can call it, we are connected
-        await qdrant_client.get_collections()
+        await _client().get_collections()
         return True
     except Exception as e:
         print(f"Qdrant connection failed: {e}")
         return False
 
-async def ensure_collection(collection_name: str, vector_size: int = 4096):
-    """Ensure that a collection exists with the given vector size."""
+async def ensure_collection(
+    collection_name: str,
+    vector_size: int = 4096,
+    quantize: bool = settings.QDRANT_QUANTIZE,
+    on_disk: bool = settings.QDRANT_VECTORS_ON_DISK,
+    payload_on_disk: bool = settings.QDRANT_PAYLOAD_ON_DISK,
+    hnsw_on_disk: bool = settings.QDRANT_HNSW_ON_DISK,
+):
+    """Ensure that a collection exists with the given vector size.
+
+    New collections keep an int8 copy of every vector in RAM for searching
+    (4x smaller than float32) and rescore the top hits with the originals,
+    which can then live on disk. Payloads, read only for the returned hits,
+    are stored on disk by default.
+    """
+    if collection_name in _known_collections:
+        return False
+
     try:
-        collections_response = await qdrant_client.get_collections()
+        collections_response = await _client().get_collections()
         exists = any(c.name == collection_name for c in collections_response.collections)
         
         if not exists:
             print(f"Creating Qdrant collection '{collection_name}' with size {vector_size}...")
-            await qdrant_client.create_collection(
+            await _client().create_collection(
                 collection_name=collection_name,
                 vectors_config=models.VectorParams(
                     size=vector_size,
-                    distance=models.Distance.COSINE
-                )
+                    distance=models.Distance.COSINE,
+                    on_disk=on_disk
+                ),
+                on_disk_payload=payload_on_disk,
+                hnsw_config=models.HnswConfigDiff(on_disk=True) if hnsw_on_disk else None,
+                quantization_config=models.ScalarQuantization(
+                    scalar=models.ScalarQuantizationConfig(
+                        type=models.ScalarType.INT8,
+                        quantile=0.99,
+                        always_ram=True
+                    )
+                ) if quantize else None
             )
+            _known_collections.add(collection_name)
             return True
+        _known_collections.add(collection_name)
         return False
     except Exception as e:
         print(f"Error ensuring collection {collection_name}: {e}")
         return False
 
+class _BatchedUpserter:
+    """Coalesces single-point writes into one upsert per collection and batch.
+
+    A background task takes the first queued point, waits up to the flush
+    interval for concurrent writers to join it, then upserts everything
+    collected (at most `batch_size` points). Each caller is told whether the
+    batch holding its point was written.
+
+    close() asks the task to stop rather than cancelling it, so the batch it
+    is holding and everything still queued are written first.
+    """
+
+    def __init__(self, batch_size: int = UPSERT_BATCH_SIZE, flush_interval: float = UPSERT_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Set by close(); cuts the flush interval short
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def submit(self, collection_name: str, point: models.PointStruct) -> bool:
+        loop = asyncio.get_running_loop()
+        # Started on first use, and again if the previous loop went away
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._stopping = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+        future = loop.create_future()
+        self._queue.put_nowait((collection_name, point, future))
+        return await future
+
+    async def close(self):
+        """Write whatever is still pending and stop the background task."""
+        if self._worker is None or self._loop is not asyncio.get_running_loop():
+            return
+        worker, self._worker = self._worker, None
+        if not worker.done():
+            # The None sentinel goes behind every queued point; the task
+            # exits once it has flushed everything ahead of it
+            self._stopping.set()
+            self._queue.put_nowait(None)
+            await worker
+        # Only left over if the task died; write them here
+        batch = [item for item in self._drain() if item is not None]
+        if batch:
+            await self._flush(batch)
+
+    def _drain(self) -> list:
+        items = []
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            if self._queue.qsize() < self.batch_size - 1 and not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            stop = False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: list):
+        by_collection: dict[str, list] = {}
+        for collection_name, point, future in batch:
+            by_collection.setdefault(collection_name, []).append((point, future))
+
+        for collection_name, items in by_collection.items():
+            try:
+                async with _limiter():
+                    await _client().upsert(
+                        collection_name=collection_name,
+                        points=[point for point, _ in items]
+                    )
+                _collection_versions[collection_name] = _collection_versions.get(collection_name, 0) + 1
+                stored = True
+            except Exception as e:
+                print(f"Error storing memory in Qdrant: {e}")
+                # The collection may have been dropped or recreated; check
+                # again on the next ensure_collection()
+                _known_collections.discard(collection_name)
+                stored = False
+            for _, future in items:
+                if not future.done():
+                    future.set_result(stored)
+
+
+_upserter = _BatchedUpserter()
+
 async def store_memory(collection_name: str, content: str, metadata: dict, embedding: list[float]):
-    """Store a memory vector."""
-    try:
-        # Ensure collection exists (lazy check, optimistically assumes standard size or previously created)
-        # For robustness, we check once or rely on the caller to ensure init.
-        # But here we can just try to upsert.
-        
-        point_id = str(uuid.uuid4())
-        
-        await qdrant_client.upsert(
-            collection_name=collection_name,
-            points=[
-                models.PointStruct(
-                    id=point_id,
-                    vector=embedding,
-                    payload={
-                        "content": content,
-                        **metadata,
-                        "timestamp": time.time()
-                    }
-                )
-            ]
-        )
-        return True
-    except Exception as e:
-        print(f"Error storing memory in Qdrant: {e}")
-        # If error is about collection not found or dimension mismatch, we might need to handle it.
-        # For now, just log.
-        return False
+    """Store a memory vector.
+
+    The point is written by the shared batcher together with any other
+    points stored within the same flush interval. None-valued metadata is
+    left out and long content is truncated, keeping the payload small.
+    """
+    payload = {
+        "content": content[:MAX_PAYLOAD_CONTENT],
+        "content_hash": hashlib.blake2b(content.encode(), digest_size=8).hexdigest(),
+        "timestamp": time.time()
+    }
+    payload.update((key, value) for key, value in metadata.items() if value is not None)
+
+    point = models.PointStruct(
+        # 128 random bits in Qdrant's simple (unhyphenated) UUID format;
+        # several times cheaper than str(uuid.uuid4())
+        id=secrets.token_hex(16),
+        vector=embedding,
+        payload=payload
+    )
+    return await _upserter.submit(collection_name, point)
+
+def payload_filter(**fields) -> models.Filter:
+    """Filter matching points whose payload has exactly the given values."""
+    return models.Filter(must=[
+        models.FieldCondition(key=key, match=models.MatchValue(value=value))
+        for key, value in fields.items()
+    ])
+
+async def search_memory(
+    collection_name: str,
+    query_vector: list[float],
+    limit: int = 5,
+    score_threshold: float = 0.7,
+    query_filter: Optional[models.Filter] = None
+):
+    """Search for relevant memories (cached until the collection changes).
+
+    `query_filter` is applied by Qdrant during the search, so `limit` counts
+    only matching points and nothing has to be filtered afterwards.
+    """
+    cache_key = (
+        collection_name,
+        _collection_versions.get(collection_name, 0),
+        hashlib.blake2b(array("f", query_vector).tobytes(), digest_size=16).digest(),
+        limit,
+        score_threshold,
+        query_filter.model_dump_json() if query_filter is not None else None,
+    )
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
 
-async def search_memory(collection_name: str, query_vector: list[float], limit: int = 5, score_threshold: float = 0.7):
-    """Search for relevant memories."""
     try:
-        results = await qdrant_client.search(
-            collection_name=collection_name,
-            query_vector=query_vector,
-            limit=limit,
-            score_threshold=score_threshold
-        )
-        return results
+        async with _limiter():
+            response = await _client().query_points(
+                collection_name=collection_name,
+                query=query_vector,
+                query_filter=query_filter,
+                limit=limit,
+                score_threshold=score_threshold,
+                search_params=models.SearchParams(hnsw_ef=settings.QDRANT_HNSW_EF),
+                with_payload=True
+            )
+        _search_cache.set(cache_key, response.points)
+        return list(response.points)
     except Exception as e:
         print(f"Error searching Qdrant: {e}")
         return []
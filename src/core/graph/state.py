@@ -2,16 +2,24 @@
 
 from typing import TypedDict, List, Optional, Annotated
 from typing_extensions import NotRequired
-from langgraph.graph import add_messages
 from src.core.agents.search_agent import SearchResult
 from src.core.agents.scraper_agent import ScrapedContent
 
 
+def keep_history(current: List[dict], update: List[dict]) -> List[dict]:
+    """Reducer for the conversation history: it is set once from the input.
+
+    Nodes hand the whole state back, history included; keeping the list we
+    already hold avoids re-merging (and re-converting) it at every step.
+    """
+    return current or update
+
+
 class AgentState(TypedDict):
     """Shared state across all agents in the workflow."""
     
     # Input
-    messages: Annotated[List[dict], add_messages]  # Conversation history
+    messages: Annotated[List[dict], keep_history]  # Conversation history (read-only)
     session_id: str  # Chat session ID
     user_query: str  # Current user question
     
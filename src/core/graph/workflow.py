@@ -1,5 +1,10 @@
 """LangGraph workflow for orchestrating search, scraping, and coordination."""
 
+import asyncio
+import functools
+import logging
+import re
+import threading
 from langgraph.graph import StateGraph, END
 from typing import Literal, List, Optional
 from src.core.graph.state import AgentState
@@ -9,7 +14,115 @@ from src.core.llm.ollama_client import get_llm
 from src.core.memory.manager import memory_manager
 from src.core.memory.graph_memory import graph_memory
 from src.core.tool_registry import tool_registry
-import json
+from src.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Search results scraped per request (a direct scrape uses the same cap)
+MAX_SCRAPE_URLS = 3
+# URLs containing any of these are crawled instead of scraped
+_DOCS_RE = re.compile(r"docs|documentation|wiki|manual|guide|github\.io", re.IGNORECASE)
+_BROAD_QUERY_RE = re.compile(r"\b(?:complete|full|all|entire|deep)\b", re.IGNORECASE)
+# Regex to capture URLs typed in the user query
+_URL_RE = re.compile(r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+[^\s]*')
+
+# Coordinator system prompt pieces, joined per request in coordinator_node
+_BASE_PROMPT = "You are a helpful AI assistant with access to web search."
+
+_WEB_CONTEXT_RULES = """
+
+IMPORTANT: 
+- Use the information from the sources above to answer accurately
+- Be accurate and cite when using specific facts
+- If sources don't fully answer the question, say so
+- DO NOT hallucinate or use internal knowledge that contradicts the sources
+- DO NOT use tools (like 'get_weather') unless they are specifically relevant to the request. A URL is NOT a location.
+"""
+
+_NO_RESULTS_RULES = """
+IMPORTANT: 
+- I searched the web for your query but found no relevant or recent information.
+- DO NOT answer based on old internal knowledge if it might be outdated.
+- Explicitly tell the user that no relevant information was found on the web.
+- Be honest about the lack of information rather than providing a generic or off-topic answer.
+"""
+
+_SCRAPE_FAILED_RULES = """
+IMPORTANT: 
+- You attempted to access the specific URL provided by the user but extracted no content.
+- This might be due to the site blocking scrapers or being inaccessible.
+- Apologize and state that you could not read the content of the provided URL.
+- DO NOT hallucinate the content.
+"""
+
+_TOOLS_HEADER = """
+
+
+AVAILABLE TOOLS:
+You have access to the following tools. If you need to use one, output a JSON block like:
+```json
+{
+    "tool": "tool_name",
+    "arguments": { "arg1": "value" }
+}
+```
+
+Tools Definition:
+"""
+
+_TOOL_USAGE_RULES = """
+IMPORTANT TOOL USAGE RULES:
+- Only use a tool if it matches the user's intent perfectly.
+- "get_weather" requires a CITY name and is for weather ONLY. It cannot be used for URLs.
+- If unsure, do not use any tool.
+"""
+
+
+def _estimate_crawl_budget(user_query: str) -> tuple[int, int]:
+    """(max_depth, max_pages) for crawling docs: a short lookup only needs the
+    landing page and a couple of neighbours, a broad request gets the full crawl."""
+    if len(user_query.split()) <= 8 and not _BROAD_QUERY_RE.search(user_query):
+        return 1, 3
+    return 2, 8
+
+
+def _skip_memory_lookup(user_query: str) -> bool:
+    """Whether a query is too trivial for memory to help: almost nothing but
+    URLs (it goes straight to the scraper), or under 4 visible characters."""
+    text = "".join(user_query.split())
+    if len(text) < 4:
+        return True
+    url_chars = sum(len(url) for url in _URL_RE.findall(user_query))
+    return url_chars >= 0.8 * len(text)
+
+
+@functools.lru_cache(maxsize=1)
+def _tools_block(tools_json: str) -> str:
+    """Tools section of the system prompt, rebuilt only when the tool set changes."""
+    if tools_json == "[]":
+        return _TOOL_USAGE_RULES
+    return _TOOLS_HEADER + tools_json + "\n" + _TOOL_USAGE_RULES
+
+
+# LangChain message types -> Ollama chat roles
+_ROLE_MAP = {"human": "user", "ai": "assistant", "system": "system"}
+
+
+def _normalize_message(msg) -> Optional[dict]:
+    """Convert a chat history entry to an Ollama message dict (None if unusable)."""
+    if isinstance(msg, dict):
+        return {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+    
+    # Handle LangChain objects if present (Duck typing)
+    msg_type = getattr(msg, "type", None)
+    if msg_type is not None and hasattr(msg, "content"):
+        return {"role": _ROLE_MAP.get(msg_type, "user"), "content": msg.content}
+    
+    # Anything else doesn't belong in the history; sending its str() to the
+    # model would only hide the bug
+    logger.warning("Dropping unsupported history entry of type %s", type(msg).__name__)
+    return None
 
 
 class MaskWorkflow:
@@ -17,59 +130,72 @@ class MaskWorkflow:
     
     def __init__(self):
         self.graph = None
+        # build_graph() never awaits, so only threads can race to compile;
+        # an asyncio.Lock would add nothing
+        self._build_lock = threading.Lock()
     
-    def __init__(self):
-        self.graph = None
+    def _ensure_graph(self):
+        """Compile the graph on first use, once even if threads race."""
+        if self.graph is None:
+            with self._build_lock:
+                if self.graph is None:
+                    self.build_graph()
     
     async def retrieve_node(self, state: AgentState) -> AgentState:
         """Retrieve relevant context from memory (RAG + Graph)."""
-        print("🧠 Retrieve: Fetching memory context...")
+        logger.info("🧠 Retrieve: Fetching memory context...")
         
         user_query = state["user_query"]
         session_id = state["session_id"]
         
-        # Get project ID for context filtering
+        if _skip_memory_lookup(user_query):
+            logger.info("   Retrieve: Skipped (bare URL or trivial query)")
+            state["memory_context"] = ""
+            return state
+        
+        # Get project ID for context filtering (off the event loop)
         try:
-            session = memory_manager.get_session(session_id)
+            session = await memory_manager.get_session_async(session_id)
             project_id = session.project_id if session else None
         except:
             project_id = None
             
-        # 1. RAG Search (Vector DB)
-        rag_context = await memory_manager.search_relevant_history(user_query, project_id=project_id)
-        
-        # 2. Graph Search (Neo4j)
-        graph_context = await graph_memory.retrieve_context(user_query)
+        # 1. RAG Search (Vector DB) and 2. Graph Search (Neo4j), concurrently;
+        # a failing backend only loses its own part of the context
+        rag_context, graph_context = await asyncio.gather(
+            memory_manager.search_relevant_history(user_query, project_id=project_id),
+            graph_memory.retrieve_context(user_query),
+            return_exceptions=True
+        )
+        if isinstance(rag_context, Exception):
+            logger.warning("Retrieve: RAG search failed: %s", rag_context)
+            rag_context = ""
+        if isinstance(graph_context, Exception):
+            logger.warning("Retrieve: Graph search failed: %s", graph_context)
+            graph_context = ""
         
         # Combine
-        full_context = ""
-        if rag_context:
-            full_context += f"{rag_context}\n\n"
-        if graph_context:
-            full_context += f"{graph_context}\n\n"
+        full_context = "\n\n".join(part for part in (rag_context, graph_context) if part)
             
         state["memory_context"] = full_context.strip()
         if full_context:
-            print("✅ Retrieve: Found relevant memory")
+            logger.info("✅ Retrieve: Found relevant memory")
         else:
-            print("   Retrieve: No relevant memory found")
+            logger.info("   Retrieve: No relevant memory found")
             
         return state
 
     async def router_node(self, state: AgentState) -> AgentState:
         """Determine if web search is needed."""
-        print("🔀 Router: Analyzing query...")
+        logger.info("🔀 Router: Analyzing query...")
         
         user_query = state["user_query"]
         
         # Check for direct URLs in the query
-        import re
-        # Regex to capture URLs
-        url_pattern = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+[^\s]*'
-        direct_urls = re.findall(url_pattern, user_query)
+        direct_urls = _URL_RE.findall(user_query)
         
         if direct_urls:
-            print(f"✅ Router: Direct URLs detected: {direct_urls}")
+            logger.info("✅ Router: Direct URLs detected: %s", direct_urls)
             state["urls_to_scrape"] = direct_urls
             state["needs_search"] = False
             state["direct_scrape"] = True # New flag to indicate direct routing
@@ -77,22 +203,41 @@ class MaskWorkflow:
 
         search_agent = await get_search_agent()
         
-        # Check if search is needed
-        needs_search = await search_agent.should_search(user_query, state.get("messages", []))
+        # Check if search is needed. When Ollama serves requests in parallel,
+        # generate the search queries at the same time so a search costs one
+        # model round-trip instead of two; they are discarded if unused
+        if settings.OLLAMA_NUM_PARALLEL > 1:
+            needs_search, queries = await asyncio.gather(
+                search_agent.should_search(user_query, state.get("messages", [])),
+                search_agent.extract_search_queries(user_query)
+            )
+            if needs_search:
+                state["search_queries"] = queries
+        else:
+            needs_search = await search_agent.should_search(user_query, state.get("messages", []))
         
         state["needs_search"] = needs_search
         state["direct_scrape"] = False
         
         if needs_search:
-            print("✅ Router: Web search required")
+            logger.info("✅ Router: Web search required")
         else:
-            print("✅ Router: Direct answer possible")
+            logger.info("✅ Router: Direct answer possible")
         
         return state
     
+    async def prefetch_node(self, state: AgentState) -> AgentState:
+        """Retrieve memory context and route the query concurrently.
+
+        Both only read the query and write disjoint state keys, so the
+        router's LLM call overlaps with the RAG and graph lookups.
+        """
+        await asyncio.gather(self.retrieve_node(state), self.router_node(state))
+        return state
+    
     async def search_node(self, state: AgentState) -> AgentState:
         """Perform web search."""
-        print("🔍 SearchAgent: Searching web...")
+        logger.info("🔍 SearchAgent: Searching web...")
         
         # Mark that search was performed
         state["search_performed"] = True
@@ -100,10 +245,10 @@ class MaskWorkflow:
         search_agent = await get_search_agent()
         user_query = state["user_query"]
         
-        # Generate search queries
-        queries = await search_agent.extract_search_queries(user_query)
+        # Generate search queries (unless the router already did)
+        queries = state.get("search_queries") or await search_agent.extract_search_queries(user_query)
         state["search_queries"] = queries
-        print(f"   Queries: {queries}")
+        logger.debug("   Queries: %s", queries)
         
         # Perform search
         results = await search_agent.search_multiple(queries, max_results_per_query=3)
@@ -113,94 +258,108 @@ class MaskWorkflow:
         urls = [r.url for r in results[:3]]
         state["urls_to_scrape"] = urls
         
-        print(f"✅ SearchAgent: Found {len(results)} results")
+        logger.info("✅ SearchAgent: Found %d results", len(results))
         
         return state
     
+    async def _scrape_one(
+        self,
+        scraper_agent,
+        url: str,
+        rank: int,
+        direct_scrape: bool,
+        crawl_budget: tuple[int, int] = (2, 8)
+    ) -> list:
+        """Scrape one URL, or crawl it when it looks like documentation."""
+        # Heuristic: Crawl the first result if it looks like a documentation site
+        # or if the user specifically asked for depth (which we assume for now)
+        is_docs = _DOCS_RE.search(url) is not None
+        
+        # If direct scrape of a doc site, ALWAYS crawl
+        should_crawl = rank == 0 or direct_scrape
+        
+        if should_crawl and is_docs: 
+            max_depth, max_pages = crawl_budget
+            logger.debug("🕷️  Crawling %s (Depth: %d, Pages: %d)...", url, max_depth, max_pages)
+            return await scraper_agent.crawl(url, max_depth=max_depth, max_pages=max_pages)
+        
+        # Standard scraping for others
+        logger.debug("🕷️  Scraping %s...", url)
+        result = await scraper_agent.scrape_url(url)
+        return [] if result.error else [result]
+    
     async def scrape_node(self, state: AgentState) -> AgentState:
         """Scrape web pages."""
-        print("🕷️  ScraperAgent: Scraping pages...")
+        logger.info("🕷️  ScraperAgent: Scraping pages...")
         
         scraper_agent = await get_scraper_agent()
         urls = state.get("urls_to_scrape", [])
         
         if not urls:
-            print("   No URLs to scrape")
+            logger.info("   No URLs to scrape")
             state["scraped_content"] = []
             state["web_context"] = ""
             state["sources"] = []
             return state
         
-        # Scrape URLs
+        # Deduplicate URLs while preserving order, and keep the first
+        # MAX_SCRAPE_URLS; the connector's per-host limit bounds the
+        # connections their fetches open together
+        targets = list(dict.fromkeys(urls))[:MAX_SCRAPE_URLS]
+        crawl_budget = _estimate_crawl_budget(state["user_query"])
+        
+        # Fetch them concurrently; results keep the search ranking order.
+        fetched = await asyncio.gather(
+            *(
+                self._scrape_one(scraper_agent, url, i, state.get("direct_scrape", False), crawl_budget)
+                for i, url in enumerate(targets)
+            ),
+            return_exceptions=True
+        )
+        
         scraped = []
-        # Deduplicate URLs while preserving order
-        unique_urls = []
-        seen = set()
-        for u in urls:
-            if u not in seen:
-                unique_urls.append(u)
-                seen.add(u)
-                
-        # Limit to 3 (or more if direct scrape? maybe strict 3 for perf)
-        # If direct scrape, maybe just scrape the ones provided.
-        # Let's keep max 3 for now.
-        for i, url in enumerate(unique_urls[:3]):
-            try:
-                # Heuristic: Crawl the first result if it looks like a documentation site
-                # or if the user specifically asked for depth (which we assume for now)
-                
-                is_docs = any(kw in url.lower() for kw in ["docs", "documentation", "wiki", "manual", "guide", "github.io"])
-                
-                # If direct scrape of a doc site, ALWAYS crawl
-                should_crawl = (i == 0 and is_docs) or state.get("direct_scrape")
-                
-                if should_crawl and is_docs: 
-                    print(f"🕷️  Crawling {url} (Depth: 2)...")
-                    crawl_results = await scraper_agent.crawl(url, max_depth=2, max_pages=8)
-                    scraped.extend(crawl_results)
-                else:
-                    # Standard scraping for others
-                    print(f"🕷️  Scraping {url}...")
-                    result = await scraper_agent.scrape_url(url)
-                    if not result.error:
-                        scraped.append(result)
-                        
-            except Exception as e:
-                print(f"   Error processing {url}: {e}")
-
-        state["scraped_content"] = scraped
+        for url, result in zip(targets, fetched):
+            if isinstance(result, Exception):
+                logger.warning("   Error processing %s: %s", url, result)
+                continue
+            scraped.extend(result)
         
         # Extract relevant content
         user_query = state["user_query"]
         relevant_parts = []
         sources = []
         
-        for content in scraped:
-            if content.error:
-                continue
-            
-            # Extract relevant parts
-            relevant = await scraper_agent.extract_relevant_content(content, user_query)
+        # Extract relevant parts (one LLM call per page, run concurrently)
+        pages = [content for content in scraped if not content.error]
+        extracted = await scraper_agent.extract_relevant_content_many(pages, user_query)
+        
+        for content, relevant in zip(pages, extracted):
             if relevant and "no relevant" not in relevant.lower():
                 relevant_parts.append(f"From {content.title} ({content.url}):\n{relevant}")
                 sources.append({"title": content.title, "url": content.url})
         
+        # Only the summaries go on; keep the page list (for status updates)
+        # without the page bodies, so state stays small as it's streamed
+        state["scraped_content"] = [
+            page.model_copy(update={"content": "", "links": []}) for page in scraped
+        ]
+        
         # Combine into web context
         if relevant_parts:
             web_context = "\n\n---\n\n".join(relevant_parts)
             state["web_context"] = web_context
             state["sources"] = sources
-            print(f"✅ ScraperAgent: Extracted content from {len(relevant_parts)} pages")
+            logger.info("✅ ScraperAgent: Extracted content from %d pages", len(relevant_parts))
         else:
             state["web_context"] = ""
             state["sources"] = []
-            print("   No relevant content found")
+            logger.info("   No relevant content found")
         
         return state
     
     async def coordinator_node(self, state: AgentState) -> AgentState:
         """Generate final response using coordinator."""
-        print("🤖 CoordinatorAgent: Generating response...")
+        logger.info("🤖 CoordinatorAgent: Generating response...")
         
         llm = await get_llm()
         user_query = state["user_query"]
@@ -208,94 +367,32 @@ class MaskWorkflow:
         sources = state.get("sources", [])
         
         # Build prompt with web context
-        system_prompt = "You are a helpful AI assistant with access to web search."
+        prompt_parts = [_BASE_PROMPT]
         
         if web_context:
-            system_prompt += f"""
-{web_context}
-
-IMPORTANT: 
-- Use the information from the sources above to answer accurately
-- Be accurate and cite when using specific facts
-- If sources don't fully answer the question, say so
-- If sources don't fully answer the question, say so
-- DO NOT hallucinate or use internal knowledge that contradicts the sources
-- DO NOT use tools (like 'get_weather') unless they are specifically relevant to the request. A URL is NOT a location.
-"""
+            prompt_parts += ["\n", web_context, _WEB_CONTEXT_RULES]
         elif state.get("search_performed"):
-            system_prompt += """
-IMPORTANT: 
-- I searched the web for your query but found no relevant or recent information.
-- DO NOT answer based on old internal knowledge if it might be outdated.
-- Explicitly tell the user that no relevant information was found on the web.
-- Be honest about the lack of information rather than providing a generic or off-topic answer.
-"""
+            prompt_parts.append(_NO_RESULTS_RULES)
         # Fallback for direct scrape failure
-        elif state.get("direct_scrape") and not web_context:
-             system_prompt += """
-IMPORTANT: 
-- You attempted to access the specific URL provided by the user but extracted no content.
-- This might be due to the site blocking scrapers or being inaccessible.
-- Apologize and state that you could not read the content of the provided URL.
-- DO NOT hallucinate the content.
-"""
+        elif state.get("direct_scrape"):
+            prompt_parts.append(_SCRAPE_FAILED_RULES)
 
         # Add Memory Context
         memory_context = state.get("memory_context", "")
         if memory_context:
-            system_prompt += f"\n\n{memory_context}\n"
+            prompt_parts += ["\n\n", memory_context, "\n"]
             
-        # Add Tools
-        tools = tool_registry.list_tools()
-        if tools:
-            tools_json = json.dumps(tools, indent=2)
-            system_prompt += f"""
-\n\nAVAILABLE TOOLS:
-You have access to the following tools. If you need to use one, output a JSON block like:
-```json
-{{
-    "tool": "tool_name",
-    "arguments": {{ "arg1": "value" }}
-}}
-```
-
-Tools Definition:
-{tools_json}
-"""
-
-        # Add instructions to avoid tool hallucination
-        system_prompt += """
-IMPORTANT TOOL USAGE RULES:
-- Only use a tool if it matches the user's intent perfectly.
-- "get_weather" requires a CITY name and is for weather ONLY. It cannot be used for URLs.
-- If unsure, do not use any tool.
-"""
+        # Add Tools, and instructions to avoid tool hallucination
+        prompt_parts.append(_tools_block(tool_registry.tools_json_indented))
+        system_prompt = "".join(prompt_parts)
         
-        # Generate response
+        # Generate response, followed by the conversation history sanitized
+        # for Ollama (ensure explicit list of dicts)
+        history = [_normalize_message(msg) for msg in state.get("messages", [])]
         messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add conversation history
-        input_messages = state.get("messages", [])
-        
-        # Sanitize messages for Ollama (ensure explicit list of dicts)
-        for msg in input_messages:
-            # Handle LangChain objects if present (Duck typing)
-            if hasattr(msg, "type") and hasattr(msg, "content"):
-                role = "user"
-                if msg.type == "human": role = "user"
-                elif msg.type == "ai": role = "assistant"
-                elif msg.type == "system": role = "system"
-                messages.append({"role": role, "content": msg.content})
-            elif isinstance(msg, dict):
-                 messages.append({
-                     "role": msg.get("role", "user"),
-                     "content": msg.get("content", "")
-                 })
-            else:
-                # Fallback
-                messages.append({"role": "user", "content": str(msg)})
-
-        print(f"DEBUG: Messages prepared for LLM: {len(messages)}")
+        messages.extend(msg for msg in history if msg is not None)
+
+        logger.debug("Messages prepared for LLM: %d", len(messages))
         
         # Prepare for streaming - do NOT run chat here
         state["final_messages"] = messages
@@ -314,18 +411,15 @@ IMPORTANT TOOL USAGE RULES:
         # Create graph
         workflow = StateGraph(AgentState)
         
-        # Add nodes
-        workflow.add_node("retrieve", self.retrieve_node)
-        workflow.add_node("router", self.router_node)
+        # Add nodes ("router" also retrieves memory; it keeps the name its
+        # stream events are known by)
+        workflow.add_node("router", self.prefetch_node)
         workflow.add_node("search", self.search_node)
         workflow.add_node("scrape", self.scrape_node)
         workflow.add_node("coordinator", self.coordinator_node)
         
         # Set entry point
-        workflow.set_entry_point("retrieve")
-        
-        # Edge from retrieve to router
-        workflow.add_edge("retrieve", "router")
+        workflow.set_entry_point("router")
         
         # Add conditional edges from router
         workflow.add_conditional_edges(
@@ -360,8 +454,7 @@ IMPORTANT TOOL USAGE RULES:
         Returns:
             Final response
         """
-        if self.graph is None:
-            self.build_graph()
+        self._ensure_graph()
         
         # Initial state
         initial_state = AgentState(
@@ -373,6 +466,18 @@ IMPORTANT TOOL USAGE RULES:
         # Run workflow
         final_state = await self.graph.ainvoke(initial_state)
         
+        # The coordinator only prepares the prompt; collect the streamed answer
+        final_messages = final_state.get("final_messages")
+        if final_messages:
+            llm = await get_llm()
+            response_chunks = []
+            async for chunk in llm.chat_stream(final_messages):
+                content = chunk.get("message", {}).get("content", "")
+                if content:
+                    response_chunks.append(content)
+            if response_chunks:
+                return "".join(response_chunks)
+        
         return final_state.get("final_response", "I couldn't generate a response.")
     
     async def stream(self, session_id: str, user_query: str, messages: List[dict] = None):
@@ -381,8 +486,7 @@ IMPORTANT TOOL USAGE RULES:
         Yields:
             Updates from each node
         """
-        if self.graph is None:
-            self.build_graph()
+        self._ensure_graph()
         
         # Initial state
         initial_state = AgentState(
@@ -398,11 +502,19 @@ IMPORTANT TOOL USAGE RULES:
 
 # Singleton instance
 _workflow = None
+_workflow_lock = threading.Lock()
 
 def get_workflow() -> MaskWorkflow:
-    """Get singleton workflow instance."""
+    """Get singleton workflow instance.
+
+    The graph is compiled once, under a lock, before the instance is
+    published, so no thread ever sees a workflow without its graph.
+    """
     global _workflow
     if _workflow is None:
-        _workflow = MaskWorkflow()
-        _workflow.build_graph()
+        with _workflow_lock:
+            if _workflow is None:
+                workflow = MaskWorkflow()
+                workflow.build_graph()
+                _workflow = workflow
     return _workflow
@@ -1,19 +1,47 @@
 import httpx
-import json
+import orjson
 from src.core.config import settings
+from src.core.cache.ttl_cache import TTLCache
+
+# Request bodies are encoded with orjson and sent as raw content, rather than
+# through httpx's json= (stdlib json)
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# The same text is often embedded several times per turn (semantic cache
+# lookup, history search, then storing the message); repeats come from memory
+EMBEDDING_CACHE_SIZE = 2048
+EMBEDDING_CACHE_TTL = 3600  # Seconds
 
 class OllamaClient:
-    def __init__(self, base_url: str = settings.OLLAMA_BASE_URL, model: str = settings.OLLAMA_MODEL):
+    def __init__(
+        self,
+        base_url: str = settings.OLLAMA_BASE_URL,
+        model: str = settings.OLLAMA_MODEL,
+        keep_alive: str = settings.OLLAMA_KEEP_ALIVE,
+    ):
         self.base_url = base_url
         self.model = model
-        self.client = httpx.AsyncClient(base_url=self.base_url, timeout=60.0)
+        # Sent with every request so Ollama never unloads the model between
+        # agent calls (its default is to evict after 5 idle minutes)
+        self.keep_alive = keep_alive
+        # One shared pool: concurrent agent calls reuse idle keep-alive
+        # connections instead of reconnecting once the default pool (20 idle,
+        # dropped after 5s) has let them go
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60.0),
+        )
+        # (model, text) -> embedding
+        self.embedding_cache = TTLCache(maxsize=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL)
 
     async def generate(self, prompt: str, system: str = None, options: dict = None) -> str:
         url = "/api/generate"
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            "keep_alive": self.keep_alive
         }
         if system:
             payload["system"] = system
@@ -21,7 +49,7 @@ class OllamaClient:
             payload["options"] = options
 
         try:
-            response = await self.client.post(url, json=payload)
+            response = await self.client.post(url, content=orjson.dumps(payload), headers=_JSON_HEADERS)
             response.raise_for_status()
             data = response.json()
             return data.get("response", "")
@@ -37,13 +65,14 @@ class OllamaClient:
         payload = {
             "model": self.model,
             "messages": messages,
-            "stream": False
+            "stream": False,
+            "keep_alive": self.keep_alive
         }
         if options:
             payload["options"] = options
 
         try:
-            response = await self.client.post(url, json=payload)
+            response = await self.client.post(url, content=orjson.dumps(payload), headers=_JSON_HEADERS)
             response.raise_for_status()
             data = response.json()
             return data.get("message", {})
@@ -51,52 +80,82 @@ class OllamaClient:
             print(f"Ollama chat error: {e}")
             raise
 
-    async def chat_stream(self, messages: list[dict], options: dict = None):
+    async def chat_stream(self, messages: list[dict], options: dict = None, raw_messages: bytes = None):
         """
         Stream chat responses from Ollama.
+        raw_messages: optional pre-encoded JSON array used instead of `messages`,
+        so callers re-sending a growing conversation don't re-encode it each time.
         """
         url = "/api/chat"
         payload = {
             "model": self.model,
-            "messages": messages,
-            "stream": True
+            "stream": True,
+            "keep_alive": self.keep_alive
         }
         if options:
             payload["options"] = options
 
+        if raw_messages is not None:
+            # Splice the encoded messages into the body as-is
+            body = orjson.dumps(payload)[:-1] + b',"messages":' + raw_messages + b"}"
+        else:
+            payload["messages"] = messages
+            body = orjson.dumps(payload)
+
         try:
-            async with self.client.stream("POST", url, json=payload) as response:
+            async with self.client.stream("POST", url, content=body, headers=_JSON_HEADERS) as response:
                 response.raise_for_status()
+                loads = orjson.loads
                 async for line in response.aiter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            yield data
-                        except json.JSONDecodeError:
-                            continue
+                    # Every chunk is one JSON object; blank/keepalive lines
+                    # never reach the parser
+                    if not line or line[0] != "{":
+                        continue
+                    try:
+                        yield loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
         except httpx.HTTPError as e:
             print(f"Ollama chat stream error: {e}")
             raise
 
-            raise
-
     async def embeddings(self, prompt: str, model: str = None) -> list[float]:
-        """Generate embeddings for a given text."""
+        """Generate embeddings for a given text (cached per model and text)."""
+        model = model or self.model
+        cached = self.embedding_cache.get((model, prompt))
+        if cached is not None:
+            return list(cached)
+
         url = "/api/embeddings"
         payload = {
-            "model": model or self.model,
-            "prompt": prompt
+            "model": model,
+            "prompt": prompt,
+            "keep_alive": self.keep_alive
         }
         
         try:
-            response = await self.client.post(url, json=payload)
+            response = await self.client.post(url, content=orjson.dumps(payload), headers=_JSON_HEADERS)
             response.raise_for_status()
             data = response.json()
-            return data.get("embedding", [])
+            embedding = data.get("embedding", [])
+            if embedding:
+                self.embedding_cache.set((model, prompt), embedding)
+            return list(embedding)
         except httpx.HTTPError as e:
             print(f"Ollama embeddings error: {e}")
             raise
 
+    async def warmup(self):
+        """
+        Forces the model to load with a 1-token chat, so the first real request
+        doesn't pay Ollama's cold start; keep_alive then keeps it resident.
+        Failures are logged, never raised.
+        """
+        try:
+            await self.chat([{"role": "user", "content": "hi"}], options={"num_predict": 1})
+        except Exception as e:
+            print(f"Ollama warmup failed: {e}")
+
     async def close(self):
         await self.client.aclose()
 
@@ -1,13 +1,78 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from src.core.llm.ollama_client import get_llm
 from src.core.database.neo4j import get_neo4j
+from src.core.cache.ttl_cache import TTLCache
+import asyncio
 import json
+import re
+
+# Node labels / relationship types that are safe to splice into Cypher
+_CYPHER_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Query words probed against entity ids: a letter followed by 3+ word
+# characters (punctuation is left out), minus words too common to match
+# anything useful
+_TOKEN_RE = re.compile(r"[^\W\d_][\w\-]{3,}")
+_STOPWORDS = frozenset({
+    "about", "also", "been", "could", "does", "doing", "from", "have", "know",
+    "like", "make", "many", "more", "most", "much", "please", "should", "some",
+    "tell", "than", "that", "their", "them", "then", "there", "these", "they",
+    "this", "those", "want", "were", "what", "when", "where", "which", "while",
+    "will", "with", "would", "your",
+    # Italian
+    "alla", "alle", "anche", "come", "cosa", "della", "delle", "dello", "degli",
+    "dove", "molto", "nella", "nelle", "perché", "quale", "quali", "quando",
+    "quella", "quello", "questa", "questo", "sono", "sulla", "tutti", "tutto",
+})
+
+# retrieve_context results for recently seen word sets; dropped whenever
+# this process writes to the graph
+CONTEXT_CACHE_SIZE = 256
+CONTEXT_CACHE_TTL = 60  # Seconds
 
 class GraphMemory:
     """Manages knowledge graph operations (Neo4j)."""
     
     def __init__(self):
-        pass
+        # Strong references to running extractions (the loop only keeps weak
+        # ones), the users that currently have one, and the texts that arrived
+        # for them meanwhile
+        self._background_tasks: set[asyncio.Task] = set()
+        self._active_extractions: set[str] = set()
+        self._pending_texts: Dict[str, List[str]] = {}
+        self.context_cache = TTLCache(maxsize=CONTEXT_CACHE_SIZE, ttl=CONTEXT_CACHE_TTL)
+
+    def schedule_extract_and_store(self, text: str, user_id: str = None) -> Optional[asyncio.Task]:
+        """Run extract_and_store in the background and return immediately.
+
+        At most one extraction runs per user; texts scheduled while it does
+        are queued and extracted together by the same task once it finishes,
+        and those calls return None. Texts are only ever merged with others
+        for the same user_id, so pass one (a session id works) whenever
+        several users can schedule at once.
+        """
+        key = user_id or ""
+        if key in self._active_extractions:
+            self._pending_texts.setdefault(key, []).append(text)
+            return None
+
+        self._active_extractions.add(key)
+
+        async def run():
+            try:
+                result = await self.extract_and_store(text, user_id)
+                while key in self._pending_texts:
+                    queued = self._pending_texts.pop(key)
+                    result = await self.extract_and_store("\n\n".join(queued), user_id)
+                return result
+            finally:
+                self._active_extractions.discard(key)
+                self._pending_texts.pop(key, None)
+
+        task = asyncio.create_task(run())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
 
     async def extract_and_store(self, text: str, user_id: str = None):
         """Extract entities and relationships and store in Neo4j."""
@@ -56,36 +121,66 @@ class GraphMemory:
             return None
 
     async def _store_subgraph(self, data: Dict[str, Any]):
-        """Store nodes and edges in Neo4j."""
+        """Store nodes and edges in Neo4j.
+
+        One UNWIND write per node label and per relationship type, instead of
+        one round trip per node and edge, all committed in a single transaction.
+        """
         neo4j = await get_neo4j()
         
         nodes = data.get("nodes", [])
         edges = data.get("edges", [])
         
-        # 1. Merge Nodes
+        # Labels and types come from the LLM and are spliced into the Cypher,
+        # so only plain identifiers are accepted
+        nodes_by_label: Dict[str, List[dict]] = {}
         for node in nodes:
-            cypher = f"""
-            MERGE (n:{node['label']} {{id: $id}})
-            SET n += $props
-            """
+            if not _CYPHER_IDENTIFIER.match(node.get("label", "")):
+                print(f"Graph extraction: skipping node with invalid label {node.get('label')!r}")
+                continue
             # Move extra keys to props
             props = {k:v for k,v in node.items() if k not in ["id", "label"]}
-            await neo4j.execute_write(cypher, {"id": node["id"], "props": props})
-            
-        # 2. Merge Edges
+            nodes_by_label.setdefault(node["label"], []).append({"id": node["id"], "props": props})
+
+        edges_by_type: Dict[str, List[dict]] = {}
         for edge in edges:
-            cypher = f"""
-            MATCH (a {{id: $source}}), (b {{id: $target}})
-            MERGE (a)-[r:{edge['type']}]->(b)
-            SET r += $props
-            """
+            if not _CYPHER_IDENTIFIER.match(edge.get("type", "")):
+                print(f"Graph extraction: skipping edge with invalid type {edge.get('type')!r}")
+                continue
             props = {k:v for k,v in edge.items() if k not in ["source", "target", "type"]}
-            await neo4j.execute_write(cypher, {
+            edges_by_type.setdefault(edge["type"], []).append({
                 "source": edge["source"],
                 "target": edge["target"],
                 "props": props
             })
 
+        # Cached contexts may miss the facts written below
+        self.context_cache.clear()
+
+        statements = []
+
+        # 1. Merge Nodes (before the edges that match them)
+        for label, rows in nodes_by_label.items():
+            cypher = f"""
+            UNWIND $rows AS row
+            MERGE (n:{label} {{id: row.id}})
+            SET n += row.props
+            """
+            statements.append((cypher, {"rows": rows}))
+            
+        # 2. Merge Edges
+        for rel_type, rows in edges_by_type.items():
+            cypher = f"""
+            UNWIND $rows AS row
+            MATCH (a {{id: row.source}}), (b {{id: row.target}})
+            MERGE (a)-[r:{rel_type}]->(b)
+            SET r += row.props
+            """
+            statements.append((cypher, {"rows": rows}))
+
+        if statements:
+            await neo4j.execute_write_many(statements)
+
     async def retrieve_context(self, text: str) -> str:
         """Retrieve relevant graph context based on keywords in text."""
         # Simple implementation: extract entities from query -> find 1-hop neighbors
@@ -93,28 +188,41 @@ class GraphMemory:
         # Or better: Ask LLM to extract "Potential Entites" from query, then search.
         
         # Let's try searching for exact matches of words in text against Node IDs for simplicity first.
-        neo4j = await get_neo4j()
+        # Lower-cased and de-duplicated here so the query doesn't repeat the work
+        words = list(dict.fromkeys(
+            w for w in _TOKEN_RE.findall(text.lower()) if w not in _STOPWORDS
+        ))
+        if not words:
+            return ""
         
-        words = [w.strip() for w in text.split() if len(w) > 3] # naive tokenizer
+        cache_key = tuple(words)
+        cached = self.context_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        found_facts = []
+        neo4j = await get_neo4j()
         
-        for word in words:
-            query = """
+        # All words in one round trip, still up to 5 facts per word
+        query = """
+        UNWIND $words AS word
+        CALL {
+            WITH word
             MATCH (n)-[r]-(m)
-            WHERE toLower(n.id) CONTAINS toLower($word)
-            RETURN n.id, type(r), m.id
+            WHERE toLower(n.id) CONTAINS word
+            RETURN n.id AS source, type(r) AS rel, m.id AS target
             LIMIT 5
-            """
-            results = await neo4j.execute_read(query, {"word": word})
-            if results:
-                for r in results:
-                    fact = f"{r['n.id']} --[{r['type(r)']}]--> {r['m.id']}"
-                    if fact not in found_facts:
-                        found_facts.append(fact)
+        }
+        RETURN source, rel, target
+        """
+        results = await neo4j.execute_read(query, {"words": words})
+        
+        # dict keeps first-seen order while dropping duplicates
+        found_facts = list(dict.fromkeys(
+            f"{r['source']} --[{r['rel']}]--> {r['target']}" for r in results or []
+        ))
                         
-        if found_facts:
-            return "GRAPH KNOWLEDGE:\n" + "\n".join(found_facts)
-        return ""
+        context = "GRAPH KNOWLEDGE:\n" + "\n".join(found_facts) if found_facts else ""
+        self.context_cache.set(cache_key, context)
+        return context
 
 graph_memory = GraphMemory()
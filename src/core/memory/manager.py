@@ -1,17 +1,34 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
-from typing import List, Optional
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, insert
+from sqlalchemy.orm import sessionmaker
 from sqlmodel import Session, select, desc, SQLModel
 from src.core.config import settings
 from src.core.database.postgres import get_postgres_engine
 from src.core.memory.models import ChatSession, ChatMessage, Project
 from src.core.llm.ollama_client import get_llm
 import src.core.database.qdrant as qdrant
+from src.core.cache.ttl_cache import TTLCache
 import asyncio
 
+# Recently read session histories kept in memory
+HISTORY_CACHE_SIZE = 1024
+HISTORY_CACHE_TTL = 600  # Seconds
+
 class MemoryManager:
     def __init__(self):
         self.engine = get_postgres_engine()
+        # Sessions draw connections from the engine's pool. Objects stay
+        # loaded after commit, so callers can read them without a refresh.
+        self.session_factory = sessionmaker(bind=self.engine, class_=Session, expire_on_commit=False)
+        # session_id -> [{"role", "content"}]; shared by every caller, so
+        # copy before mutating. Invalidated once a change to the session's
+        # messages has committed.
+        self._history_cache = TTLCache(maxsize=HISTORY_CACHE_SIZE, ttl=HISTORY_CACHE_TTL)
+        # Bumped on every invalidation; a history read that overlapped one
+        # may hold pre-commit rows and is not cached
+        self._history_epoch = 0
     
     def create_tables(self):
         SQLModel.metadata.create_all(self.engine)
@@ -20,127 +37,143 @@ class MemoryManager:
     def create_project(self, name: str, description: str = None) -> Project:
         project_id = str(uuid.uuid4())
         project = Project(id=project_id, name=name, description=description)
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             session.add(project)
-            session.commit()
-            session.refresh(project)
             return project
 
     def get_project(self, project_id: str) -> Optional[Project]:
-        with Session(self.engine) as session:
+        with self.session_factory() as session:
             return session.get(Project, project_id)
 
     def list_projects(self) -> List[Project]:
-        with Session(self.engine) as session:
+        with self.session_factory() as session:
             statement = select(Project).order_by(desc(Project.created_at))
             return session.exec(statement).all()
 
     def update_project_context(self, project_id: str, context: str):
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             project = session.get(Project, project_id)
             if project:
                 project.context_summary = context
                 session.add(project)
-                session.commit()
     
     def update_project_color(self, project_id: str, color: str):
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             project = session.get(Project, project_id)
             if project:
                 project.color = color
                 session.add(project)
-                session.commit()
     
     def update_project_icon(self, project_id: str, icon: str):
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             project = session.get(Project, project_id)
             if project:
                 project.icon = icon
                 session.add(project)
-                session.commit()
     
     def delete_project(self, project_id: str):
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             project = session.get(Project, project_id)
             if project:
                 session.delete(project)
-                session.commit()
 
     def get_project_chats_summary(self, project_id: str) -> str:
         """Collects summaries/last messages from all chats in the project for context generation."""
-        with Session(self.engine) as session:
-            statement = select(ChatSession).where(ChatSession.project_id == project_id)
-            chats = session.exec(statement).all()
-            
-            summary_parts = []
-            for chat in chats:
-                # Naive: get last few messages or a stored summary if we had one per chat
-                msgs = self.get_messages(chat.id)
-                chat_text = "\n".join([f"{m.role}: {m.content}" for m in msgs[-5:]]) # Last 5 messages
-                if chat_text:
-                    summary_parts.append(f"--- Chat '{chat.title or chat.id}' ---\n{chat_text}\n")
-            
-            return "\n".join(summary_parts)
+        # Rank each chat's messages newest first and keep the last 5 of every
+        # chat in one query, instead of loading every message of every chat
+        ranked = (
+            select(
+                ChatMessage.session_id,
+                ChatMessage.role,
+                ChatMessage.content,
+                ChatMessage.created_at,
+                func.row_number().over(
+                    partition_by=ChatMessage.session_id,
+                    order_by=desc(ChatMessage.created_at)
+                ).label("rn")
+            )
+            .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+            .where(ChatSession.project_id == project_id)
+            .subquery()
+        )
+        statement = (
+            select(ChatSession.id, ChatSession.title, ranked.c.role, ranked.c.content)
+            .join(ranked, ranked.c.session_id == ChatSession.id)
+            .where(ranked.c.rn <= 5)
+            .order_by(ChatSession.created_at, ChatSession.id, ranked.c.created_at)
+        )
+        with self.session_factory() as session:
+            rows = session.exec(statement).all()
+
+        chats: Dict[str, tuple[str, List[str]]] = {}
+        for chat_id, title, role, content in rows:
+            chats.setdefault(chat_id, (title or chat_id, []))[1].append(f"{role}: {content}")
+
+        summary_parts = [
+            f"--- Chat '{title}' ---\n" + "\n".join(lines) + "\n"
+            for title, lines in chats.values()
+        ]
+        return "\n".join(summary_parts)
 
     # --- Sessions ---
     def create_session(self, title: str = None, project_id: str = None) -> ChatSession:
         session_id = str(uuid.uuid4())
         chat_session = ChatSession(id=session_id, title=title, project_id=project_id)
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             session.add(chat_session)
-            session.commit()
-            session.refresh(chat_session)
             return chat_session
 
     def get_session(self, session_id: str) -> Optional[ChatSession]:
-        with Session(self.engine) as session:
+        with self.session_factory() as session:
             return session.get(ChatSession, session_id)
 
     def list_sessions(self) -> List[ChatSession]:
-        with Session(self.engine) as session:
+        with self.session_factory() as session:
             statement = select(ChatSession).order_by(desc(ChatSession.created_at))
             results = session.exec(statement)
             return results.all()
 
     def delete_session(self, session_id: str):
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             chat_session = session.get(ChatSession, session_id)
             if chat_session:
                 session.delete(chat_session)
-                session.commit()
+        self._invalidate_history(session_id)
     
     def rename_session(self, session_id: str, new_title: str):
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             chat_session = session.get(ChatSession, session_id)
             if chat_session:
                 chat_session.title = new_title
                 session.add(chat_session)
-                session.commit()
     
     def assign_session_to_project(self, session_id: str, project_id: str | None):
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             chat_session = session.get(ChatSession, session_id)
             if chat_session:
                 chat_session.project_id = project_id
                 session.add(chat_session)
-                session.commit()
 
     def add_message(self, session_id: str, role: str, content: str) -> ChatMessage:
         message = ChatMessage(session_id=session_id, role=role, content=content)
-        with Session(self.engine) as session:
+        with self.session_factory.begin() as session:
             session.add(message)
-            session.commit()
-            session.refresh(message)
-            return message
+        self._invalidate_history(session_id)
+        return message
 
     async def add_message_async(self, session_id: str, role: str, content: str) -> ChatMessage:
         """
         Async version that stores in Postgres AND embeds in Qdrant.
+        The Postgres write runs in a worker thread while the message is embedded.
+        EnhancedCoordinator saves both sides of every chat turn through here.
         """
-        # 1. Store in Postgres (synchronously, as before)
-        msg = self.add_message(session_id, role, content)
-        
-        # 2. Embed and Store in Qdrant (Background Task or Await?)
+        msg, _ = await asyncio.gather(
+            asyncio.to_thread(self.add_message, session_id, role, content),
+            self._embed_message(session_id, role, content)
+        )
+        return msg
+
+    async def _embed_message(self, session_id: str, role: str, content: str):
         # We await it to ensure consistency for now, can be backgrounded later if slow.
         try:
             # Check for project_id to partition memory (optional, for now global or by session)
@@ -151,14 +184,17 @@ class MemoryManager:
             # We'll rely on the default ensuring logic or handle it in qdrant module
             # But we need an embedding first.
             llm = await get_llm()
-            embedding = await llm.embeddings(content, model=settings.OLLAMA_EMBEDDING_MODEL)
+            # The session (for its project) is looked up while the embedding is computed
+            embedding, chat_session = await asyncio.gather(
+                llm.embeddings(content, model=settings.OLLAMA_EMBEDDING_MODEL),
+                self.get_session_async(session_id)
+            )
             
             if embedding:
                 # Ensure collection exists if lazy check didn't happen
                 await qdrant.ensure_collection(collection_name, len(embedding))
                 
                 # Metadata
-                chat_session = self.get_session(session_id)
                 project_id = chat_session.project_id if chat_session else None
                 
                 metadata = {
@@ -172,8 +208,6 @@ class MemoryManager:
         except Exception as e:
             print(f"Error embedding message: {e}")
             # Non-blocking failure for vector store
-            
-        return msg
 
     async def search_relevant_history(self, query: str, project_id: str = None, limit: int = 5) -> str:
         """
@@ -187,10 +221,14 @@ class MemoryManager:
                 return ""
             
             collection_name = "chat_history"
-            results = await qdrant.search_memory(collection_name, query_embedding, limit=limit)
-            
-            # Filter by project_id if provided? Qdrant filtering not yet impl in search_memory wrappers
-            # For now, just format all results
+            # Qdrant applies the project filter while searching, so `limit`
+            # counts only this project's messages
+            results = await qdrant.search_memory(
+                collection_name,
+                query_embedding,
+                limit=limit,
+                query_filter=qdrant.payload_filter(project_id=project_id) if project_id else None
+            )
             
             context_parts = []
             for res in results:
@@ -198,12 +236,6 @@ class MemoryManager:
                 payload = res.payload
                 content = payload.get("content", "")
                 role = payload.get("role", "unknown")
-                # meta_project = payload.get("project_id")
-                
-                # Simple filter in python if payload has it
-                if project_id and payload.get("project_id") != project_id:
-                    continue
-                    
                 context_parts.append(f"[{role}]: {content}")
                 
             if context_parts:
@@ -215,27 +247,72 @@ class MemoryManager:
             return ""
 
     def get_messages(self, session_id: str) -> List[ChatMessage]:
-        with Session(self.engine) as session:
+        with self.session_factory() as session:
             statement = select(ChatMessage).where(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at)
             results = session.exec(statement)
             return results.all()
 
+    def get_history(self, session_id: str) -> List[dict]:
+        """
+        Returns the session messages as role/content dicts, cached per session.
+        The returned list is shared: callers must copy it before mutating.
+        """
+        history = self._history_cache.get(session_id)
+        if history is None:
+            epoch = self._history_epoch
+            history = [{"role": m.role, "content": m.content} for m in self.get_messages(session_id)]
+            if epoch == self._history_epoch:
+                self._history_cache.set(session_id, history)
+        return history
+
+    def _invalidate_history(self, session_id: str):
+        """Drop a session's cached history; call after the change has committed."""
+        self._history_epoch += 1
+        self._history_cache.pop(session_id, None)
+
     def update_messages(self, session_id: str, messages: List[dict]):
         """
         Replaces all messages in a session with a new list (useful for summarization).
         """
-        with Session(self.engine) as session:
-            # Delete existing messages
-            statement = select(ChatMessage).where(ChatMessage.session_id == session_id)
-            results = session.exec(statement)
-            for msg in results:
-                session.delete(msg)
-            
-            # Add new messages
-            for msg_data in messages:
-                msg = ChatMessage(session_id=session_id, role=msg_data["role"], content=msg_data["content"])
-                session.add(msg)
-            
-            session.commit()
+        # Messages are read back ordered by created_at, so space them a
+        # microsecond apart to keep the given order
+        now = datetime.utcnow()
+        rows = [
+            {
+                "session_id": session_id,
+                "role": msg_data["role"],
+                "content": msg_data["content"],
+                "created_at": now + timedelta(microseconds=i)
+            }
+            for i, msg_data in enumerate(messages)
+        ]
+        with self.session_factory.begin() as session:
+            # One DELETE for the old messages, batched multi-row INSERTs
+            # (split to fit the driver's parameter limit) for the new ones
+            session.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
+            if rows:
+                session.execute(insert(ChatMessage), rows)
+        self._invalidate_history(session_id)
+
+    # --- Async wrappers ---
+    # The sync engine blocks on every round-trip; run those calls in a worker
+    # thread so streaming handlers keep serving other sessions meanwhile.
+    async def get_session_async(self, session_id: str) -> Optional[ChatSession]:
+        return await asyncio.to_thread(self.get_session, session_id)
+
+    async def get_project_async(self, project_id: str) -> Optional[Project]:
+        return await asyncio.to_thread(self.get_project, project_id)
+
+    async def get_messages_async(self, session_id: str) -> List[ChatMessage]:
+        return await asyncio.to_thread(self.get_messages, session_id)
+
+    async def get_history_async(self, session_id: str) -> List[dict]:
+        history = self._history_cache.get(session_id)
+        if history is not None:
+            return history
+        return await asyncio.to_thread(self.get_history, session_id)
+
+    async def update_messages_async(self, session_id: str, messages: List[dict]):
+        await asyncio.to_thread(self.update_messages, session_id, messages)
 
 memory_manager = MemoryManager()
@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 import uuid
 
@@ -17,14 +18,18 @@ class Project(SQLModel, table=True):
 
 class ChatSession(SQLModel, table=True):
     id: Optional[str] = Field(default=None, primary_key=True)
-    project_id: Optional[str] = Field(default=None, foreign_key="projects.id")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    project_id: Optional[str] = Field(default=None, foreign_key="projects.id", index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     title: Optional[str] = None
     
     project: Optional[Project] = Relationship(back_populates="sessions")
     messages: List["ChatMessage"] = Relationship(back_populates="session", sa_relationship_kwargs={"cascade": "all, delete-orphan"})
 
 class ChatMessage(SQLModel, table=True):
+    # Serves get_messages (WHERE session_id ORDER BY created_at) straight
+    # from the index; also covers lookups on session_id alone
+    __table_args__ = (Index("ix_chatmessage_session_id_created_at", "session_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: str = Field(foreign_key="chatsession.id")
     role: str
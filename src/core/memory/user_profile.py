@@ -1,8 +1,14 @@
 import os
+import asyncio
+from typing import Optional
 from src.core.llm.ollama_client import get_llm
 
 WARNING_MSG = "> [!NOTE]\n> Storing sensitive data in a plain text file is not secure."
 
+# Pending profile updates; a single worker drains them so bursts never
+# fan out into unbounded concurrent LLM calls
+UPDATE_QUEUE_SIZE = 64
+
 class UserProfileManager:
     def __init__(self, file_path: str = "WHO.md"):
         self.file_path = file_path
@@ -10,6 +16,9 @@ class UserProfileManager:
         if not os.path.exists(self.file_path):
             with open(self.file_path, "w") as f:
                 f.write("# User Profile\n\n## Personal Information\n- Name: unknown\n\n## Interests\n- unknown\n\n## Notes\n- None\n")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
     def get_profile(self) -> str:
         """Reads the WHO.md file."""
@@ -63,4 +72,48 @@ Return updated Markdown or "NO_UPDATE".
             except Exception as e:
                 print(f"[UserProfileManager] extraction error: {e}")
 
+    def start_worker(self):
+        """Start the background worker that applies queued profile updates."""
+        loop = asyncio.get_running_loop()
+        # The queue is bound to the loop it was first used on, so a new loop
+        # gets a new queue along with its worker
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE)
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run_worker())
+
+    async def stop_worker(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._queue = None
+        self._loop = None
+
+    def enqueue_update(self, user_input: str):
+        """Queue a profile update without blocking; drops the oldest when full."""
+        self.start_worker()
+        try:
+            self._queue.put_nowait(user_input)
+        except asyncio.QueueFull:
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self._queue.put_nowait(user_input)
+            print("[UserProfileManager] Update queue full, dropped oldest update.")
+
+    async def _run_worker(self):
+        while True:
+            user_input = await self._queue.get()
+            try:
+                await self.update_profile(user_input)
+            except Exception as e:
+                print(f"[UserProfileManager] update error: {e}")
+            finally:
+                self._queue.task_done()
+
 user_profile_manager = UserProfileManager()
@@ -1,3 +1,4 @@
+import hashlib
 import importlib.util
 import os
 import sys
@@ -20,6 +21,15 @@ class PluginManager:
             if item.is_dir() and (item / "plugin.py").exists():
                 self.load_plugin(item)
 
+    def fingerprint(self) -> str:
+        """Hash of plugin file paths, sizes and mtimes; changes when any plugin does."""
+        digest = hashlib.sha256()
+        if self.plugin_dir.exists():
+            for plugin_file in sorted(self.plugin_dir.glob("*/plugin.py")):
+                stat = plugin_file.stat()
+                digest.update(f"{plugin_file}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+
     def load_plugin(self, plugin_path: Path):
         """Loads a plugin from a specific directory."""
         plugin_file = plugin_path / "plugin.py"
@@ -1,32 +1,105 @@
-from typing import Any, Dict, List
+import orjson
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from src.core.config import settings
 from src.core.plugin_manager import plugin_manager
 from src.interfaces.types import Tool
 
 class ToolRegistry:
-    def __init__(self):
+    def __init__(self, manifest_path: str = settings.TOOL_MANIFEST_PATH):
         self.manager = plugin_manager
+        self.manifest_path = Path(manifest_path).expanduser()
+        self._tools_json: Optional[str] = None
+        # Tool descriptions built from the loaded plugins, once per discovery
+        self._tools_cache: Optional[List[Dict[str, Any]]] = None
+        # Tool descriptions read from the manifest; while set, plugins are not loaded yet
+        self._manifest: Optional[List[Dict[str, Any]]] = None
+        # name -> Tool for call_tool, built once per plugin discovery
+        self._tool_index: Optional[Dict[str, Tool]] = None
 
     def initialize(self):
         self.manager.discover_plugins()
+        self._tools_json = None
+        self._tools_cache = None
+        self._manifest = None
+        self._tool_index = None
+
+    def initialize_cached(self):
+        """Initialize from the on-disk tool manifest if the plugins are unchanged.
+
+        Plugin modules are only imported once a tool is actually called.
+        Falls back to a full discovery (and rewrites the manifest) otherwise.
+        """
+        fingerprint = self.manager.fingerprint()
+        try:
+            data = orjson.loads(self.manifest_path.read_bytes())
+            if data.get("fingerprint") == fingerprint:
+                self._manifest = data["tools"]
+                self._tools_json = None
+                self._tools_cache = None
+                self._tool_index = None
+                return
+        except (OSError, orjson.JSONDecodeError, KeyError, AttributeError):
+            pass
+
+        self.initialize()
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            self.manifest_path.write_bytes(
+                orjson.dumps({"fingerprint": fingerprint, "tools": self.list_tools()})
+            )
+        except OSError as e:
+            print(f"Could not write tool manifest: {e}")
+
+    @property
+    def tools_json_indented(self) -> str:
+        """Pretty-printed JSON of list_tools(), built once per plugin discovery."""
+        if self._tools_json is None:
+            self._tools_json = orjson.dumps(self.list_tools(), option=orjson.OPT_INDENT_2).decode()
+        return self._tools_json
 
     def list_tools(self) -> List[Dict[str, Any]]:
-        """List all available tools."""
-        tools = self.manager.get_all_tools()
-        return [
-            {
-                "name": tool.name,
-                "description": tool.description,
-                "inputSchema": tool.input_schema
-            }
-            for tool in tools
-        ]
+        """List all available tools.
+
+        Descriptions are cached per plugin discovery; each call gets its own
+        copies of the dicts, so callers may modify them.
+        """
+        if self._manifest is not None:
+            return [dict(tool) for tool in self._manifest]
+        if self._tools_cache is None:
+            self._tools_cache = [
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "inputSchema": tool.input_schema
+                }
+                for tool in self.manager.get_all_tools()
+            ]
+        return [dict(tool) for tool in self._tools_cache]
 
     async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Any:
         """Execute a tool by name."""
-        tools = self.manager.get_all_tools()
-        for tool in tools:
-            if tool.name == name:
-                return await tool.handler(arguments)
-        raise ValueError(f"Tool {name} not found")
+        if self._manifest is not None:
+            # Started from the manifest: load the plugin handlers now
+            self.initialize()
+        tool = self._get_tool(name)
+        if tool is None:
+            raise ValueError(f"Tool {name} not found")
+        return await tool.handler(arguments)
+
+    def _get_tool(self, name: str) -> Optional[Tool]:
+        """Look a tool up by name; on a miss the index is rebuilt once, in
+        case a plugin was loaded since it was built."""
+        if self._tool_index is not None:
+            tool = self._tool_index.get(name)
+            if tool is not None:
+                return tool
+
+        index: Dict[str, Tool] = {}
+        for tool in self.manager.get_all_tools():
+            # Same precedence as a linear scan: the first tool with a name wins
+            index.setdefault(tool.name, tool)
+        self._tool_index = index
+        return index.get(name)
 
 tool_registry = ToolRegistry()
@@ -1,14 +1,15 @@
 from src.interfaces.types import Plugin, Tool
 import random
 
+# Simulated weather data: every (temperature, condition) pair, so a reading
+# takes a single random pick
+_TEMPS = (20, 22, 18, 25, 30, 15)
+_CONDITIONS = ("Sunny", "Cloudy", "Rainy", "Partly Cloudy")
+_READINGS = tuple((temp, condition) for temp in _TEMPS for condition in _CONDITIONS)
+
 async def get_weather(args: dict) -> str:
     location = args.get("location", "Unknown Location")
-    # Simulate weather data
-    temps = [20, 22, 18, 25, 30, 15]
-    conditions = ["Sunny", "Cloudy", "Rainy", "Partly Cloudy"]
-    
-    temp = random.choice(temps)
-    condition = random.choice(conditions)
+    temp, condition = random.choice(_READINGS)
     
     return f"The current weather in {location} is {temp}°C and {condition}."
 
@@ -131,6 +131,66 @@ def mock_html_content():
     """
 
 
+class _MockStreamReader:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def iter_chunked(self, n: int):
+        for i in range(0, len(self._data), n):
+            yield self._data[i:i + n]
+
+
+class MockAiohttpResponse:
+    """Minimal stand-in for an aiohttp response used as `async with session.get(...)`."""
+
+    def __init__(
+        self,
+        text: str = "",
+        status: int = 200,
+        content_type: str = "text/html; charset=utf-8",
+        headers: dict = None,
+        url: str = None
+    ):
+        self.url = url  # final URL after redirects; the mock session fills it in
+        self.status = status
+        self.headers = {"Content-Type": content_type, **(headers or {})}
+        self.charset = "utf-8"
+        self.content = _MockStreamReader(text.encode("utf-8"))
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            import aiohttp
+            raise aiohttp.ClientResponseError(request_info=Mock(), history=(), status=self.status)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+@pytest.fixture
+def mock_aiohttp_session():
+    """Return a factory for mock aiohttp sessions.
+
+    `handler(url)` returns a MockAiohttpResponse (or HTML string) or raises.
+    """
+    def _make(handler):
+        def _get(url, **kwargs):
+            result = handler(url)
+            response = MockAiohttpResponse(result) if isinstance(result, str) else result
+            if getattr(response, "url", None) is None:
+                response.url = url
+            return response
+
+        session = Mock()
+        session.closed = False
+        session.get = Mock(side_effect=_get)
+        session.close = AsyncMock()
+        return session
+    return _make
+
+
 @pytest.fixture
 def temp_who_md():
     """Create a temporary WHO.md file for testing."""
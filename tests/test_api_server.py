@@ -261,6 +261,13 @@ class TestSessionsEndpoints:
         assert response.status_code == 200
         data = response.json()
         assert len(data) == 2
+        assert data[0] == {
+            "id": 1,
+            "role": "user",
+            "content": "Hello",
+            "created_at": mock_messages[0].created_at.isoformat(),
+            "session_id": session_id
+        }
 
 
 class TestChatEndpoint:
@@ -289,9 +296,9 @@ class TestChatEndpoint:
                 assert "text/event-stream" in response.headers["content-type"]
                 
                 content = response.text
-                assert 'data: {"type": "status", "content": "Thinking..."}\n\n' in content
-                assert 'data: {"type": "token", "content": "Hello"}\n\n' in content
-                assert 'data: {"type": "token", "content": " world!"}\n\n' in content
+                assert 'data: {"type":"status","content":"Thinking..."}\n\n' in content
+                assert 'data: {"type":"token","content":"Hello"}\n\n' in content
+                assert 'data: {"type":"token","content":" world!"}\n\n' in content
                 assert 'data: [DONE]\n\n' in content
 
 
@@ -326,11 +333,26 @@ class TestStartupEvent:
     @pytest.mark.asyncio
     async def test_startup_initializes_tool_registry(self):
         """Test that startup event initializes tool registry."""
-        with patch('src.api.server.tool_registry') as mock_registry:
+        with patch('src.api.server.tool_registry') as mock_registry, \
+             patch('src.api.server.get_llm', new_callable=AsyncMock) as mock_get_llm:
             mock_registry.initialize = Mock()
+            mock_get_llm.return_value = AsyncMock()
 
             # Simulate startup
             from src.api.server import startup_event
             await startup_event()
 
             mock_registry.initialize.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_startup_warms_up_llm(self):
+        """Test that startup event loads the LLM model."""
+        with patch('src.api.server.tool_registry'), \
+             patch('src.api.server.get_llm', new_callable=AsyncMock) as mock_get_llm:
+            mock_llm = AsyncMock()
+            mock_get_llm.return_value = mock_llm
+
+            from src.api.server import startup_event
+            await startup_event()
+
+            mock_llm.warmup.assert_called_once()
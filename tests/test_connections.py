@@ -21,9 +21,49 @@ async def test_neo4j_connection():
         assert result is True
         mock_verify.assert_called_once()
 
+@pytest.mark.asyncio
+async def test_neo4j_execute_write_many_single_transaction():
+    from unittest.mock import MagicMock
+    tx = AsyncMock()
+    session = AsyncMock()
+
+    async def run_work(work):
+        return await work(tx)
+
+    session.execute_write = AsyncMock(side_effect=run_work)
+    with patch.object(neo4j_db, "driver") as mock_driver:
+        mock_driver.session.return_value = MagicMock(
+            __aenter__=AsyncMock(return_value=session), __aexit__=AsyncMock(return_value=False)
+        )
+        await neo4j_db.execute_write_many([("CREATE (a)", {"x": 1}), ("CREATE (b)", {"y": 2})])
+        session.execute_write.assert_called_once()
+        assert [c.args for c in tx.run.call_args_list] == [("CREATE (a)", {"x": 1}), ("CREATE (b)", {"y": 2})]
+
 @pytest.mark.asyncio
 async def test_qdrant_connection():
-    with patch("src.core.database.qdrant.qdrant_client.get_collections", new_callable=AsyncMock) as mock_get_collections:
+    with patch("src.core.database.qdrant._client") as mock_client:
+        mock_client.return_value.get_collections = AsyncMock()
         result = await check_qdrant_connection()
         assert result is True
-        mock_get_collections.assert_called_once()
+        mock_client.return_value.get_collections.assert_called_once()
+
+def test_postgres_engines_are_shared():
+    from src.core.database.postgres import engine, get_async_postgres_engine, get_postgres_engine
+    assert get_async_postgres_engine() is engine
+    assert get_postgres_engine() is get_postgres_engine()
+
+@pytest.mark.asyncio
+async def test_close_qdrant():
+    from src.core.database.qdrant import close_qdrant
+    with patch("src.core.database.qdrant._client") as mock_client:
+        mock_client.cache_info.return_value.currsize = 1
+        mock_client.return_value.close = AsyncMock()
+        await close_qdrant()
+        mock_client.return_value.close.assert_called_once()
+        mock_client.cache_clear.assert_called_once()
+
+def test_qdrant_client_is_lazy_singleton():
+    from src.core.database.qdrant import _client
+    _client.cache_clear()
+    assert _client() is _client()
+    _client.cache_clear()
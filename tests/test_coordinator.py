@@ -1,12 +1,15 @@
 """Tests for Coordinator Agents."""
 
+import asyncio
 import pytest
 import pytest_asyncio
-from unittest.mock import Mock, AsyncMock, patch, MagicMock
+from unittest.mock import Mock, AsyncMock, patch, MagicMock, call
 import json
-from src.core.agents.coordinator import CoordinatorAgent, coordinator
+import threading
+from src.core.agents.coordinator import CoordinatorAgent, coordinator, ToolCall, _JsonObjectScanner
 from src.core.agents.enhanced_coordinator import EnhancedCoordinator, enhanced_coordinator
 from src.core.config import settings
+from src.core.cache.semantic_cache import context_key
 
 
 class TestCoordinatorAgent:
@@ -24,8 +27,8 @@ class TestCoordinatorAgent:
         agent = CoordinatorAgent()
 
         with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
-            mock_memory.get_session = Mock(return_value=None)
-            mock_memory.get_messages = Mock(return_value=[])
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
             mock_memory.add_message = Mock()
             mock_memory.add_message_async = AsyncMock()
 
@@ -48,14 +51,45 @@ class TestCoordinatorAgent:
 
                     assert "".join(chunks) == "Hello world"
 
+    @pytest.mark.asyncio
+    async def test_run_stream_writes_messages_off_event_loop(self):
+        """Test run_stream persists messages from a worker thread."""
+        agent = CoordinatorAgent()
+        loop_thread = threading.get_ident()
+        writes = []
+
+        with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
+            mock_memory.add_message = Mock(
+                side_effect=lambda sid, role, content: writes.append((role, threading.get_ident()))
+            )
+
+            with patch('src.core.agents.coordinator.get_llm', new_callable=AsyncMock) as mock_get_llm:
+                mock_llm = AsyncMock()
+                async def mock_stream(*args, **kwargs):
+                    yield {"content": "Hello"}
+
+                mock_llm.chat_stream = mock_stream
+                mock_get_llm.return_value = mock_llm
+
+                with patch('src.core.agents.coordinator.tool_registry') as mock_registry:
+                    mock_registry.list_tools = Mock(return_value=[])
+
+                    async for _ in agent.run_stream("session-123", "Hi there"):
+                        pass
+
+        assert [role for role, _ in writes] == ["user", "assistant"]
+        assert all(tid != loop_thread for _, tid in writes)
+
     @pytest.mark.asyncio
     async def test_run_stream_with_tool_call(self):
         """Test run_stream with tool execution."""
         agent = CoordinatorAgent()
 
         with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
-            mock_memory.get_session = Mock(return_value=None)
-            mock_memory.get_messages = Mock(return_value=[])
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
             mock_memory.add_message = Mock()
             mock_memory.add_message_async = AsyncMock()
 
@@ -99,9 +133,9 @@ class TestCoordinatorAgent:
         mock_project.context_summary = "Project about AI development"
 
         with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
-            mock_memory.get_session = Mock(return_value=mock_session)
-            mock_memory.get_project = Mock(return_value=mock_project)
-            mock_memory.get_messages = Mock(return_value=[])
+            mock_memory.get_session_async = AsyncMock(return_value=mock_session)
+            mock_memory.get_project_async = AsyncMock(return_value=mock_project)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
             mock_memory.add_message = Mock()
             mock_memory.add_message_async = AsyncMock()
 
@@ -134,13 +168,13 @@ class TestCoordinatorAgent:
         long_content = "A" * int(settings.MAX_HISTORY_TOKENS * 5)  # ~5x the limit
 
         mock_messages = [
-            Mock(role="user", content=long_content)
+            {"role": "user", "content": long_content}
         ]
 
         with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
-            mock_memory.get_session = Mock(return_value=None)
-            mock_memory.get_messages = Mock(return_value=mock_messages)
-            mock_memory.update_messages = Mock()
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=mock_messages)
+            mock_memory.update_messages_async = AsyncMock()
             mock_memory.add_message = Mock()
             mock_memory.add_message_async = AsyncMock()
 
@@ -171,8 +205,8 @@ class TestCoordinatorAgent:
         agent = CoordinatorAgent()
 
         with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
-            mock_memory.get_session = Mock(return_value=None)
-            mock_memory.get_messages = Mock(return_value=[])
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
             mock_memory.add_message = Mock()
             mock_memory.add_message_async = AsyncMock()
 
@@ -209,8 +243,8 @@ class TestCoordinatorAgent:
         agent = CoordinatorAgent()
 
         with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
-            mock_memory.get_session = Mock(return_value=None)
-            mock_memory.get_messages = Mock(return_value=[])
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
             mock_memory.add_message = Mock()
             mock_memory.add_message_async = AsyncMock()
 
@@ -235,6 +269,230 @@ class TestCoordinatorAgent:
                     assert "".join(chunks) == '{invalid json'
 
 
+    @pytest.mark.asyncio
+    async def test_run_stream_dispatches_tool_when_json_closes(self):
+        """Test that the tool is called without waiting for the end of the stream."""
+        agent = CoordinatorAgent()
+
+        with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
+            mock_memory.add_message = Mock()
+
+            with patch('src.core.agents.coordinator.get_llm', new_callable=AsyncMock) as mock_get_llm:
+                mock_llm = AsyncMock()
+                consumed = []
+
+                responses = [
+                    ['{"tool": "test_tool", ', '"arguments": {"q": "a}b"}}', ' trailing', ' tokens'],
+                    ["Done"]
+                ]
+                response_iter = iter(responses)
+
+                async def mock_stream(*args, **kwargs):
+                    for content in next(response_iter):
+                        consumed.append(content)
+                        yield {"content": content}
+
+                mock_llm.chat_stream = mock_stream
+                mock_get_llm.return_value = mock_llm
+
+                with patch('src.core.agents.coordinator.tool_registry') as mock_registry:
+                    mock_registry.call_tool = AsyncMock(return_value="tool output")
+
+                    chunks = []
+                    async for chunk in agent.run_stream("session-123", "Use tool"):
+                        chunks.append(chunk)
+
+                    mock_registry.call_tool.assert_called_once_with("test_tool", {"q": "a}b"})
+                    assert " trailing" not in consumed
+                    assert "".join(chunks) == "Done"
+
+    @pytest.mark.asyncio
+    async def test_run_stream_closes_llm_stream_before_tool_call(self):
+        """Test that the LLM stream is closed as soon as the tool call is complete."""
+        agent = CoordinatorAgent()
+
+        with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
+            mock_memory.add_message = Mock()
+
+            with patch('src.core.agents.coordinator.get_llm', new_callable=AsyncMock) as mock_get_llm:
+                mock_llm = AsyncMock()
+                events = []
+
+                responses = [
+                    ['{"tool": "test_tool", "arguments": {}}', ' trailing'],
+                    ["Done"]
+                ]
+                response_iter = iter(responses)
+
+                async def mock_stream(*args, **kwargs):
+                    try:
+                        for content in next(response_iter):
+                            yield {"content": content}
+                    finally:
+                        events.append("stream closed")
+
+                mock_llm.chat_stream = mock_stream
+                mock_get_llm.return_value = mock_llm
+
+                async def mock_call_tool(*args, **kwargs):
+                    events.append("tool called")
+                    return "tool output"
+
+                with patch('src.core.agents.coordinator.tool_registry') as mock_registry:
+                    mock_registry.call_tool = mock_call_tool
+
+                    async for _ in agent.run_stream("session-123", "Use tool"):
+                        pass
+
+                    assert events[:2] == ["stream closed", "tool called"]
+
+    @pytest.mark.asyncio
+    async def test_run_stream_tool_call_detected_after_whitespace(self):
+        """Test that leading whitespace chunks don't hide a tool call."""
+        agent = CoordinatorAgent()
+
+        with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
+            mock_memory.add_message = Mock()
+
+            with patch('src.core.agents.coordinator.get_llm', new_callable=AsyncMock) as mock_get_llm:
+                mock_llm = AsyncMock()
+
+                responses = [
+                    ["\n", '  {"tool": "test_tool", "arguments": {}}'],
+                    ["Answer with {braces} inside"]
+                ]
+                response_iter = iter(responses)
+
+                async def mock_stream(*args, **kwargs):
+                    for content in next(response_iter):
+                        yield {"content": content}
+
+                mock_llm.chat_stream = mock_stream
+                mock_get_llm.return_value = mock_llm
+
+                with patch('src.core.agents.coordinator.tool_registry') as mock_registry:
+                    mock_registry.call_tool = AsyncMock(return_value="tool output")
+
+                    chunks = []
+                    async for chunk in agent.run_stream("session-123", "Use tool"):
+                        chunks.append(chunk)
+
+                    mock_registry.call_tool.assert_called_once_with("test_tool", {})
+                    assert "".join(chunks) == "\nAnswer with {braces} inside"
+
+    @pytest.mark.asyncio
+    async def test_run_stream_yields_json_without_tool(self):
+        """Test that JSON output not shaped like a tool call is shown to the user."""
+        agent = CoordinatorAgent()
+
+        with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
+            mock_memory.add_message = Mock()
+
+            with patch('src.core.agents.coordinator.get_llm', new_callable=AsyncMock) as mock_get_llm:
+                mock_llm = AsyncMock()
+
+                async def mock_stream(*args, **kwargs):
+                    yield {"content": '{"answer": 42}'}
+
+                mock_llm.chat_stream = mock_stream
+                mock_get_llm.return_value = mock_llm
+
+                with patch('src.core.agents.coordinator.tool_registry') as mock_registry:
+                    mock_registry.call_tool = AsyncMock()
+
+                    chunks = []
+                    async for chunk in agent.run_stream("session-123", "Give JSON"):
+                        chunks.append(chunk)
+
+                    mock_registry.call_tool.assert_not_called()
+                    assert "".join(chunks) == '{"answer": 42}'
+
+    def test_tool_call_model(self):
+        """Test ToolCall validation of LLM output."""
+        action = ToolCall.model_validate_json('{"tool": "search"}')
+        assert action.tool == "search"
+        assert action.arguments == {}
+
+    def test_json_object_scanner(self):
+        """Test brace tracking across chunks, strings and escapes."""
+        scanner = _JsonObjectScanner()
+        assert scanner.feed('  {"a": "{\\"}') == -1
+        assert scanner.feed('", "b": {}}') == 11
+
+    @pytest.mark.asyncio
+    async def test_run_stream_exact_cache_hit(self):
+        """Test that an identical prompt is answered from the exact-match cache."""
+        agent = CoordinatorAgent()
+        agent.temperature = 0.0
+
+        with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
+            mock_memory.add_message = Mock()
+
+            with patch('src.core.agents.coordinator.get_llm', new_callable=AsyncMock) as mock_get_llm:
+                mock_llm = AsyncMock()
+                calls = []
+
+                async def mock_stream(*args, **kwargs):
+                    calls.append(args)
+                    yield {"content": "Cached once"}
+
+                mock_llm.chat_stream = mock_stream
+                mock_get_llm.return_value = mock_llm
+
+                with patch('src.core.agents.coordinator.tool_registry') as mock_registry:
+                    mock_registry.list_tools = Mock(return_value=[])
+
+                    for _ in range(2):
+                        chunks = []
+                        async for chunk in agent.run_stream("session-123", "Hi"):
+                            chunks.append(chunk)
+                        assert "".join(chunks) == "Cached once"
+
+                    assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_run_stream_exact_cache_disabled_at_high_temperature(self):
+        """Test that sampled responses are never replayed."""
+        agent = CoordinatorAgent()
+        agent.temperature = 0.7
+
+        with patch('src.core.agents.coordinator.memory_manager') as mock_memory:
+            mock_memory.get_session_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
+            mock_memory.add_message = Mock()
+
+            with patch('src.core.agents.coordinator.get_llm', new_callable=AsyncMock) as mock_get_llm:
+                mock_llm = AsyncMock()
+                calls = []
+
+                async def mock_stream(*args, **kwargs):
+                    calls.append(args)
+                    yield {"content": "Fresh"}
+
+                mock_llm.chat_stream = mock_stream
+                mock_get_llm.return_value = mock_llm
+
+                with patch('src.core.agents.coordinator.tool_registry') as mock_registry:
+                    mock_registry.list_tools = Mock(return_value=[])
+
+                    for _ in range(2):
+                        async for _ in agent.run_stream("session-123", "Hi"):
+                            pass
+
+                    assert len(calls) == 2
+                    assert len(agent._exact_cache) == 0
+
+
 class TestEnhancedCoordinator:
     """Test cases for EnhancedCoordinator."""
 
@@ -264,8 +522,8 @@ class TestEnhancedCoordinator:
             coordinator = EnhancedCoordinator()
 
             with patch('src.core.agents.enhanced_coordinator.memory_manager') as mock_memory:
-                mock_memory.get_session = Mock(return_value=None)
-                mock_memory.get_messages = Mock(return_value=[])
+                mock_memory.get_session_async = AsyncMock(return_value=None)
+                mock_memory.get_history_async = AsyncMock(return_value=[])
                 mock_memory.add_message = Mock()
                 mock_memory.add_message_async = AsyncMock()
 
@@ -289,16 +547,51 @@ class TestEnhancedCoordinator:
             coordinator = EnhancedCoordinator()
 
             with patch('src.core.agents.enhanced_coordinator.memory_manager') as mock_memory:
-                mock_memory.get_session = Mock(return_value=None)
-                mock_memory.get_messages = Mock(return_value=[])
+                mock_memory.get_session_async = AsyncMock(return_value=None)
+                mock_memory.get_history_async = AsyncMock(return_value=[])
                 mock_memory.add_message = Mock()
                 mock_memory.add_message_async = AsyncMock()
 
                 async for _ in coordinator.run_stream("session-123", "Test"):
                     pass
 
-                # Verify response was saved
-                mock_memory.add_message_async.assert_called_with("session-123", "assistant", "The answer is 42")
+                # Verify both messages were saved, the user's before the workflow ran
+                assert mock_memory.add_message_async.call_args_list == [
+                    call("session-123", "user", "Test"),
+                    call("session-123", "assistant", "The answer is 42"),
+                ]
+
+    @pytest.mark.asyncio
+    async def test_run_stream_concurrent_turns_save_own_reply(self):
+        """Test that two turns on one session each persist their own answer."""
+        with patch('src.core.agents.enhanced_coordinator.get_workflow') as mock_get_workflow:
+            mock_workflow = Mock()
+            async def mock_stream_fn(session_id, user_input, history):
+                await asyncio.sleep(0)
+                yield {"coordinator": {"final_response": f"Answer to {user_input}"}}
+            mock_workflow.stream = mock_stream_fn
+            mock_get_workflow.return_value = mock_workflow
+
+            coordinator = EnhancedCoordinator()
+
+            with patch('src.core.agents.enhanced_coordinator.memory_manager') as mock_memory:
+                mock_memory.get_session_async = AsyncMock(return_value=None)
+                mock_memory.get_history_async = AsyncMock(return_value=[])
+                mock_memory.add_message_async = AsyncMock()
+
+                async def turn(text):
+                    async for _ in coordinator.run_stream("session-123", text):
+                        pass
+
+                await asyncio.gather(turn("A"), turn("B"))
+
+                saved = [c.args for c in mock_memory.add_message_async.call_args_list]
+                assert sorted(saved) == [
+                    ("session-123", "assistant", "Answer to A"),
+                    ("session-123", "assistant", "Answer to B"),
+                    ("session-123", "user", "A"),
+                    ("session-123", "user", "B"),
+                ]
 
     @pytest.mark.asyncio
     async def test_run_stream_with_user_profile(self):
@@ -313,21 +606,117 @@ class TestEnhancedCoordinator:
             coordinator = EnhancedCoordinator()
 
             with patch('src.core.agents.enhanced_coordinator.memory_manager') as mock_memory:
-                mock_memory.get_session = Mock(return_value=None)
-                mock_memory.get_messages = Mock(return_value=[])
+                mock_memory.get_session_async = AsyncMock(return_value=None)
+                mock_memory.get_history_async = AsyncMock(return_value=[])
                 mock_memory.add_message = Mock()
                 mock_memory.add_message_async = AsyncMock()
 
                 with patch('src.core.agents.enhanced_coordinator.user_profile_manager') as mock_profile:
                     mock_profile.get_profile = Mock(return_value="User: John, Developer")
-                    mock_profile.update_profile = AsyncMock()
+                    mock_profile.enqueue_update = Mock()
 
-                    with patch('src.core.agents.enhanced_coordinator.asyncio'):
-                        async for _ in coordinator.run_stream("session-123", "Test"):
-                            pass
+                    async for _ in coordinator.run_stream("session-123", "Test"):
+                        pass
+
+                    # Verify profile was retrieved and an update queued
+                    mock_profile.get_profile.assert_called_once()
+                    mock_profile.enqueue_update.assert_called_once_with("Test")
+
+                    mock_profile.enqueue_update.assert_called_once_with("Test")
+
+    @pytest.mark.asyncio
+    async def test_run_stream_semantic_cache_hit(self):
+        """Test that a semantic cache hit skips the workflow."""
+        with patch('src.core.agents.enhanced_coordinator.get_workflow') as mock_get_workflow:
+            mock_workflow = Mock()
+            mock_workflow.stream = Mock()
+            mock_get_workflow.return_value = mock_workflow
+
+            coordinator = EnhancedCoordinator()
+
+            with patch('src.core.agents.enhanced_coordinator.memory_manager') as mock_memory, \
+                 patch('src.core.agents.enhanced_coordinator.semantic_cache') as mock_cache, \
+                 patch('src.core.agents.enhanced_coordinator.settings',
+                       settings.model_copy(update={"SEMANTIC_CACHE_ENABLED": True})):
+                mock_memory.get_session_async = AsyncMock(return_value=None)
+                mock_memory.get_history_async = AsyncMock(return_value=[])
+                mock_memory.add_message_async = AsyncMock()
+                mock_cache.embed = AsyncMock(return_value=[0.1, 0.2])
+                mock_cache.lookup = AsyncMock(return_value="Cached answer")
+
+                chunks = []
+                async for chunk in coordinator.run_stream("session-123", "Test"):
+                    chunks.append(chunk)
+
+                assert "".join(c["content"] for c in chunks) == "Cached answer"
+                mock_cache.lookup.assert_called_once_with([0.1, 0.2], "session-123", "")
+                mock_workflow.stream.assert_not_called()
+                mock_memory.add_message_async.assert_called_with("session-123", "assistant", "Cached answer")
+
+    @pytest.mark.asyncio
+    async def test_run_stream_semantic_cache_off_by_default(self):
+        """Test that the semantic cache is not consulted unless enabled."""
+        with patch('src.core.agents.enhanced_coordinator.get_workflow') as mock_get_workflow:
+            mock_workflow = Mock()
+            async def mock_stream_fn(*args, **kwargs):
+                yield {"coordinator": {"final_response": "Fresh answer"}}
+            mock_workflow.stream = mock_stream_fn
+            mock_get_workflow.return_value = mock_workflow
+
+            coordinator = EnhancedCoordinator()
+
+            with patch('src.core.agents.enhanced_coordinator.memory_manager') as mock_memory, \
+                 patch('src.core.agents.enhanced_coordinator.semantic_cache') as mock_cache:
+                mock_memory.get_session_async = AsyncMock(return_value=None)
+                mock_memory.get_history_async = AsyncMock(return_value=[])
+                mock_memory.add_message_async = AsyncMock()
+
+                async for _ in coordinator.run_stream("session-123", "Test"):
+                    pass
+
+                assert settings.SEMANTIC_CACHE_ENABLED is False
+                mock_cache.embed.assert_not_called()
+                mock_cache.lookup.assert_not_called()
+                mock_cache.store.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_run_stream_semantic_cache_miss_stores(self):
+        """Test that a cache miss stores the generated response."""
+        with patch('src.core.agents.enhanced_coordinator.get_workflow') as mock_get_workflow:
+            mock_workflow = Mock()
+            async def mock_stream_fn(*args, **kwargs):
+                yield {"coordinator": {"final_response": "Fresh answer"}}
+            mock_workflow.stream = mock_stream_fn
+            mock_get_workflow.return_value = mock_workflow
+
+            coordinator = EnhancedCoordinator()
+
+            mock_session = Mock()
+            mock_session.project_id = "project-1"
+
+            history = [
+                {"role": "user", "content": "List two rivers"},
+                {"role": "assistant", "content": "Nile and Danube"},
+            ]
+
+            with patch('src.core.agents.enhanced_coordinator.memory_manager') as mock_memory, \
+                 patch('src.core.agents.enhanced_coordinator.semantic_cache') as mock_cache, \
+                 patch('src.core.agents.enhanced_coordinator.settings',
+                       settings.model_copy(update={"SEMANTIC_CACHE_ENABLED": True})):
+                mock_memory.get_session_async = AsyncMock(return_value=mock_session)
+                mock_memory.get_project_async = AsyncMock(return_value=None)
+                mock_memory.get_history_async = AsyncMock(return_value=history)
+                mock_memory.add_message_async = AsyncMock()
+                mock_cache.embed = AsyncMock(return_value=[0.1, 0.2])
+                mock_cache.lookup = AsyncMock(return_value=None)
+                mock_cache.store = AsyncMock()
+
+                async for _ in coordinator.run_stream("session-123", "Test"):
+                    pass
 
-                        # Verify profile was retrieved
-                        mock_profile.get_profile.assert_called_once()
+                context = context_key(history)
+                mock_cache.lookup.assert_called_once_with([0.1, 0.2], "project-1", context)
+                mock_cache.store.assert_called_once_with([0.1, 0.2], "project-1", "Test", "Fresh answer", context)
 
 
 class TestCoordinatorSingletons:
@@ -4,7 +4,7 @@ from src.core.agents.scraper_agent import ScraperAgent, ScrapedContent
 
 class TestCrawler:
     @pytest.mark.asyncio
-    async def test_crawl_follows_links(self):
+    async def test_crawl_follows_links(self, mock_aiohttp_session):
         """Test that crawler follows links to the next level."""
         agent = ScraperAgent()
         
@@ -12,22 +12,19 @@ class TestCrawler:
         # Page 1 links to Page 2
         # Page 2 has no links
         
-        with patch('httpx.AsyncClient') as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(agent, '_get_session') as mock_get_session:
             
-            async def get_side_effect(url):
+            def get_side_effect(url):
                 mock_resp = Mock()
-                mock_resp.raise_for_status = Mock()
                 if url == "http://example.com/":
                     mock_resp.text = '<html><body><a href="/page2">Page 2</a></body></html>'
                 elif url == "http://example.com/page2":
                     mock_resp.text = '<html><body><h1>Page 2 Content</h1></body></html>'
                 else:
                     mock_resp.text = ""
-                return mock_resp
+                return mock_resp.text
             
-            mock_client.get = AsyncMock(side_effect=get_side_effect)
+            mock_get_session.return_value = mock_aiohttp_session(get_side_effect)
             
             results = await agent.crawl("http://example.com/", max_depth=2, max_pages=5)
             
@@ -37,17 +34,14 @@ class TestCrawler:
             assert "http://example.com/page2" in urls
 
     @pytest.mark.asyncio
-    async def test_crawl_depth_limit(self):
+    async def test_crawl_depth_limit(self, mock_aiohttp_session):
         """Test that crawler respects max_depth."""
         agent = ScraperAgent()
         
-        with patch('httpx.AsyncClient') as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(agent, '_get_session') as mock_get_session:
             
-            async def get_side_effect(url):
+            def get_side_effect(url):
                 mock_resp = Mock()
-                mock_resp.raise_for_status = Mock()
                 # Chain of links: p1 -> p2 -> p3 -> p4
                 current_num = 1
                 if url != "http://example.com/":
@@ -55,9 +49,9 @@ class TestCrawler:
                 
                 next_page = f"/page{current_num + 1}"
                 mock_resp.text = f'<html><body><a href="{next_page}">Next</a></body></html>'
-                return mock_resp
+                return mock_resp.text
             
-            mock_client.get = AsyncMock(side_effect=get_side_effect)
+            mock_get_session.return_value = mock_aiohttp_session(get_side_effect)
             
             # Depth 1 means start page (depth 0) + 1 level of links
             results = await agent.crawl("http://example.com/", max_depth=1, max_pages=10)
@@ -68,17 +62,14 @@ class TestCrawler:
             assert len(results) == 2
             
     @pytest.mark.asyncio
-    async def test_crawl_max_pages(self):
+    async def test_crawl_max_pages(self, mock_aiohttp_session):
         """Test that crawler respects max_pages."""
         agent = ScraperAgent()
         
-        with patch('httpx.AsyncClient') as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(agent, '_get_session') as mock_get_session:
             
-            async def get_side_effect(url):
+            def get_side_effect(url):
                 mock_resp = Mock()
-                mock_resp.raise_for_status = Mock()
                 # Fan out: page 1 links to p2, p3, p4, p5
                 if url == "http://example.com/":
                     mock_resp.text = """
@@ -91,9 +82,9 @@ class TestCrawler:
                     """
                 else:
                     mock_resp.text = "<html>Content</html>"
-                return mock_resp
+                return mock_resp.text
             
-            mock_client.get = AsyncMock(side_effect=get_side_effect)
+            mock_get_session.return_value = mock_aiohttp_session(get_side_effect)
             
             # Limit to 3 pages total
             results = await agent.crawl("http://example.com/", max_depth=2, max_pages=3)
@@ -101,17 +92,14 @@ class TestCrawler:
             assert len(results) == 3
 
     @pytest.mark.asyncio
-    async def test_crawl_external_links_ignored(self):
+    async def test_crawl_external_links_ignored(self, mock_aiohttp_session):
         """Test that crawler ignores external links."""
         agent = ScraperAgent()
         
-        with patch('httpx.AsyncClient') as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(agent, '_get_session') as mock_get_session:
             
-            async def get_side_effect(url):
+            def get_side_effect(url):
                 mock_resp = Mock()
-                mock_resp.raise_for_status = Mock()
                 if url == "http://example.com/":
                     mock_resp.text = """
                     <html><body>
@@ -124,12 +112,84 @@ class TestCrawler:
                 else:
                     # Should not be called for external
                     mock_resp.text = ""
-                return mock_resp
+                return mock_resp.text
             
-            mock_client.get = AsyncMock(side_effect=get_side_effect)
+            mock_get_session.return_value = mock_aiohttp_session(get_side_effect)
             
             results = await agent.crawl("http://example.com/", max_depth=2, max_pages=10)
             
             urls = [r.url for r in results]
             assert "http://example.com/internal" in urls
             assert "http://google.com" not in urls
+
+    @pytest.mark.asyncio
+    async def test_crawl_failed_page_frees_slot(self, mock_aiohttp_session):
+        """Test that a failed fetch does not use up one of max_pages."""
+        agent = ScraperAgent()
+
+        with patch.object(agent, '_get_session') as mock_get_session:
+            def get_side_effect(url):
+                if url == "http://example.com/":
+                    return '<html><body><a href="/broken">B</a><a href="/ok">O</a></body></html>'
+                if url == "http://example.com/broken":
+                    raise Exception("Connection reset")
+                return "<html><body><p>OK page</p></body></html>"
+
+            mock_get_session.return_value = mock_aiohttp_session(get_side_effect)
+
+            results = await agent.crawl("http://example.com/", max_depth=1, max_pages=2)
+
+            urls = sorted(r.url for r in results)
+            assert urls == ["http://example.com/", "http://example.com/ok"]
+
+    @pytest.mark.asyncio
+    async def test_crawl_fetches_each_url_once(self, mock_aiohttp_session):
+        """Test that pages linking to each other are only fetched once."""
+        agent = ScraperAgent()
+
+        with patch.object(agent, '_get_session') as mock_get_session:
+
+            def get_side_effect(url):
+                # Every page links back to the start page and to each other
+                return """
+                <html><body>
+                    <a href="/">Home</a>
+                    <a href="/a">A</a>
+                    <a href="/b">B</a>
+                </body></html>
+                """
+
+            session = mock_aiohttp_session(get_side_effect)
+            mock_get_session.return_value = session
+
+            results = await agent.crawl("http://example.com/", max_depth=3, max_pages=10)
+
+            fetched = [c[0][0] for c in session.get.call_args_list]
+            assert sorted(fetched) == ["http://example.com/", "http://example.com/a", "http://example.com/b"]
+            assert len(results) == 3
+
+    @pytest.mark.asyncio
+    async def test_crawl_fetches_directory_links_with_slash(self, mock_aiohttp_session):
+        """Test that directory URLs are fetched as written, not canonicalized."""
+        agent = ScraperAgent()
+
+        with patch.object(agent, '_get_session') as mock_get_session:
+
+            def get_side_effect(url):
+                if url == "http://example.com/":
+                    return '<html><body><a href="/docs/">Docs</a><a href="/docs">Docs</a></body></html>'
+                if url == "http://example.com/docs/":
+                    return '<html><body><a href="intro">Intro</a></body></html>'
+                return "<html><body><p>Leaf</p></body></html>"
+
+            session = mock_aiohttp_session(get_side_effect)
+            mock_get_session.return_value = session
+
+            await agent.crawl("http://example.com/", max_depth=3, max_pages=10)
+
+            fetched = [c[0][0] for c in session.get.call_args_list]
+            assert fetched == [
+                "http://example.com/",
+                "http://example.com/docs/",
+                "http://example.com/docs/intro",
+            ]
@@ -16,14 +16,14 @@ class TestFullChain:
              patch('src.core.graph.workflow.get_llm', new_callable=AsyncMock) as mock_get_llm:
             
             # Setup Tools
-            mock_registry.list_tools.return_value = [{"name": "fake_tool", "description": "desc", "inputSchema": {}}]
+            mock_registry.tools_json_indented = '[{"name": "fake_tool", "description": "desc", "inputSchema": {}}]'
 
             # 1. Setup Memory Retrieval
             
             # 1. Setup Memory Retrieval
             mock_memory.search_relevant_history = AsyncMock(return_value="RAG Context")
             mock_graph.retrieve_context = AsyncMock(return_value="Graph Context")
-            mock_memory.get_session = Mock(return_value=Mock(project_id="p1"))
+            mock_memory.get_session_async = AsyncMock(return_value=Mock(project_id="p1"))
             
             # 2. Setup LLM for Router (decides NO search) and Coordinator
             mock_client = AsyncMock()
@@ -70,7 +70,9 @@ class TestFullChain:
              
             # Setup Memory Manager Mocks
             mock_memory.add_message_async = AsyncMock()
-            mock_memory.get_session.return_value = Mock(project_id="p1")
+            mock_memory.get_session_async = AsyncMock(return_value=Mock(project_id="p1"))
+            mock_memory.get_project_async = AsyncMock(return_value=None)
+            mock_memory.get_history_async = AsyncMock(return_value=[])
 
             # Setup Workflow to yield a "coordinator" event with prepared messages
             mock_wf_instance = Mock()
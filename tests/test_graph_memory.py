@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import Mock, AsyncMock, patch
 from src.core.memory.graph_memory import GraphMemory
@@ -26,16 +27,58 @@ class TestGraphMemory:
             # Setup Neo4j mock
             mock_db = AsyncMock()
             mock_get_neo4j.return_value = mock_db
-            mock_db.execute_write = AsyncMock()
+            mock_db.execute_write_many = AsyncMock()
             
             graph = GraphMemory()
             await graph.extract_and_store("Some text")
             
             # Verify Neo4j was called
-            mock_db.execute_write.assert_called()
+            mock_db.execute_write_many.assert_called_once()
             # Check the cypher query in the call args contains appropriate MERGE
-            call_args = mock_db.execute_write.call_args_list[0]
-            assert "MERGE (n:Concept {id: $id})" in call_args[0][0]
+            query, params = mock_db.execute_write_many.call_args[0][0][0]
+            assert "MERGE (n:Concept {id: row.id})" in query
+            assert params == {"rows": [{"id": "TestEntity", "props": {}}]}
+
+    async def test_store_subgraph_batches_by_label_and_type(self):
+        """Test one write per label and relationship type; unsafe names are skipped."""
+        with patch('src.core.memory.graph_memory.get_neo4j', new_callable=AsyncMock) as mock_get_neo4j:
+            mock_db = AsyncMock()
+            mock_get_neo4j.return_value = mock_db
+
+            graph = GraphMemory()
+            await graph._store_subgraph({
+                "nodes": [
+                    {"id": "John", "label": "Person"},
+                    {"id": "Jane", "label": "Person"},
+                    {"id": "Python", "label": "Technology", "version": "3.11"},
+                    {"id": "Evil", "label": "Person) DETACH DELETE (m"}
+                ],
+                "edges": [
+                    {"source": "John", "target": "Python", "type": "USES"},
+                    {"source": "Jane", "target": "Python", "type": "USES"}
+                ]
+            })
+
+            # Everything goes out in one transaction
+            mock_db.execute_write_many.assert_called_once()
+            statements = mock_db.execute_write_many.call_args[0][0]
+            assert len(statements) == 3
+            assert "MERGE (n:Person {id: row.id})" in statements[0][0]
+            assert [row["id"] for row in statements[0][1]["rows"]] == ["John", "Jane"]
+            assert statements[1][1]["rows"] == [{"id": "Python", "props": {"version": "3.11"}}]
+            assert "MERGE (a)-[r:USES]->(b)" in statements[2][0]
+            assert len(statements[2][1]["rows"]) == 2
+            mock_db.execute_write.assert_not_called()
+
+    async def test_store_subgraph_empty_skips_write(self):
+        """Test that an empty extraction opens no transaction."""
+        with patch('src.core.memory.graph_memory.get_neo4j', new_callable=AsyncMock) as mock_get_neo4j:
+            mock_db = AsyncMock()
+            mock_get_neo4j.return_value = mock_db
+
+            await GraphMemory()._store_subgraph({"nodes": [], "edges": []})
+
+            mock_db.execute_write_many.assert_not_called()
 
     async def test_retrieve_context(self):
         """Test context retrieval."""
@@ -47,11 +90,109 @@ class TestGraphMemory:
             
             # Mock return for generic query
             mock_db.execute_read.return_value = [
-                {"n.id": "EntityA", "type(r)": "RELATED_TO", "m.id": "EntityB"}
+                {"source": "EntityA", "rel": "RELATED_TO", "target": "EntityB"},
+                {"source": "EntityA", "rel": "RELATED_TO", "target": "EntityB"}
             ]
             
             graph = GraphMemory()
-            result = await graph.retrieve_context("Tell me about EntityA")
+            result = await graph.retrieve_context("Tell me about EntityA, and entitya?")
             
             assert "GRAPH KNOWLEDGE" in result
-            assert "EntityA --[RELATED_TO]--> EntityB" in result
+            assert result.count("EntityA --[RELATED_TO]--> EntityB") == 1
+            # One query for all words, lower-cased and de-duplicated
+            mock_db.execute_read.assert_called_once()
+            assert mock_db.execute_read.call_args[0][1] == {"words": ["entitya"]}
+
+    async def test_retrieve_context_cached_until_write(self):
+        """Test that repeated queries skip Neo4j until the graph is written."""
+        with patch('src.core.memory.graph_memory.get_neo4j', new_callable=AsyncMock) as mock_get_neo4j:
+            mock_db = AsyncMock()
+            mock_get_neo4j.return_value = mock_db
+            mock_db.execute_read.return_value = []
+
+            graph = GraphMemory()
+            assert await graph.retrieve_context("Tell me about EntityA") == ""
+            assert await graph.retrieve_context("tell me ABOUT entitya") == ""
+            assert mock_db.execute_read.call_count == 1
+
+            await graph._store_subgraph({"nodes": [{"id": "EntityA", "label": "Concept"}], "edges": []})
+            await graph.retrieve_context("Tell me about EntityA")
+            assert mock_db.execute_read.call_count == 2
+
+    async def test_retrieve_context_short_words_skip_query(self):
+        """Test that a query without usable words never reaches Neo4j."""
+        with patch('src.core.memory.graph_memory.get_neo4j', new_callable=AsyncMock) as mock_get_neo4j:
+            graph = GraphMemory()
+            assert await graph.retrieve_context("hi, how are you") == ""
+            assert await graph.retrieve_context("What would you like?") == ""
+            mock_get_neo4j.assert_not_called()
+
+    async def test_schedule_extract_and_store(self):
+        """Test background extraction, one at a time per user, queuing the rest."""
+        graph = GraphMemory()
+        release = asyncio.Event()
+
+        async def extract(text, user_id=None):
+            await release.wait()
+            return {"nodes": [], "edges": []}
+
+        with patch.object(graph, 'extract_and_store', side_effect=extract) as mock_extract:
+            task = graph.schedule_extract_and_store("Some text", "user-1")
+            assert graph.schedule_extract_and_store("More text", "user-1") is None
+            other = graph.schedule_extract_and_store("Other text", "user-2")
+
+            release.set()
+            assert await task == {"nodes": [], "edges": []}
+            await other
+            await asyncio.sleep(0)
+
+            assert sorted(c.args for c in mock_extract.call_args_list) == [
+                ("More text", "user-1"),
+                ("Other text", "user-2"),
+                ("Some text", "user-1"),
+            ]
+            assert graph._background_tasks == set()
+            later = graph.schedule_extract_and_store("Later text", "user-1")
+            assert later is not None
+            await later
+
+    async def test_schedule_extract_and_store_coalesces_queued_texts(self):
+        """Test that texts queued during an extraction are extracted together."""
+        graph = GraphMemory()
+        release = asyncio.Event()
+
+        async def extract(text, user_id=None):
+            await release.wait()
+            return text
+
+        with patch.object(graph, 'extract_and_store', side_effect=extract) as mock_extract:
+            task = graph.schedule_extract_and_store("First")
+            assert graph.schedule_extract_and_store("Second") is None
+            assert graph.schedule_extract_and_store("Third") is None
+
+            release.set()
+            assert await task == "Second\n\nThird"
+            assert [c.args[0] for c in mock_extract.call_args_list] == ["First", "Second\n\nThird"]
+            assert graph._active_extractions == set()
+            assert graph._pending_texts == {}
+
+    async def test_schedule_extract_and_store_keeps_users_apart(self):
+        """Test that texts queued for different users are never extracted together."""
+        graph = GraphMemory()
+        release = asyncio.Event()
+
+        async def extract(text, user_id=None):
+            await release.wait()
+            return text
+
+        with patch.object(graph, 'extract_and_store', side_effect=extract) as mock_extract:
+            first = graph.schedule_extract_and_store("A1", "user-a")
+            second = graph.schedule_extract_and_store("B1", "user-b")
+            graph.schedule_extract_and_store("A2", "user-a")
+            graph.schedule_extract_and_store("B2", "user-b")
+
+            release.set()
+            await asyncio.gather(first, second)
+            assert sorted(c.args for c in mock_extract.call_args_list) == [
+                ("A1", "user-a"), ("A2", "user-a"), ("B1", "user-b"), ("B2", "user-b"),
+            ]
@@ -1,10 +1,11 @@
 """Tests for LangGraph Workflow."""
 
+import asyncio
 import pytest
 import pytest_asyncio
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
-from src.core.graph.workflow import MaskWorkflow, get_workflow
-from src.core.graph.state import AgentState
+from src.core.graph.workflow import MaskWorkflow, get_workflow, _normalize_message, _tools_block, _skip_memory_lookup, _estimate_crawl_budget
+from src.core.graph.state import AgentState, keep_history
 from src.core.agents.search_agent import SearchResult
 from src.core.agents.scraper_agent import ScrapedContent
 
@@ -29,6 +30,36 @@ class TestAgentState:
         # Optional fields should be accessible
         assert "needs_search" not in state or state.get("needs_search") is None
 
+    def test_keep_history(self):
+        """Test that the history is set once and then kept as is."""
+        history = [{"role": "user", "content": "Hi"}]
+        assert keep_history([], history) is history
+        assert keep_history(history, [{"role": "user", "content": "Other"}]) is history
+
+    @pytest.mark.asyncio
+    async def test_history_passed_by_reference(self):
+        """Test that every node sees the caller's history list, unconverted."""
+        from langgraph.graph import StateGraph, END
+
+        seen = []
+
+        async def node(state):
+            seen.append(state["messages"])
+            return state
+
+        graph = StateGraph(AgentState)
+        graph.add_node("a", node)
+        graph.add_node("b", node)
+        graph.set_entry_point("a")
+        graph.add_edge("a", "b")
+        graph.add_edge("b", END)
+
+        history = [{"role": "user", "content": "Hi"}]
+        await graph.compile().ainvoke(AgentState(messages=history, session_id="s", user_query="q"))
+
+        assert len(seen) == 2
+        assert all(messages is history for messages in seen)
+
 
 class TestMaskWorkflow:
     """Test cases for MaskWorkflow."""
@@ -78,6 +109,122 @@ class TestMaskWorkflow:
 
             assert result["needs_search"] is False
 
+    @pytest.mark.asyncio
+    async def test_router_node_parallel_extracts_queries(self):
+        """Test that queries are generated alongside the search decision."""
+        workflow = MaskWorkflow()
+
+        state = AgentState(
+            messages=[],
+            session_id="test-id",
+            user_query="What is the weather today?"
+        )
+
+        mock_agent = AsyncMock()
+        mock_agent.should_search.return_value = True
+        mock_agent.extract_search_queries.return_value = ["weather today"]
+
+        with patch('src.core.graph.workflow.get_search_agent', new_callable=AsyncMock) as mock_get_agent, \
+             patch('src.core.graph.workflow.settings') as mock_settings:
+            mock_get_agent.return_value = mock_agent
+            mock_settings.OLLAMA_NUM_PARALLEL = 4
+            result = await workflow.router_node(state)
+
+            assert result["needs_search"] is True
+            assert result["search_queries"] == ["weather today"]
+            mock_agent.extract_search_queries.assert_called_once_with("What is the weather today?")
+
+    def test_skip_memory_lookup(self):
+        """Test which queries bypass the memory lookup."""
+        assert _skip_memory_lookup("https://example.com/docs/getting-started")
+        assert _skip_memory_lookup("read https://example.com/docs/getting-started")
+        assert _skip_memory_lookup(" ok ")
+        assert not _skip_memory_lookup("What does https://example.com say about pricing plans?")
+        assert not _skip_memory_lookup("What is Python?")
+
+    @pytest.mark.asyncio
+    async def test_retrieve_node_skips_bare_url(self):
+        """Test that a bare URL query never touches the vector DB or Neo4j."""
+        workflow = MaskWorkflow()
+        state = AgentState(messages=[], session_id="test-id", user_query="https://example.com/article")
+
+        with patch('src.core.graph.workflow.memory_manager') as mock_memory, \
+             patch('src.core.graph.workflow.graph_memory') as mock_graph:
+            result = await workflow.retrieve_node(state)
+
+            assert result["memory_context"] == ""
+            mock_memory.search_relevant_history.assert_not_called()
+            mock_graph.retrieve_context.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_retrieve_node_tolerates_backend_failure(self):
+        """Test that a failing graph lookup keeps the RAG context."""
+        workflow = MaskWorkflow()
+        state = AgentState(messages=[], session_id="test-id", user_query="Test query")
+
+        with patch('src.core.graph.workflow.memory_manager') as mock_memory, \
+             patch('src.core.graph.workflow.graph_memory') as mock_graph:
+            mock_memory.get_session_async = AsyncMock(return_value=Mock(project_id="p1"))
+            mock_memory.search_relevant_history = AsyncMock(return_value="RAG Context")
+            mock_graph.retrieve_context = AsyncMock(side_effect=Exception("Neo4j down"))
+
+            result = await workflow.retrieve_node(state)
+
+            assert result["memory_context"] == "RAG Context"
+            mock_memory.search_relevant_history.assert_called_once_with("Test query", project_id="p1")
+
+    @pytest.mark.asyncio
+    async def test_prefetch_node_overlaps_retrieve_and_router(self):
+        """Test that memory retrieval and routing run concurrently."""
+        workflow = MaskWorkflow()
+        state = AgentState(messages=[], session_id="test-id", user_query="Test query")
+        started = []
+        release = asyncio.Event()
+
+        async def retrieve(s):
+            started.append("retrieve")
+            await release.wait()
+            s["rag_context"] = "rag"
+            return s
+
+        async def router(s):
+            started.append("router")
+            release.set()
+            s["needs_search"] = False
+            return s
+
+        workflow.retrieve_node = retrieve
+        workflow.router_node = router
+
+        result = await asyncio.wait_for(workflow.prefetch_node(state), timeout=1)
+
+        assert started == ["retrieve", "router"]
+        assert result["rag_context"] == "rag"
+        assert result["needs_search"] is False
+
+    @pytest.mark.asyncio
+    async def test_search_node_reuses_router_queries(self):
+        """Test that search node skips query generation when already done."""
+        workflow = MaskWorkflow()
+
+        state = AgentState(
+            messages=[],
+            session_id="test-id",
+            user_query="Test query",
+            needs_search=True,
+            search_queries=["precomputed"]
+        )
+
+        mock_agent = AsyncMock()
+        mock_agent.search_multiple.return_value = []
+
+        with patch('src.core.graph.workflow.get_search_agent', new_callable=AsyncMock) as mock_get_agent:
+            mock_get_agent.return_value = mock_agent
+            await workflow.search_node(state)
+
+            mock_agent.extract_search_queries.assert_not_called()
+            mock_agent.search_multiple.assert_called_once_with(["precomputed"], max_results_per_query=3)
+
     @pytest.mark.asyncio
     async def test_search_node(self):
         """Test search node."""
@@ -129,7 +276,7 @@ class TestMaskWorkflow:
         mock_agent = AsyncMock()
         # Workflow now iterates and calls scrape_url individually
         mock_agent.scrape_url.side_effect = mock_scraped
-        mock_agent.extract_relevant_content.return_value = "Relevant content"
+        mock_agent.extract_relevant_content_many.side_effect = lambda pages, query: ["Relevant content"] * len(pages)
 
         with patch('src.core.graph.workflow.get_scraper_agent', new_callable=AsyncMock) as mock_get_agent:
             mock_get_agent.return_value = mock_agent
@@ -138,6 +285,9 @@ class TestMaskWorkflow:
             assert len(result["scraped_content"]) == 2
             assert result["web_context"]  # Should have content
             assert result["sources"]  # Should have sources
+            # Page bodies are dropped once summarized; the cached originals are untouched
+            assert all(c.content == "" for c in result["scraped_content"])
+            assert mock_scraped[0].content == "Content 1"
 
     @pytest.mark.asyncio
     async def test_scrape_node_no_urls(self):
@@ -179,7 +329,7 @@ class TestMaskWorkflow:
         mock_agent = AsyncMock()
         # Workflow now iterates and calls scrape_url individually
         mock_agent.scrape_url.side_effect = mock_scraped
-        mock_agent.extract_relevant_content.return_value = "Relevant content"
+        mock_agent.extract_relevant_content_many.side_effect = lambda pages, query: ["Relevant content"] * len(pages)
 
         with patch('src.core.graph.workflow.get_scraper_agent', new_callable=AsyncMock) as mock_get_agent:
             mock_get_agent.return_value = mock_agent
@@ -187,7 +337,72 @@ class TestMaskWorkflow:
             result = await workflow.scrape_node(state)
 
             assert len(result["scraped_content"]) == 1 # Only one successful scrape
-            assert mock_agent.extract_relevant_content.call_count == 1
+            pages = mock_agent.extract_relevant_content_many.call_args[0][0]
+            assert [p.url for p in pages] == ["https://example.com/1"]
+
+    @pytest.mark.asyncio
+    async def test_scrape_one_crawls_top_docs_result(self):
+        """Test that only a top-ranked (or direct) documentation URL is crawled."""
+        workflow = MaskWorkflow()
+        page = ScrapedContent(url="https://example.com/docs", title="Docs", content="Content")
+        mock_agent = AsyncMock()
+        mock_agent.crawl.return_value = [page]
+        mock_agent.scrape_url.return_value = page
+
+        assert await workflow._scrape_one(mock_agent, "https://example.com/docs", 0, False) == [page]
+        mock_agent.crawl.assert_called_once_with("https://example.com/docs", max_depth=2, max_pages=8)
+
+        await workflow._scrape_one(mock_agent, "https://example.com/docs", 1, False)
+        await workflow._scrape_one(mock_agent, "https://example.com/blog", 0, True)
+        assert mock_agent.crawl.call_count == 1
+        assert mock_agent.scrape_url.call_count == 2
+
+        await workflow._scrape_one(mock_agent, "https://example.com/docs", 0, False, (1, 3))
+        mock_agent.crawl.assert_called_with("https://example.com/docs", max_depth=1, max_pages=3)
+
+    def test_estimate_crawl_budget(self):
+        """Test that short lookups crawl shallowly and broad requests crawl deep."""
+        assert _estimate_crawl_budget("What is FastAPI?") == (1, 3)
+        assert _estimate_crawl_budget("Show me the full FastAPI docs") == (2, 8)
+        assert _estimate_crawl_budget(
+            "How do dependencies with yield interact with background tasks in FastAPI?"
+        ) == (2, 8)
+
+    @pytest.mark.asyncio
+    async def test_scrape_node_fetches_concurrently(self):
+        """Test that URLs are fetched concurrently and kept in ranking order."""
+        workflow = MaskWorkflow()
+
+        state = AgentState(
+            messages=[],
+            session_id="test-id",
+            user_query="Test query",
+            urls_to_scrape=["https://example.com/1", "https://example.com/2", "https://example.com/3"]
+        )
+
+        in_flight = 0
+        peak = 0
+
+        async def fake_scrape(url):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            if url.endswith("/2"):
+                raise RuntimeError("Connection reset")
+            return ScrapedContent(url=url, title=url[-1], content="Content")
+
+        mock_agent = AsyncMock()
+        mock_agent.scrape_url.side_effect = fake_scrape
+        mock_agent.extract_relevant_content_many.side_effect = lambda pages, query: ["Relevant content"] * len(pages)
+
+        with patch('src.core.graph.workflow.get_scraper_agent', new_callable=AsyncMock) as mock_get_agent:
+            mock_get_agent.return_value = mock_agent
+            result = await workflow.scrape_node(state)
+
+        assert peak == 3
+        assert [c.url for c in result["scraped_content"]] == ["https://example.com/1", "https://example.com/3"]
 
     @pytest.mark.asyncio
     async def test_coordinator_node_with_web_context(self):
@@ -305,6 +520,28 @@ class TestMaskWorkflow:
             assert any(m["role"] == "user" and m["content"] == "User message" for m in messages)
             assert any(m["role"] == "assistant" and m["content"] == "AI response" for m in messages)
 
+    def test_tools_block(self):
+        """Test the tools prompt section with and without registered tools."""
+        tools_json = '[{"name": "get_weather"}]'
+        block = _tools_block(tools_json)
+
+        assert "AVAILABLE TOOLS" in block and tools_json in block
+        assert "IMPORTANT TOOL USAGE RULES" in block
+        assert _tools_block(tools_json) is block
+        assert "AVAILABLE TOOLS" not in _tools_block("[]")
+
+    def test_normalize_message(self):
+        """Test role mapping for LangChain types and dicts; unknown entries are dropped."""
+        class FakeMessage:
+            def __init__(self, type_, content):
+                self.type = type_
+                self.content = content
+
+        assert _normalize_message(FakeMessage("system", "Sys")) == {"role": "system", "content": "Sys"}
+        assert _normalize_message(FakeMessage("tool", "Out")) == {"role": "user", "content": "Out"}
+        assert _normalize_message({"content": "Hi"}) == {"role": "user", "content": "Hi"}
+        assert _normalize_message(42) is None
+
     def test_should_search_routing(self):
         """Test should_search routing logic."""
         workflow = MaskWorkflow()
@@ -340,7 +577,8 @@ class TestMaskWorkflow:
             assert result is not None
             assert workflow.graph is not None
             mock_graph_class.assert_called_once_with(AgentState)
-            assert mock_graph.add_node.call_count == 5  # retrieve, router, search, scrape, coordinator
+            assert mock_graph.add_node.call_count == 4  # router (with retrieve), search, scrape, coordinator
+            mock_graph.set_entry_point.assert_called_once_with("router")
             mock_graph.compile.assert_called_once()
 
     @pytest.mark.asyncio
@@ -359,6 +597,28 @@ class TestMaskWorkflow:
         assert result == "Complete response"
         workflow.graph.ainvoke.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_run_collects_streamed_response(self):
+        """Test that run streams the prepared messages and joins the chunks."""
+        workflow = MaskWorkflow()
+        final_messages = [{"role": "user", "content": "User query"}]
+        workflow.graph = AsyncMock()
+        workflow.graph.ainvoke = AsyncMock(return_value={"final_messages": final_messages})
+
+        async def chat_stream(messages):
+            for piece in ["Complete ", "", "response"]:
+                yield {"message": {"content": piece}}
+
+        mock_llm = Mock()
+        mock_llm.chat_stream = Mock(side_effect=chat_stream)
+
+        with patch('src.core.graph.workflow.get_llm', new_callable=AsyncMock) as mock_get_llm:
+            mock_get_llm.return_value = mock_llm
+            result = await workflow.run("session-id", "User query")
+
+        assert result == "Complete response"
+        mock_llm.chat_stream.assert_called_once_with(final_messages)
+
     @pytest.mark.asyncio
     async def test_run_builds_graph_if_needed(self):
         """Test that run builds graph if not already built."""
@@ -379,6 +639,29 @@ class TestMaskWorkflow:
 
             mock_build.assert_called_once()
 
+    def test_ensure_graph_compiles_once_across_threads(self):
+        """Test that racing threads compile a workflow's graph only once."""
+        import threading
+        workflow = MaskWorkflow()
+        barrier = threading.Barrier(4)
+
+        def build():
+            workflow.graph = Mock()
+            return workflow.graph
+
+        def call():
+            barrier.wait()
+            workflow._ensure_graph()
+
+        with patch.object(workflow, 'build_graph', side_effect=build) as mock_build:
+            threads = [threading.Thread(target=call) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            mock_build.assert_called_once()
+
     @pytest.mark.asyncio
     async def test_stream_workflow(self):
         """Test streaming workflow execution."""
@@ -426,3 +709,26 @@ class TestGetWorkflow:
             mock_build.return_value = Mock()
             get_workflow()
             mock_build.assert_called_once()
+
+    def test_get_workflow_compiles_once_across_threads(self):
+        """Test that concurrent first calls share one compiled workflow."""
+        import threading
+        import src.core.graph.workflow as workflow_module
+        workflow_module._workflow = None
+        barrier = threading.Barrier(8)
+        results = []
+
+        def call():
+            barrier.wait()
+            results.append(get_workflow())
+
+        with patch.object(MaskWorkflow, 'build_graph') as mock_build:
+            threads = [threading.Thread(target=call) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            mock_build.assert_called_once()
+        assert all(w is results[0] for w in results)
+        workflow_module._workflow = None
@@ -0,0 +1,238 @@
+"""Tests for MemoryManager."""
+
+import threading
+import pytest
+from unittest.mock import Mock, AsyncMock, MagicMock, patch
+from src.core.memory.manager import MemoryManager
+
+
+class TestAsyncWrappers:
+    """Test cases for the async wrappers around sync DB calls."""
+
+    @pytest.mark.asyncio
+    async def test_get_session_async(self):
+        """Test that get_session_async delegates to get_session."""
+        manager = MemoryManager()
+        session = Mock(id="session-1")
+        manager.get_session = Mock(return_value=session)
+
+        assert await manager.get_session_async("session-1") is session
+        manager.get_session.assert_called_once_with("session-1")
+
+    @pytest.mark.asyncio
+    async def test_get_project_async(self):
+        """Test that get_project_async delegates to get_project."""
+        manager = MemoryManager()
+        project = Mock(id="project-1")
+        manager.get_project = Mock(return_value=project)
+
+        assert await manager.get_project_async("project-1") is project
+        manager.get_project.assert_called_once_with("project-1")
+
+    @pytest.mark.asyncio
+    async def test_get_messages_async(self):
+        """Test that get_messages_async delegates to get_messages."""
+        manager = MemoryManager()
+        messages = [Mock(role="user", content="Hi")]
+        manager.get_messages = Mock(return_value=messages)
+
+        assert await manager.get_messages_async("session-1") == messages
+        manager.get_messages.assert_called_once_with("session-1")
+
+    @pytest.mark.asyncio
+    async def test_update_messages_async(self):
+        """Test that update_messages_async delegates to update_messages."""
+        manager = MemoryManager()
+        manager.update_messages = Mock()
+        new_history = [{"role": "system", "content": "Summary"}]
+
+        await manager.update_messages_async("session-1", new_history)
+        manager.update_messages.assert_called_once_with("session-1", new_history)
+
+
+class TestHistoryCache:
+    """Test cases for the per-session history cache."""
+
+    def test_get_history_converts_and_caches(self):
+        """Test that history is built once and then served from cache."""
+        manager = MemoryManager()
+        manager.get_messages = Mock(return_value=[Mock(role="user", content="Hi")])
+
+        first = manager.get_history("session-1")
+        second = manager.get_history("session-1")
+
+        assert first == [{"role": "user", "content": "Hi"}]
+        assert second is first
+        manager.get_messages.assert_called_once_with("session-1")
+
+    def test_add_message_invalidates(self):
+        """Test that adding a message drops the cached history."""
+        manager = MemoryManager()
+        manager._history_cache.set("session-1", [{"role": "user", "content": "Hi"}])
+        manager.session_factory = MagicMock()
+
+        manager.add_message("session-1", "assistant", "Hello")
+
+        assert "session-1" not in manager._history_cache
+
+    def test_update_messages_invalidates(self):
+        """Test that replacing messages drops the cached history."""
+        manager = MemoryManager()
+        manager._history_cache.set("session-1", [{"role": "user", "content": "Hi"}])
+        manager.session_factory = MagicMock()
+
+        manager.update_messages("session-1", [{"role": "system", "content": "Summary"}])
+
+        assert "session-1" not in manager._history_cache
+
+    def test_update_messages_bulk_statements(self):
+        """Test that a rewrite is one DELETE plus one batched INSERT, in order."""
+        manager = MemoryManager()
+        manager.session_factory = MagicMock()
+        db = manager.session_factory.begin.return_value.__enter__.return_value
+
+        manager.update_messages("session-1", [
+            {"role": "system", "content": "Summary"},
+            {"role": "user", "content": "Hi"},
+        ])
+
+        assert db.execute.call_count == 2
+        assert db.execute.call_args_list[0].args[0].is_delete
+        insert_stmt, rows = db.execute.call_args_list[1].args
+        assert insert_stmt.is_insert
+        assert [(r["role"], r["content"]) for r in rows] == [("system", "Summary"), ("user", "Hi")]
+        assert rows[0]["created_at"] < rows[1]["created_at"]
+        db.add.assert_not_called()
+
+    def test_invalidated_after_commit(self):
+        """Test that the cache is dropped only once the write's transaction has ended."""
+        manager = MemoryManager()
+        manager._history_cache.set("session-1", [])
+        manager.session_factory = MagicMock()
+        seen_during_write = []
+        manager.session_factory.begin.return_value.__exit__.side_effect = (
+            lambda *args: seen_during_write.append("session-1" in manager._history_cache)
+        )
+
+        manager.add_message("session-1", "user", "Hi")
+
+        assert seen_during_write == [True]
+        assert "session-1" not in manager._history_cache
+
+    def test_read_overlapping_write_not_cached(self):
+        """Test that a history read racing a write doesn't cache pre-commit rows."""
+        manager = MemoryManager()
+        manager.session_factory = MagicMock()
+
+        def read_then_write(session_id):
+            manager.add_message(session_id, "user", "Hi")  # commits mid-read
+            return []
+
+        manager.get_messages = Mock(side_effect=read_then_write)
+
+        assert manager.get_history("session-1") == []
+        assert "session-1" not in manager._history_cache
+
+    def test_cache_is_bounded(self):
+        """Test that the history cache has a size limit."""
+        manager = MemoryManager()
+        assert manager._history_cache.maxsize > 0
+
+    @pytest.mark.asyncio
+    async def test_get_history_async_cache_hit(self):
+        """Test that a cached history is returned without a DB call."""
+        manager = MemoryManager()
+        manager.get_messages = Mock()
+        cached = [{"role": "user", "content": "Hi"}]
+        manager._history_cache.set("session-1", cached)
+
+        assert await manager.get_history_async("session-1") is cached
+        manager.get_messages.assert_not_called()
+
+
+class TestSessionFactory:
+    """Test cases for the pooled session factory."""
+
+    def test_create_project_commits_without_refresh(self):
+        """Test that a write runs in one transaction and keeps the object loaded."""
+        manager = MemoryManager()
+        manager.session_factory = MagicMock()
+        db = manager.session_factory.begin.return_value.__enter__.return_value
+
+        project = manager.create_project("Test", "Description")
+
+        assert project.name == "Test"
+        db.add.assert_called_once_with(project)
+        db.commit.assert_not_called()
+        db.refresh.assert_not_called()
+
+    def test_objects_survive_commit(self):
+        """Test that committed objects aren't expired (no reload on access)."""
+        manager = MemoryManager()
+        assert manager.session_factory.kw["expire_on_commit"] is False
+
+
+class TestProjectChatsSummary:
+    """Test cases for get_project_chats_summary."""
+
+    def test_single_query_grouped_by_chat(self):
+        """Test that the last messages of every chat come from one query."""
+        manager = MemoryManager()
+        manager.get_messages = Mock()
+        manager.session_factory = MagicMock()
+        db = manager.session_factory.return_value.__enter__.return_value
+        db.exec.return_value.all.return_value = [
+            ("chat-1", "Python", "user", "What is a list?"),
+            ("chat-1", "Python", "assistant", "An ordered collection."),
+            ("chat-2", None, "user", "Hi"),
+        ]
+
+        summary = manager.get_project_chats_summary("project-1")
+
+        assert summary == (
+            "--- Chat 'Python' ---\nuser: What is a list?\nassistant: An ordered collection.\n"
+            "\n--- Chat 'chat-2' ---\nuser: Hi\n"
+        )
+        db.exec.assert_called_once()
+        manager.get_messages.assert_not_called()
+
+
+class TestAddMessageAsync:
+    """Test cases for add_message_async."""
+
+    @pytest.mark.asyncio
+    async def test_write_and_embedding_overlap(self):
+        """Test that the embedding starts before the Postgres write returns."""
+        manager = MemoryManager()
+        write_started = threading.Event()
+        embedding_started = threading.Event()
+        message = Mock(id=1)
+
+        def slow_add(session_id, role, content):
+            write_started.set()
+            assert embedding_started.wait(timeout=5)
+            return message
+
+        async def embed(session_id, role, content):
+            embedding_started.set()
+
+        manager.add_message = Mock(side_effect=slow_add)
+        manager._embed_message = AsyncMock(side_effect=embed)
+
+        assert await manager.add_message_async("session-1", "user", "Hi") is message
+        assert write_started.is_set()
+        manager._embed_message.assert_awaited_once_with("session-1", "user", "Hi")
+
+    @pytest.mark.asyncio
+    async def test_embedding_failure_keeps_message(self):
+        """Test that a failed embedding does not fail the chat write."""
+        manager = MemoryManager()
+        message = Mock(id=1)
+        manager.add_message = Mock(return_value=message)
+
+        with patch('src.core.memory.manager.get_llm', new_callable=AsyncMock) as mock_get_llm:
+            mock_get_llm.return_value.embeddings = AsyncMock(side_effect=Exception("Ollama down"))
+            manager.get_session_async = AsyncMock(return_value=None)
+
+            assert await manager.add_message_async("session-1", "assistant", "Hello") is message
+            manager.add_message.assert_called_once_with("session-1", "assistant", "Hello")
@@ -137,3 +137,19 @@ class TestModelValidation:
         session_id = str(uuid.uuid4())
         with pytest.raises(Exception):
             ChatMessage.model_validate({"session_id": session_id, "role": "user"})  # content required
+
+
+class TestIndexes:
+    """Test cases for the indexes backing the hot queries."""
+
+    def test_message_session_created_index(self):
+        """Test the composite index used by get_messages."""
+        columns = {
+            index.name: [c.name for c in index.columns] for index in ChatMessage.__table__.indexes
+        }
+        assert columns["ix_chatmessage_session_id_created_at"] == ["session_id", "created_at"]
+
+    def test_session_indexes(self):
+        """Test the indexes used by project filters and session listing."""
+        indexed = {c.name for index in ChatSession.__table__.indexes for c in index.columns}
+        assert {"project_id", "created_at"} <= indexed
@@ -5,9 +5,15 @@ import pytest_asyncio
 import json
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
 import httpx
+import orjson
 from src.core.llm.ollama_client import OllamaClient, get_llm, ollama_client
 
 
+def _sent_payload(call_args) -> dict:
+    """Decode the JSON body a mocked httpx call was given."""
+    return orjson.loads(call_args.kwargs["content"])
+
+
 class TestOllamaClient:
     """Test cases for OllamaClient."""
 
@@ -21,6 +27,17 @@ class TestOllamaClient:
         assert client.model == mock_settings.OLLAMA_MODEL
         assert isinstance(client.client, httpx.AsyncClient)
 
+    def test_connection_pool_settings(self):
+        """Test that the client keeps a large, long-lived keep-alive pool."""
+        with patch('src.core.llm.ollama_client.httpx.AsyncClient') as mock_async_client:
+            OllamaClient(base_url="http://localhost:11434")
+
+            kwargs = mock_async_client.call_args.kwargs
+            assert kwargs["limits"].max_keepalive_connections == 32
+            assert kwargs["limits"].keepalive_expiry == 60.0
+            assert kwargs["timeout"].connect == 5.0
+            assert kwargs["timeout"].read == 60.0
+
     def test_default_initialization(self):
         """Test Ollama client initialization with defaults."""
         with patch('src.core.llm.ollama_client.settings') as mock_settings:
@@ -48,10 +65,10 @@ class TestOllamaClient:
             mock_post.assert_called_once()
             call_args = mock_post.call_args
             assert call_args[0][0] == "/api/generate"
-            assert call_args[1]["json"]["model"] == client.model
-            assert call_args[1]["json"]["prompt"] == "Test prompt"
-            assert call_args[1]["json"]["system"] == "Test system"
-            assert call_args[1]["json"]["stream"] is False
+            assert _sent_payload(call_args)["model"] == client.model
+            assert _sent_payload(call_args)["prompt"] == "Test prompt"
+            assert _sent_payload(call_args)["system"] == "Test system"
+            assert _sent_payload(call_args)["stream"] is False
 
     @pytest.mark.asyncio
     async def test_generate_with_options(self):
@@ -69,7 +86,39 @@ class TestOllamaClient:
             await client.generate("Prompt", options=options)
 
             call_args = mock_post.call_args
-            assert call_args[1]["json"]["options"] == options
+            assert _sent_payload(call_args)["options"] == options
+
+    @pytest.mark.asyncio
+    async def test_embeddings_cached_per_model_and_text(self):
+        """Test that repeated texts are embedded once per model."""
+        client = OllamaClient()
+        mock_response = Mock()
+        mock_response.json.return_value = {"embedding": [0.1, 0.2]}
+        mock_response.raise_for_status = Mock()
+
+        with patch.object(client.client, 'post', new_callable=AsyncMock, return_value=mock_response) as mock_post:
+            first = await client.embeddings("Hello", model="embed")
+            first.append(0.3)  # callers get their own copy
+            assert await client.embeddings("Hello", model="embed") == [0.1, 0.2]
+            assert mock_post.call_count == 1
+            assert _sent_payload(mock_post.call_args)["prompt"] == "Hello"
+
+            await client.embeddings("Hello", model="other")
+            await client.embeddings("Bye", model="embed")
+            assert mock_post.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_embeddings_empty_not_cached(self):
+        """Test that an empty embedding is retried next time."""
+        client = OllamaClient()
+        mock_response = Mock()
+        mock_response.json.return_value = {}
+        mock_response.raise_for_status = Mock()
+
+        with patch.object(client.client, 'post', new_callable=AsyncMock, return_value=mock_response) as mock_post:
+            assert await client.embeddings("Hello") == []
+            assert await client.embeddings("Hello") == []
+            assert mock_post.call_count == 2
 
     @pytest.mark.asyncio
     async def test_generate_http_error(self):
@@ -107,8 +156,8 @@ class TestOllamaClient:
             mock_post.assert_called_once()
             call_args = mock_post.call_args
             assert call_args[0][0] == "/api/chat"
-            assert call_args[1]["json"]["messages"] == messages
-            assert call_args[1]["json"]["stream"] is False
+            assert _sent_payload(call_args)["messages"] == messages
+            assert _sent_payload(call_args)["stream"] is False
 
     @pytest.mark.asyncio
     async def test_chat_with_options(self):
@@ -126,7 +175,23 @@ class TestOllamaClient:
             await client.chat([{"role": "user", "content": "Hi"}], options=options)
 
             call_args = mock_post.call_args
-            assert call_args[1]["json"]["options"] == options
+            assert _sent_payload(call_args)["options"] == options
+
+    @pytest.mark.asyncio
+    async def test_chat_sends_keep_alive(self):
+        """Test that chat asks Ollama to keep the model loaded."""
+        client = OllamaClient(keep_alive="24h")
+
+        mock_response = MagicMock()
+        mock_response.raise_for_status = Mock()
+        mock_response.json = Mock(return_value={"message": {"content": "Test"}})
+
+        with patch.object(client.client, 'post', new_callable=AsyncMock) as mock_post:
+            mock_post.return_value = mock_response
+
+            await client.chat([{"role": "user", "content": "Hi"}])
+
+            assert _sent_payload(mock_post.call_args)["keep_alive"] == "24h"
 
     @pytest.mark.asyncio
     async def test_chat_stream_success(self):
@@ -158,6 +223,30 @@ class TestOllamaClient:
             assert chunks_collected[1]["message"]["content"] == "world"
             assert chunks_collected[2]["done"] is True
 
+    @pytest.mark.asyncio
+    async def test_chat_stream_raw_messages(self):
+        """Test that pre-encoded messages are spliced into the request body."""
+        client = OllamaClient()
+
+        mock_response = MagicMock()
+        mock_response.raise_for_status = Mock()
+        async def mock_aiter_lines():
+            yield json.dumps({"done": True})
+        mock_response.aiter_lines = mock_aiter_lines
+        mock_response.__aenter__ = AsyncMock(return_value=mock_response)
+        mock_response.__aexit__ = AsyncMock()
+
+        raw = b'[{"role":"user","content":"Hi"}]'
+        with patch.object(client.client, 'stream', return_value=mock_response) as mock_stream:
+            async for _ in client.chat_stream(None, options={"temperature": 0.1}, raw_messages=raw):
+                pass
+
+            body = json.loads(mock_stream.call_args[1]["content"])
+            assert body["messages"] == [{"role": "user", "content": "Hi"}]
+            assert body["stream"] is True
+            assert body["options"] == {"temperature": 0.1}
+            assert "json" not in mock_stream.call_args[1]
+
     @pytest.mark.asyncio
     async def test_chat_stream_ignores_invalid_json(self):
         """Test that chat_stream ignores invalid JSON lines."""
@@ -166,6 +255,8 @@ class TestOllamaClient:
         chunks = [
             json.dumps({"message": {"content": "Valid"}}),
             "invalid json",
+            "",
+            '{"message": {"content": "Trunc',
             json.dumps({"message": {"content": "Also valid"}})
         ]
 
@@ -209,6 +300,24 @@ class TestOllamaClient:
                 async for _ in client.chat_stream([{"role": "user", "content": "Hi"}]):
                     pass
 
+    @pytest.mark.asyncio
+    async def test_warmup_requests_single_token(self):
+        """Test that warmup issues a 1-token chat."""
+        client = OllamaClient()
+
+        with patch.object(client, 'chat', new_callable=AsyncMock) as mock_chat:
+            await client.warmup()
+
+            assert mock_chat.call_args[1]["options"] == {"num_predict": 1}
+
+    @pytest.mark.asyncio
+    async def test_warmup_swallows_errors(self):
+        """Test that warmup never raises when Ollama is unavailable."""
+        client = OllamaClient()
+
+        with patch.object(client, 'chat', new_callable=AsyncMock, side_effect=httpx.ConnectError("refused")):
+            await client.warmup()
+
     @pytest.mark.asyncio
     async def test_close(self):
         """Test client cleanup."""
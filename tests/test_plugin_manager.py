@@ -156,6 +156,19 @@ plugin.on_load = MagicMock()
         captured = capsys.readouterr()
         assert "Failed to load" in captured.out
 
+    def test_fingerprint_changes_with_plugins(self, tmp_path):
+        """Test that the fingerprint changes when a plugin file changes."""
+        manager = PluginManager(plugin_dir=str(tmp_path))
+        empty = manager.fingerprint()
+
+        plugin_dir = tmp_path / "demo"
+        plugin_dir.mkdir()
+        (plugin_dir / "plugin.py").write_text("plugin = None\n")
+        with_plugin = manager.fingerprint()
+
+        assert with_plugin != empty
+        assert manager.fingerprint() == with_plugin
+
     def test_get_all_tools_empty(self):
         """Test getting tools when no plugins loaded."""
         manager = PluginManager()
@@ -0,0 +1,286 @@
+"""Tests for the Qdrant helpers."""
+
+import asyncio
+import hashlib
+import uuid
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+from src.core.database.qdrant import ensure_collection, _BatchedUpserter, store_memory, search_memory, payload_filter, _search_cache, _known_collections, MAX_PAYLOAD_CONTENT
+from src.core.config import settings
+
+
+class TestEnsureCollection:
+    """Test cases for collection creation."""
+
+    @pytest.mark.asyncio
+    async def test_creates_quantized_collection(self):
+        """Test that new collections get int8 scalar quantization kept in RAM."""
+        _known_collections.clear()
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.get_collections = AsyncMock(return_value=Mock(collections=[]))
+            mock_client.return_value.create_collection = AsyncMock()
+
+            assert await ensure_collection("chat_history", 768) is True
+
+            kwargs = mock_client.return_value.create_collection.call_args.kwargs
+            assert kwargs["vectors_config"].size == 768
+            assert kwargs["quantization_config"].scalar.type == "int8"
+            assert kwargs["quantization_config"].scalar.always_ram is True
+            assert kwargs["on_disk_payload"] is True
+            assert kwargs["hnsw_config"] is None
+
+    @pytest.mark.asyncio
+    async def test_hnsw_on_disk(self):
+        """Test moving the HNSW index to disk."""
+        _known_collections.clear()
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.get_collections = AsyncMock(return_value=Mock(collections=[]))
+            mock_client.return_value.create_collection = AsyncMock()
+
+            await ensure_collection("chat_history", 768, hnsw_on_disk=True)
+
+            assert mock_client.return_value.create_collection.call_args.kwargs["hnsw_config"].on_disk is True
+
+    @pytest.mark.asyncio
+    async def test_quantization_can_be_disabled(self):
+        """Test creating a plain float32 collection."""
+        _known_collections.clear()
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.get_collections = AsyncMock(return_value=Mock(collections=[]))
+            mock_client.return_value.create_collection = AsyncMock()
+
+            await ensure_collection("chat_history", 768, quantize=False)
+
+            assert mock_client.return_value.create_collection.call_args.kwargs["quantization_config"] is None
+
+    @pytest.mark.asyncio
+    async def test_known_collection_skips_lookup(self):
+        """Test that a collection seen once is not looked up again."""
+        _known_collections.clear()
+        existing = Mock()
+        existing.name = "chat_history"
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.get_collections = AsyncMock(return_value=Mock(collections=[existing]))
+
+            assert await ensure_collection("chat_history", 768) is False
+            assert await ensure_collection("chat_history", 768) is False
+
+            mock_client.return_value.get_collections.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_failed_write_forgets_collection(self):
+        """Test that a failed upsert makes the next ensure check again."""
+        _known_collections.clear()
+        _known_collections.add("chat_history")
+        upserter = _BatchedUpserter(flush_interval=0.01)
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.upsert = AsyncMock(side_effect=Exception("Not found"))
+            assert await upserter.submit("chat_history", "p1") is False
+            await upserter.close()
+
+        assert "chat_history" not in _known_collections
+
+
+class TestBatchedUpserter:
+    """Test cases for batched point writes."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_points_share_one_upsert(self):
+        """Test that points stored together are written in one call per collection."""
+        upserter = _BatchedUpserter(flush_interval=0.01)
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.upsert = AsyncMock()
+            results = await asyncio.gather(
+                upserter.submit("chat_history", "p1"),
+                upserter.submit("chat_history", "p2"),
+                upserter.submit("semantic_cache", "p3"),
+            )
+            await upserter.close()
+
+        assert results == [True, True, True]
+        calls = {c.kwargs["collection_name"]: c.kwargs["points"] for c in mock_client.return_value.upsert.call_args_list}
+        assert calls == {"chat_history": ["p1", "p2"], "semantic_cache": ["p3"]}
+
+    @pytest.mark.asyncio
+    async def test_batch_size_limit(self):
+        """Test that a batch never exceeds batch_size points."""
+        upserter = _BatchedUpserter(batch_size=2, flush_interval=0.01)
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.upsert = AsyncMock()
+            await asyncio.gather(*(upserter.submit("c", f"p{i}") for i in range(5)))
+            await upserter.close()
+
+        sizes = [len(c.kwargs["points"]) for c in mock_client.return_value.upsert.call_args_list]
+        assert sum(sizes) == 5
+        assert max(sizes) <= 2
+
+    @pytest.mark.asyncio
+    async def test_upsert_failure_reported(self):
+        """Test that every caller in a failed batch gets False."""
+        upserter = _BatchedUpserter(flush_interval=0.01)
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.upsert = AsyncMock(side_effect=Exception("Qdrant down"))
+            results = await asyncio.gather(upserter.submit("c", "p1"), upserter.submit("c", "p2"))
+            await upserter.close()
+
+        assert results == [False, False]
+
+    @pytest.mark.asyncio
+    async def test_close_flushes_batch_in_hand(self):
+        """Test that closing during the flush interval writes the held batch."""
+        upserter = _BatchedUpserter(flush_interval=10)
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.upsert = AsyncMock()
+            pending = asyncio.create_task(upserter.submit("c", "p1"))
+            await asyncio.sleep(0.01)  # the worker now holds p1 and waits
+
+            await asyncio.wait_for(upserter.close(), timeout=1)
+
+            assert await asyncio.wait_for(pending, timeout=1) is True
+            mock_client.return_value.upsert.assert_called_once_with(collection_name="c", points=["p1"])
+
+    @pytest.mark.asyncio
+    async def test_close_flushes_points_queued_behind_batch(self):
+        """Test that points beyond the batch in hand are written too."""
+        upserter = _BatchedUpserter(batch_size=2, flush_interval=10)
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.upsert = AsyncMock()
+            pending = [asyncio.create_task(upserter.submit("c", f"p{i}")) for i in range(5)]
+            await asyncio.sleep(0.01)
+
+            await asyncio.wait_for(upserter.close(), timeout=1)
+
+            assert await asyncio.wait_for(asyncio.gather(*pending), timeout=1) == [True] * 5
+            points = [p for c in mock_client.return_value.upsert.call_args_list for p in c.kwargs["points"]]
+            assert points == [f"p{i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_store_memory_builds_point():
+    """Test that store_memory hands a full point to the batcher."""
+    with patch('src.core.database.qdrant._upserter') as mock_upserter:
+        mock_upserter.submit = AsyncMock(return_value=True)
+
+        assert await store_memory("chat_history", "Hello", {"role": "user"}, [0.1, 0.2]) is True
+
+        collection_name, point = mock_upserter.submit.call_args[0]
+        assert collection_name == "chat_history"
+        assert point.vector == [0.1, 0.2]
+        assert point.payload["content"] == "Hello"
+        assert point.payload["role"] == "user"
+        assert uuid.UUID(point.id).hex == point.id
+
+
+@pytest.mark.asyncio
+async def test_store_memory_trims_payload():
+    """Test that long content is truncated and None metadata dropped."""
+    content = "x" * (MAX_PAYLOAD_CONTENT + 100)
+    with patch('src.core.database.qdrant._upserter') as mock_upserter:
+        mock_upserter.submit = AsyncMock(return_value=True)
+
+        await store_memory("chat_history", content, {"role": "user", "project_id": None}, [0.1, 0.2])
+
+        payload = mock_upserter.submit.call_args[0][1].payload
+        assert len(payload["content"]) == MAX_PAYLOAD_CONTENT
+        assert payload["content_hash"] == hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+        assert "project_id" not in payload
+
+
+class TestSearchCache:
+    """Test cases for the search_memory result cache."""
+
+    @pytest.mark.asyncio
+    async def test_repeated_search_served_from_cache(self):
+        """Test that an identical search skips Qdrant."""
+        _search_cache.clear()
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.query_points = AsyncMock(return_value=Mock(points=["hit"]))
+
+            assert await search_memory("chat_history", [0.1, 0.2], limit=3) == ["hit"]
+            assert await search_memory("chat_history", [0.1, 0.2], limit=3) == ["hit"]
+            assert await search_memory("chat_history", [0.1, 0.2], limit=5) == ["hit"]
+
+            assert mock_client.return_value.query_points.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_write_invalidates_collection(self):
+        """Test that a successful upsert makes cached searches of that collection stale."""
+        _search_cache.clear()
+        upserter = _BatchedUpserter(flush_interval=0.01)
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.query_points = AsyncMock(return_value=Mock(points=[]))
+            mock_client.return_value.upsert = AsyncMock()
+
+            await search_memory("chat_history", [0.1, 0.2])
+            await upserter.submit("chat_history", "p1")
+            await upserter.close()
+            await search_memory("chat_history", [0.1, 0.2])
+
+            assert mock_client.return_value.query_points.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_filter_sent_to_qdrant_and_keyed(self):
+        """Test that payload filters run server-side and get separate cache entries."""
+        _search_cache.clear()
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.query_points = AsyncMock(return_value=Mock(points=[]))
+
+            await search_memory("semantic_cache", [0.4], query_filter=payload_filter(namespace="p1"))
+            await search_memory("semantic_cache", [0.4], query_filter=payload_filter(namespace="p2"))
+
+            calls = mock_client.return_value.query_points.call_args_list
+            assert len(calls) == 2
+            condition = calls[0].kwargs["query_filter"].must[0]
+            assert condition.key == "namespace"
+            assert condition.match.value == "p1"
+            assert calls[0].kwargs["search_params"].hnsw_ef == settings.QDRANT_HNSW_EF
+
+    @pytest.mark.asyncio
+    async def test_errors_not_cached(self):
+        """Test that failed searches are retried."""
+        _search_cache.clear()
+
+        with patch('src.core.database.qdrant._client') as mock_client:
+            mock_client.return_value.query_points = AsyncMock(side_effect=[Exception("Qdrant down"), Mock(points=["hit"])])
+
+            assert await search_memory("chat_history", [0.3]) == []
+            assert await search_memory("chat_history", [0.3]) == ["hit"]
+
+
+class TestInflightLimit:
+    """Test cases for the in-flight request limit."""
+
+    @pytest.mark.asyncio
+    async def test_searches_bounded(self):
+        """Test that concurrent searches never exceed QDRANT_MAX_INFLIGHT."""
+        _search_cache.clear()
+        in_flight = 0
+        peak = 0
+
+        async def query_points(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return Mock(points=[])
+
+        with patch('src.core.database.qdrant._client') as mock_client, \
+             patch('src.core.database.qdrant.settings') as mock_settings, \
+             patch('src.core.database.qdrant._inflight', None):
+            mock_settings.QDRANT_MAX_INFLIGHT = 2
+            mock_client.return_value.query_points = AsyncMock(side_effect=query_points)
+
+            await asyncio.gather(*(search_memory("chat_history", [float(i)]) for i in range(6)))
+
+        assert mock_client.return_value.query_points.call_count == 6
+        assert peak == 2
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import Mock, AsyncMock, patch
+from unittest.mock import Mock, AsyncMock, MagicMock, patch
 from src.core.memory.manager import MemoryManager
 from src.core.memory.models import ChatMessage
 
@@ -11,8 +11,7 @@ class TestRAGFlow:
         
         # Mock dependencies in context manager
         with patch('src.core.memory.manager.get_llm', new_callable=AsyncMock) as mock_get_llm, \
-             patch('src.core.memory.manager.qdrant') as mock_qdrant, \
-             patch('src.core.memory.manager.Session') as mock_session_cls:
+             patch('src.core.memory.manager.qdrant') as mock_qdrant:
             
             # Setup LLM mock
             mock_client = AsyncMock()
@@ -23,13 +22,13 @@ class TestRAGFlow:
             mock_qdrant.ensure_collection = AsyncMock(return_value=True)
             mock_qdrant.store_memory = AsyncMock(return_value=True)
             
-            # Setup Session mock (synchronous DB part)
-            mock_session =  Mock()
-            mock_session_cls.return_value.__enter__.return_value = mock_session
-            mock_session.exec.return_value.all.return_value = [] # for checks
-            
             # Initialize Manager
             manager = MemoryManager()
+            
+            # Setup Session mock (synchronous DB part)
+            manager.session_factory = MagicMock()
+            mock_session = manager.session_factory.begin.return_value.__enter__.return_value
+            mock_session.exec.return_value.all.return_value = [] # for checks
             # Mock get_session internal call
             manager.get_session = Mock(return_value=Mock(project_id="proj-123"))
             
@@ -78,3 +77,5 @@ class TestRAGFlow:
             assert "[user]: Past message" in result
             
             mock_qdrant.search_memory.assert_called_once()
+            mock_qdrant.payload_filter.assert_called_once_with(project_id="proj-123")
+            assert mock_qdrant.search_memory.call_args.kwargs["query_filter"] is mock_qdrant.payload_filter.return_value
@@ -2,10 +2,15 @@
 
 import pytest
 import pytest_asyncio
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
-import httpx
 from bs4 import BeautifulSoup
-from src.core.agents.scraper_agent import ScraperAgent, ScrapedContent, get_scraper_agent
+from tests.conftest import MockAiohttpResponse
+import lxml.html
+import src.core.agents.scraper_agent as scraper_module
+from src.core.agents.scraper_agent import ScraperAgent, ScrapedContent, get_scraper_agent, _find_main_content, _parse_html
 
 
 class TestScrapedContent:
@@ -34,6 +39,80 @@ class TestScrapedContent:
         assert content.error == "Connection failed"
 
 
+class TestFindMainContent:
+    """Test cases for main-content selection."""
+
+    def test_prefers_main_over_earlier_candidates(self):
+        """Test that priority, not document order, picks the element."""
+        tree = lxml.html.fromstring(
+            '<html><body><div class="content">c</div><article>a</article><main>m</main></body></html>'
+        )
+        assert _find_main_content(tree).tag == "main"
+
+    def test_falls_back_to_body(self):
+        """Test fallback to <body> when no better candidate exists."""
+        tree = lxml.html.fromstring('<html><body><div class="contentious">x</div></body></html>')
+        assert _find_main_content(tree).tag == "body"
+
+    def test_no_candidates(self):
+        """Test that documents without a body yield None."""
+        tree = lxml.html.fromstring('<html><head><title>Empty</title></head></html>')
+        assert _find_main_content(tree) is None
+
+
+class TestParseHtml:
+    """Test cases for the pooled HTML parser."""
+
+    def test_parse_html(self):
+        """Test title, text and same-site link extraction in one call."""
+        html = (
+            '<html><head><title> Docs </title></head><body><main><h1>Intro</h1>'
+            '<a href="/next#top">Next</a><a href="https://other.com/x">Out</a></main></body></html>'
+        )
+        result = _parse_html(html, "https://example.com/start", False)
+
+        assert result.title == "Docs"
+        assert result.content.startswith("# Intro")
+        assert result.links == ["https://example.com/next"]
+        assert result.error is None
+
+    def test_parse_html_marks_download_truncation(self):
+        """Test that a cut download is reflected in the content."""
+        result = _parse_html("<html><body><main>Partial</main></body></html>", "https://example.com", True)
+        assert result.content == "Partial...[truncated]"
+
+    def test_parse_html_dedups_link_spellings(self):
+        """Test that spellings of the same page collapse to one link, kept as written."""
+        html = (
+            '<html><body><main><a href="/Docs/">A</a><a href="https://EXAMPLE.com/Docs#intro">B</a>'
+            '<a href="/Docs?page=2">C</a></main></body></html>'
+        )
+        result = _parse_html(html, "https://example.com/", False)
+        assert sorted(result.links) == ["https://example.com/Docs/", "https://example.com/Docs?page=2"]
+
+    def test_parse_html_resolves_against_directory_url(self):
+        """Test that relative links keep the page's trailing-slash directory."""
+        html = '<html><body><main><a href="api">API</a></main></body></html>'
+        result = _parse_html(html, "https://example.com/guide/getting-started/", False)
+        assert result.links == ["https://example.com/guide/getting-started/api"]
+
+    def test_parse_html_resolves_against_final_url(self):
+        """Test that links resolve against the redirect target, not the requested URL."""
+        html = '<html><body><main><a href="api">API</a></main></body></html>'
+        result = _parse_html(html, "https://example.com/old", False, "https://example.com/docs/v2/")
+        assert result.url == "https://example.com/old"
+        assert result.links == ["https://example.com/docs/v2/api"]
+
+    def test_parse_html_skips_non_html_links(self):
+        """Test that links to files are never queued for crawling."""
+        html = (
+            '<html><body><main><a href="/guide">Guide</a><a href="/manual.PDF">PDF</a>'
+            '<a href="/logo.png">Logo</a></main></body></html>'
+        )
+        result = _parse_html(html, "https://example.com", False)
+        assert result.links == ["https://example.com/guide"]
+
+
 class TestScraperAgent:
     """Test cases for ScraperAgent."""
 
@@ -44,21 +123,12 @@ class TestScraperAgent:
         assert "User-Agent" in agent.headers
 
     @pytest.mark.asyncio
-    async def test_scrape_url_success(self, mock_html_content):
+    async def test_scrape_url_success(self, mock_html_content, mock_aiohttp_session):
         """Test successful URL scraping."""
         agent = ScraperAgent()
+        session = mock_aiohttp_session(lambda url: mock_html_content)
 
-        mock_response = Mock()
-        mock_response.raise_for_status = Mock()
-        mock_response.text = mock_html_content
-
-        with patch('httpx.AsyncClient') as mock_client_class:
-            mock_client = AsyncMock()
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock()
-            mock_client.get = AsyncMock(return_value=mock_response)
-            mock_client_class.return_value = mock_client
-
+        with patch.object(agent, '_get_session', return_value=session):
             result = await agent.scrape_url("https://example.com")
 
             assert isinstance(result, ScrapedContent)
@@ -70,128 +140,236 @@ class TestScraperAgent:
             assert result.error is None
 
     @pytest.mark.asyncio
-    async def test_scrape_url_http_error(self):
-        """Test handling of HTTP errors."""
+    async def test_scrape_url_rebuilds_broken_parse_pool(self, mock_html_content, mock_aiohttp_session):
+        """Test that a dead parse worker is replaced once and the parse retried."""
         agent = ScraperAgent()
+        session = mock_aiohttp_session(lambda url: mock_html_content)
+
+        class BrokenPool(ThreadPoolExecutor):
+            def submit(self, *args, **kwargs):
+                future = Future()
+                future.set_exception(BrokenProcessPool("worker died"))
+                return future
+
+        broken = BrokenPool(max_workers=1)
+        with patch.object(agent, '_get_session', return_value=session), \
+             patch.object(scraper_module, '_parse_pool', broken), \
+             patch.object(scraper_module, 'ProcessPoolExecutor',
+                          side_effect=lambda mp_context: ThreadPoolExecutor(max_workers=1)) as factory:
+            result = await agent.scrape_url("https://example.com")
+            rebuilt = scraper_module._parse_pool
 
-        mock_response = Mock()
-        mock_response.raise_for_status = Mock(
-            side_effect=httpx.HTTPStatusError(
-                "404 Not Found",
-                request=httpx.Request("GET", "https://example.com/404"),
-                response=httpx.Response(404, request=httpx.Request("GET", "https://example.com/404"))
-            )
-        )
+        rebuilt.shutdown()
+        assert result.error is None
+        assert result.title == "Test Page"
+        assert rebuilt is not broken
+        factory.assert_called_once()
+        assert factory.call_args.kwargs["mp_context"].get_start_method() in ("forkserver", "spawn")
+
+    @pytest.mark.asyncio
+    async def test_scrape_url_keeps_structure(self, mock_aiohttp_session):
+        """Test that headings and list items keep Markdown markers."""
+        agent = ScraperAgent()
+        html = "<html><body><main><h2>Setup</h2><p>Install <b>it</b>.</p><ul><li>One</li><li>Two</li></ul></main></body></html>"
+        session = mock_aiohttp_session(lambda url: html)
+
+        with patch.object(agent, '_get_session', return_value=session):
+            result = await agent.scrape_url("https://example.com")
+
+            assert result.content.splitlines() == ["## Setup", "Install it.", "- One", "- Two"]
+
+    @pytest.mark.asyncio
+    async def test_scrape_url_uses_cache(self, mock_html_content, mock_aiohttp_session):
+        """Test that a successfully scraped URL is not fetched twice."""
+        agent = ScraperAgent()
+        session = mock_aiohttp_session(lambda url: mock_html_content)
+
+        with patch.object(agent, '_get_session', return_value=session):
+            first = await agent.scrape_url("https://example.com")
+            second = await agent.scrape_url("https://example.com")
+
+            assert first is second
+            session.get.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_session_is_shared(self):
+        """Test that one pooled session serves every scrape."""
+        agent = ScraperAgent()
+
+        with patch('src.core.agents.scraper_agent.aiohttp.TCPConnector') as mock_connector, \
+             patch('src.core.agents.scraper_agent.aiohttp.ClientSession') as mock_session_class:
+            mock_session_class.return_value.closed = False
+
+            assert agent._get_session() is agent._get_session()
+            mock_session_class.assert_called_once()
+            assert mock_connector.call_args.kwargs["limit_per_host"] == 8
+
+    @pytest.mark.asyncio
+    async def test_aclose_closes_session(self, mock_aiohttp_session):
+        """Test that aclose releases the shared HTTP session."""
+        agent = ScraperAgent()
+        session = mock_aiohttp_session(lambda url: "")
+        agent._session = session
 
-        from contextlib import asynccontextmanager
-        @asynccontextmanager
-        async def mock_async_client(*args, **kwargs):
-            mock_client = AsyncMock()
-            mock_client.get = AsyncMock(return_value=mock_response)
-            yield mock_client
+        await agent.aclose()
 
-        with patch('src.core.agents.scraper_agent.httpx.AsyncClient', side_effect=mock_async_client):
+        session.close.assert_called_once()
+        assert agent._session is None
+
+    @pytest.mark.asyncio
+    async def test_scrape_url_http_error(self, mock_aiohttp_session):
+        """Test handling of HTTP errors."""
+        agent = ScraperAgent()
+        session = mock_aiohttp_session(lambda url: MockAiohttpResponse(status=404))
+
+        with patch.object(agent, '_get_session', return_value=session):
             result = await agent.scrape_url("https://example.com/404")
 
             assert result.error == "HTTP 404"
 
     @pytest.mark.asyncio
-    async def test_scrape_url_timeout(self):
+    async def test_scrape_url_timeout(self, mock_aiohttp_session):
         """Test handling of timeout."""
         agent = ScraperAgent()
 
-        from contextlib import asynccontextmanager
-        @asynccontextmanager
-        async def mock_async_client(*args, **kwargs):
-            mock_client = AsyncMock()
-            mock_client.get = AsyncMock(side_effect=httpx.ConnectTimeout("Timeout"))
-            yield mock_client
+        def handler(url):
+            raise asyncio.TimeoutError()
+        session = mock_aiohttp_session(handler)
 
-        with patch('src.core.agents.scraper_agent.httpx.AsyncClient', side_effect=mock_async_client):
+        with patch.object(agent, '_get_session', return_value=session):
             result = await agent.scrape_url("https://example.com")
 
             assert result.error == "Timeout"
 
     @pytest.mark.asyncio
-    async def test_scrape_url_general_error(self):
+    async def test_scrape_url_general_error(self, mock_aiohttp_session):
         """Test handling of general errors."""
         agent = ScraperAgent()
 
-        from contextlib import asynccontextmanager
-        @asynccontextmanager
-        async def mock_async_client(*args, **kwargs):
-            mock_client = AsyncMock()
-            mock_client.get = AsyncMock(side_effect=Exception("Network error"))
-            yield mock_client
+        def handler(url):
+            raise Exception("Network error")
+        session = mock_aiohttp_session(handler)
 
-        with patch('src.core.agents.scraper_agent.httpx.AsyncClient', side_effect=mock_async_client):
+        with patch.object(agent, '_get_session', return_value=session):
             result = await agent.scrape_url("https://example.com")
 
             assert "Network error" in result.error
 
     @pytest.mark.asyncio
-    async def test_scrape_url_no_content(self):
+    async def test_scrape_url_no_content(self, mock_aiohttp_session):
         """Test scraping page with no content."""
         agent = ScraperAgent()
 
         html = "<html><head><title>Empty</title></head></html>"
+        session = mock_aiohttp_session(lambda url: html)
 
-        mock_response = Mock()
-        mock_response.raise_for_status = Mock()
-        mock_response.text = html
-
-        with patch('src.core.agents.scraper_agent.httpx.AsyncClient') as mock_client_class:
-            mock_client = AsyncMock()
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock()
-            mock_client.get = AsyncMock(return_value=mock_response)
-            mock_client_class.return_value = mock_client
-
+        with patch.object(agent, '_get_session', return_value=session):
             result = await agent.scrape_url("https://example.com")
 
             assert result.error == "Could not find content"
 
     @pytest.mark.asyncio
-    async def test_scrape_url_truncates_long_content(self):
+    async def test_scrape_url_truncates_long_content(self, mock_aiohttp_session):
         """Test that long content is truncated."""
         agent = ScraperAgent()
 
         # Create HTML with very long content
         long_text = "A" * 15000
         html = f"<html><body><main>{long_text}</main></body></html>"
+        session = mock_aiohttp_session(lambda url: html)
 
-        mock_response = Mock()
-        mock_response.raise_for_status = Mock()
-        mock_response.text = html
-
-        with patch('httpx.AsyncClient') as mock_client_class:
-            mock_client = AsyncMock()
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock()
-            mock_client.get = AsyncMock(return_value=mock_response)
-            mock_client_class.return_value = mock_client
-
+        with patch.object(agent, '_get_session', return_value=session):
             result = await agent.scrape_url("https://example.com")
 
             assert len(result.content) <= 10000 + len("...[truncated]")
             assert "...[truncated]" in result.content
 
     @pytest.mark.asyncio
-    async def test_scrape_multiple(self, mock_html_content):
-        """Test scraping multiple URLs."""
+    async def test_scrape_url_limits_parsed_html(self, mock_aiohttp_session):
+        """Test that oversized HTML stops downloading at the byte budget."""
+        agent = ScraperAgent()
+
+        html = "<html><body><main><p>Kept</p>" + "<p>Dropped</p>" * 100 + "</main></body></html>"
+        session = mock_aiohttp_session(lambda url: html)
+
+        with patch('src.core.agents.scraper_agent.MAX_HTML_BYTES', 30), \
+             patch.object(agent, '_get_session', return_value=session):
+            result = await agent.scrape_url("https://example.com")
+
+            assert result.content.startswith("Kept")
+            assert "Dropped" not in result.content
+            assert result.content.endswith("...[truncated]")
+
+    @pytest.mark.asyncio
+    async def test_scrape_url_rejects_non_html(self, mock_aiohttp_session):
+        """Test that non-HTML responses are not read or parsed."""
+        agent = ScraperAgent()
+        session = mock_aiohttp_session(
+            lambda url: MockAiohttpResponse("%PDF-1.7", content_type="application/pdf")
+        )
+
+        with patch.object(agent, '_get_session', return_value=session):
+            result = await agent.scrape_url("https://example.com/file.pdf")
+
+            assert result.error == "Unsupported content type: application/pdf"
+
+    @pytest.mark.asyncio
+    async def test_scrape_url_redirect_loop(self, mock_aiohttp_session):
+        """Test that redirect chains are capped and reported."""
+        import aiohttp
+        agent = ScraperAgent()
+
+        def raise_redirects(url):
+            raise aiohttp.TooManyRedirects(request_info=Mock(), history=())
+
+        session = mock_aiohttp_session(raise_redirects)
+
+        with patch.object(agent, '_get_session', return_value=session):
+            result = await agent.scrape_url("https://example.com/loop")
+
+        assert result.error == "Too many redirects"
+        assert session.get.call_args[1]["max_redirects"] == 5
+
+    @pytest.mark.asyncio
+    async def test_scrape_url_revalidates_with_etag(self, mock_aiohttp_session):
+        """Test that an expired page is re-fetched conditionally and a 304 reuses it."""
         agent = ScraperAgent()
+        responses = [
+            MockAiohttpResponse("<html><body><main>Fresh</main></body></html>", headers={"ETag": '"v1"'}),
+            MockAiohttpResponse("", status=304),
+        ]
+        session = mock_aiohttp_session(lambda url: responses.pop(0))
+
+        with patch.object(agent, '_get_session', return_value=session):
+            first = await agent.scrape_url("https://example.com")
+            agent.cache.clear()  # Simulate the TTL expiring
+            second = await agent.scrape_url("https://example.com")
+
+        assert second is first
+        assert session.get.call_args_list[0][1]["headers"] == {}
+        assert session.get.call_args_list[1][1]["headers"] == {"If-None-Match": '"v1"'}
+
+    @pytest.mark.asyncio
+    async def test_scrape_url_content_type_case_insensitive(self, mock_aiohttp_session):
+        """Test that upper-case HTML content types are still accepted."""
+        agent = ScraperAgent()
+        session = mock_aiohttp_session(
+            lambda url: MockAiohttpResponse("<html><body><main>Hi</main></body></html>", content_type="Text/HTML; charset=UTF-8")
+        )
 
-        mock_response = Mock()
-        mock_response.raise_for_status = Mock()
-        mock_response.text = mock_html_content
+        with patch.object(agent, '_get_session', return_value=session):
+            result = await agent.scrape_url("https://example.com")
+
+            assert result.error is None
+            assert result.content == "Hi"
 
-        with patch('src.core.agents.scraper_agent.httpx.AsyncClient') as mock_client_class:
-            mock_client = AsyncMock()
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock()
-            mock_client.get = AsyncMock(return_value=mock_response)
-            mock_client_class.return_value = mock_client
+    @pytest.mark.asyncio
+    async def test_scrape_multiple(self, mock_html_content, mock_aiohttp_session):
+        """Test scraping multiple URLs."""
+        agent = ScraperAgent()
+        session = mock_aiohttp_session(lambda url: mock_html_content)
 
+        with patch.object(agent, '_get_session', return_value=session):
             urls = ["https://example.com/1", "https://example.com/2"]
             results = await agent.scrape_multiple(urls, max_urls=2)
 
@@ -199,40 +377,28 @@ class TestScraperAgent:
             assert all(isinstance(r, ScrapedContent) for r in results)
 
     @pytest.mark.asyncio
-    async def test_scrape_multiple_limits_urls(self, mock_html_content):
+    async def test_scrape_multiple_limits_urls(self, mock_html_content, mock_aiohttp_session):
         """Test that scrape_multiple respects max_urls limit."""
         agent = ScraperAgent()
+        session = mock_aiohttp_session(lambda url: mock_html_content)
 
-        mock_response = Mock()
-        mock_response.raise_for_status = Mock()
-        mock_response.text = mock_html_content
-
-        with patch('src.core.agents.scraper_agent.httpx.AsyncClient') as mock_client_class:
-            mock_client = AsyncMock()
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock()
-            mock_client.get = AsyncMock(return_value=mock_response)
-            mock_client_class.return_value = mock_client
-
+        with patch.object(agent, '_get_session', return_value=session):
             urls = ["https://example.com/1", "https://example.com/2", "https://example.com/3"]
             results = await agent.scrape_multiple(urls, max_urls=2)
 
             assert len(results) == 2
-            assert mock_client.get.call_count == 2
+            assert session.get.call_count == 2
 
     @pytest.mark.asyncio
-    async def test_scrape_multiple_handles_exceptions(self):
+    async def test_scrape_multiple_handles_exceptions(self, mock_aiohttp_session):
         """Test that scrape_multiple handles exceptions gracefully."""
         agent = ScraperAgent()
 
-        from contextlib import asynccontextmanager
-        @asynccontextmanager
-        async def mock_async_client(*args, **kwargs):
-            mock_client = AsyncMock()
-            mock_client.get = AsyncMock(side_effect=Exception("Error"))
-            yield mock_client
+        def handler(url):
+            raise Exception("Error")
+        session = mock_aiohttp_session(handler)
 
-        with patch('src.core.agents.scraper_agent.httpx.AsyncClient', side_effect=mock_async_client):
+        with patch.object(agent, '_get_session', return_value=session):
 
             urls = ["https://example.com/1"]
             results = await agent.scrape_multiple(urls)
@@ -312,6 +478,72 @@ class TestScraperAgent:
             assert len(result) == 1000  # Fallback truncated content
 
 
+    @pytest.mark.asyncio
+    async def test_extract_relevant_content_many_bounded(self):
+        """Test that pages are extracted concurrently, in order, up to the parallel limit."""
+        agent = ScraperAgent()
+        pages = [
+            ScrapedContent(url=f"https://example.com/{i}", title=str(i), content=f"Content {i}")
+            for i in range(5)
+        ]
+        in_flight = 0
+        peak = 0
+
+        async def fake_extract(page, query):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return page.title
+
+        with patch.object(agent, 'extract_relevant_content', side_effect=fake_extract), \
+             patch('src.core.agents.scraper_agent.settings') as mock_settings:
+            mock_settings.OLLAMA_NUM_PARALLEL = 2
+            results = await agent.extract_relevant_content_many(pages, "query")
+
+        assert results == ["0", "1", "2", "3", "4"]
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_extract_relevant_content_many_isolates_failures(self):
+        """Test that one failed extraction doesn't drop the other pages."""
+        agent = ScraperAgent()
+        pages = [
+            ScrapedContent(url=f"https://example.com/{i}", title=str(i), content=f"Content {i}")
+            for i in range(3)
+        ]
+
+        async def fake_extract(page, query):
+            if page.title == "1":
+                raise RuntimeError("LLM unavailable")
+            return page.title
+
+        with patch.object(agent, 'extract_relevant_content', side_effect=fake_extract):
+            results = await agent.extract_relevant_content_many(pages, "query")
+
+        assert results == ["0", "", "2"]
+
+    @pytest.mark.asyncio
+    async def test_extract_relevant_content_many_drops_slow_pages(self):
+        """Test that an extraction over the timeout is dropped, not awaited."""
+        agent = ScraperAgent()
+        pages = [
+            ScrapedContent(url=f"https://example.com/{i}", title=str(i), content=f"Content {i}")
+            for i in range(2)
+        ]
+
+        async def fake_extract(page, query):
+            if page.title == "1":
+                await asyncio.sleep(10)
+            return page.title
+
+        with patch.object(agent, 'extract_relevant_content', side_effect=fake_extract):
+            results = await agent.extract_relevant_content_many(pages, "query", timeout=0.01)
+
+        assert results == ["0", ""]
+
+
 class TestGetScraperAgent:
     """Test cases for get_scraper_agent function."""
 
@@ -3,6 +3,7 @@
 import pytest
 import pytest_asyncio
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
+from ddgs.exceptions import RatelimitException
 from src.core.agents.search_agent import SearchAgent, SearchResult, get_search_agent
 
 
@@ -29,6 +30,10 @@ class TestSearchAgent:
         agent = SearchAgent()
         assert hasattr(agent, 'ddgs')
 
+    def test_agents_share_ddgs_client(self):
+        """Test that all agents reuse the process-wide DDGS client."""
+        assert SearchAgent().ddgs is SearchAgent().ddgs
+
     @pytest.mark.asyncio
     async def test_should_search_returns_true_for_current_events(self):
         """Test that should_search returns True for current events queries."""
@@ -59,6 +64,20 @@ class TestSearchAgent:
             result = await agent.should_search("What is Python?")
             assert result is False
 
+    @pytest.mark.asyncio
+    async def test_should_search_caches_decision(self):
+        """Test that a normalized repeat query reuses the cached decision."""
+        agent = SearchAgent()
+
+        with patch('src.core.agents.search_agent.get_llm', new_callable=AsyncMock) as mock_get_llm:
+            mock_llm = AsyncMock()
+            mock_llm.chat = AsyncMock(return_value={"content": "YES"})
+            mock_get_llm.return_value = mock_llm
+
+            assert await agent.should_search("Latest news") is True
+            assert await agent.should_search("  latest   NEWS ") is True
+            mock_llm.chat.assert_called_once()
+
     @pytest.mark.asyncio
     async def test_should_search_defaults_false_on_error(self):
         """Test that should_search defaults to False on LLM error."""
@@ -167,6 +186,31 @@ class TestSearchAgent:
         assert results[1].title == "Test Result 2"
         agent.ddgs.text.assert_called_once_with("test query", max_results=2)
 
+    @pytest.mark.asyncio
+    async def test_search_uses_cache_for_repeated_query(self, mock_search_results):
+        """Test that a normalized repeat query is served from the cache."""
+        agent = SearchAgent()
+        agent.ddgs = Mock()
+        agent.ddgs.text = Mock(return_value=mock_search_results)
+
+        first = await agent.search("Test Query", max_results=2)
+        second = await agent.search("  test   query ", max_results=2)
+
+        assert [r.url for r in first] == [r.url for r in second]
+        agent.ddgs.text.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_search_does_not_cache_failures(self):
+        """Test that empty results are retried on the next call."""
+        agent = SearchAgent()
+        agent.ddgs = Mock()
+        agent.ddgs.text = Mock(return_value=[])
+
+        await agent.search("test query")
+        await agent.search("test query")
+
+        assert agent.ddgs.text.call_count == 2
+
     @pytest.mark.asyncio
     async def test_search_empty_results(self):
         """Test search with no results."""
@@ -189,6 +233,33 @@ class TestSearchAgent:
 
         assert results == []
 
+    @pytest.mark.asyncio
+    async def test_search_retries_on_ratelimit(self, mock_search_results):
+        """Test that rate limited searches back off and retry."""
+        agent = SearchAgent()
+        agent.ddgs = Mock()
+        agent.ddgs.text = Mock(side_effect=[RatelimitException("202 Ratelimit"), mock_search_results])
+
+        with patch('src.core.agents.search_agent.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            results = await agent.search("test query")
+
+        assert len(results) == len(mock_search_results)
+        assert agent.ddgs.text.call_count == 2
+        mock_sleep.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_search_gives_up_after_retries(self):
+        """Test that persistent rate limiting returns no results."""
+        agent = SearchAgent()
+        agent.ddgs = Mock()
+        agent.ddgs.text = Mock(side_effect=RatelimitException("202 Ratelimit"))
+
+        with patch('src.core.agents.search_agent.asyncio.sleep', new_callable=AsyncMock):
+            results = await agent.search("test query")
+
+        assert results == []
+        assert agent.ddgs.text.call_count == 4
+
     @pytest.mark.asyncio
     async def test_search_multiple_queries(self, mock_search_results):
         """Test searching multiple queries."""
@@ -202,6 +273,25 @@ class TestSearchAgent:
         assert len(results) == 1  # Same results deduplicated
         assert agent.ddgs.text.call_count == 2
 
+    @pytest.mark.asyncio
+    async def test_search_multiple_runs_queries_concurrently(self):
+        """Test that blocking DDGS calls for different queries overlap."""
+        import threading
+        agent = SearchAgent()
+        agent.ddgs = Mock()
+        barrier = threading.Barrier(2, timeout=2)
+
+        def blocking_text(query, max_results):
+            # Only returns if both queries are in flight at the same time
+            barrier.wait()
+            return [{"title": query, "href": f"https://{query}.com", "body": ""}]
+
+        agent.ddgs.text = Mock(side_effect=blocking_text)
+
+        results = await agent.search_multiple(["a", "b"], max_results_per_query=1)
+
+        assert [r.url for r in results] == ["https://a.com", "https://b.com"]
+
     @pytest.mark.asyncio
     async def test_search_multiple_deduplicates(self):
         """Test that search_multiple deduplicates by URL."""
@@ -0,0 +1,167 @@
+"""Tests for the semantic response cache."""
+
+import time
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+from src.core.cache.semantic_cache import SemanticCache, context_key, split_chunks, semantic_cache
+
+
+def _point(namespace, response, timestamp=None, context=""):
+    return Mock(payload={
+        "content": "query",
+        "namespace": namespace,
+        "context": context,
+        "response": response,
+        "timestamp": timestamp if timestamp is not None else time.time()
+    })
+
+
+class TestSemanticCache:
+    """Test cases for SemanticCache."""
+
+    @pytest.mark.asyncio
+    async def test_embed(self):
+        """Test query embedding via the LLM client."""
+        cache = SemanticCache()
+
+        with patch('src.core.cache.semantic_cache.get_llm', new_callable=AsyncMock) as mock_get_llm:
+            mock_llm = AsyncMock()
+            mock_llm.embeddings = AsyncMock(return_value=[0.1, 0.2])
+            mock_get_llm.return_value = mock_llm
+
+            assert await cache.embed("hello") == [0.1, 0.2]
+
+    @pytest.mark.asyncio
+    async def test_embed_error_returns_empty(self):
+        """Test that embedding failures disable the cache for the request."""
+        cache = SemanticCache()
+
+        with patch('src.core.cache.semantic_cache.get_llm', new_callable=AsyncMock) as mock_get_llm:
+            mock_llm = AsyncMock()
+            mock_llm.embeddings = AsyncMock(side_effect=Exception("Ollama down"))
+            mock_get_llm.return_value = mock_llm
+
+            assert await cache.embed("hello") == []
+
+    @pytest.mark.asyncio
+    async def test_lookup_hit(self):
+        """Test a hit within the same namespace."""
+        cache = SemanticCache(threshold=0.9)
+
+        with patch('src.core.cache.semantic_cache.qdrant') as mock_qdrant:
+            mock_qdrant.search_memory = AsyncMock(return_value=[_point("project-1", "Cached answer")])
+
+            result = await cache.lookup([0.1, 0.2], "project-1")
+
+            assert result == "Cached answer"
+            assert mock_qdrant.search_memory.call_args.kwargs["score_threshold"] == 0.9
+            mock_qdrant.payload_filter.assert_called_once_with(namespace="project-1", context="")
+            assert mock_qdrant.search_memory.call_args.kwargs["query_filter"] is mock_qdrant.payload_filter.return_value
+
+    @pytest.mark.asyncio
+    async def test_lookup_ignores_other_namespace(self):
+        """Test that entries from other projects are never returned."""
+        cache = SemanticCache()
+
+        with patch('src.core.cache.semantic_cache.qdrant') as mock_qdrant:
+            mock_qdrant.search_memory = AsyncMock(return_value=[_point("project-2", "Other answer")])
+
+            assert await cache.lookup([0.1, 0.2], "project-1") is None
+
+    @pytest.mark.asyncio
+    async def test_lookup_ignores_other_context(self):
+        """Test that an answer given after a different exchange is not replayed."""
+        cache = SemanticCache()
+
+        with patch('src.core.cache.semantic_cache.qdrant') as mock_qdrant:
+            mock_qdrant.search_memory = AsyncMock(
+                return_value=[_point("project-1", "Other thread", context="abc")]
+            )
+
+            assert await cache.lookup([0.1, 0.2], "project-1", "def") is None
+            mock_qdrant.payload_filter.assert_called_once_with(namespace="project-1", context="def")
+
+    @pytest.mark.asyncio
+    async def test_lookup_ignores_expired(self):
+        """Test that expired entries are treated as misses."""
+        cache = SemanticCache(ttl=60)
+
+        with patch('src.core.cache.semantic_cache.qdrant') as mock_qdrant:
+            mock_qdrant.search_memory = AsyncMock(
+                return_value=[_point("project-1", "Old answer", timestamp=time.time() - 120)]
+            )
+
+            assert await cache.lookup([0.1, 0.2], "project-1") is None
+
+    @pytest.mark.asyncio
+    async def test_lookup_without_embedding(self):
+        """Test that an empty embedding skips the vector search."""
+        cache = SemanticCache()
+
+        with patch('src.core.cache.semantic_cache.qdrant') as mock_qdrant:
+            mock_qdrant.search_memory = AsyncMock()
+
+            assert await cache.lookup([], "project-1") is None
+            mock_qdrant.search_memory.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_store(self):
+        """Test storing a response."""
+        cache = SemanticCache()
+
+        with patch('src.core.cache.semantic_cache.qdrant') as mock_qdrant:
+            mock_qdrant.ensure_collection = AsyncMock()
+            mock_qdrant.store_memory = AsyncMock()
+
+            await cache.store([0.1, 0.2], "project-1", "query", "answer")
+
+            mock_qdrant.ensure_collection.assert_called_once_with("semantic_cache", 2)
+            mock_qdrant.store_memory.assert_called_once_with(
+                "semantic_cache",
+                "query",
+                {"namespace": "project-1", "context": "", "response": "answer"},
+                [0.1, 0.2]
+            )
+
+
+class TestContextKey:
+    """Test cases for context_key."""
+
+    def test_fresh_conversation(self):
+        """Test that a conversation without prior turns has an empty key."""
+        assert context_key([]) == ""
+        assert context_key([{"role": "system", "content": "profile"}]) == ""
+
+    def test_depends_on_last_exchange(self):
+        """Test that only the last user/assistant turns determine the key."""
+        base = [
+            {"role": "user", "content": "List two rivers"},
+            {"role": "assistant", "content": "Nile and Danube"},
+        ]
+        other = [
+            {"role": "user", "content": "List two cities"},
+            {"role": "assistant", "content": "Rome and Oslo"},
+        ]
+        assert context_key(base) != context_key(other)
+        assert context_key(base) == context_key([{"role": "system", "content": "summary"}] + base)
+        assert context_key([{"role": "user", "content": "Earlier"}] + base) == context_key(base)
+
+
+class TestSplitChunks:
+    """Test cases for split_chunks."""
+
+    def test_roundtrip(self):
+        """Test that chunks reassemble to the original text."""
+        text = "The quick brown fox jumps over the lazy dog. " * 10
+        chunks = split_chunks(text, size=40)
+        assert "".join(chunks) == text
+        assert all(len(c) <= 40 for c in chunks)
+
+    def test_empty(self):
+        """Test splitting an empty string."""
+        assert split_chunks("") == []
+
+
+def test_semantic_cache_singleton():
+    """Test that semantic_cache singleton exists."""
+    assert isinstance(semantic_cache, SemanticCache)
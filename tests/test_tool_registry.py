@@ -62,6 +62,44 @@ class TestToolRegistry:
             assert tools[0]["name"] == "tool1"
             assert tools[1]["name"] == "tool2"
 
+    def test_list_tools_is_cached(self, mock_tool):
+        """Test that descriptions are built once until plugins are rediscovered."""
+        registry = ToolRegistry()
+        tool_obj = Tool(**mock_tool)
+
+        with patch.object(registry.manager, 'get_all_tools', return_value=[tool_obj]) as mock_get_all:
+            first = registry.list_tools()
+            first[0]["name"] = "changed"
+            second = registry.list_tools()
+
+            assert second[0]["name"] == "test_tool"
+            assert mock_get_all.call_count == 1
+
+            with patch.object(registry.manager, 'discover_plugins'):
+                registry.initialize()
+            registry.list_tools()
+            assert mock_get_all.call_count == 2
+
+    def test_tools_json_indented_is_cached(self, mock_tool):
+        """Test that the tools JSON is serialized once until plugins are rediscovered."""
+        registry = ToolRegistry()
+
+        tool_obj = Tool(**mock_tool)
+
+        with patch.object(registry.manager, 'get_all_tools', return_value=[tool_obj]) as mock_get_all:
+            first = registry.tools_json_indented
+            second = registry.tools_json_indented
+
+            assert first is second
+            assert '"name": "test_tool"' in first
+            assert mock_get_all.call_count == 1
+
+            with patch.object(registry.manager, 'discover_plugins'):
+                registry.initialize()
+
+            registry.tools_json_indented
+            assert mock_get_all.call_count == 2
+
     @pytest.mark.asyncio
     async def test_call_tool_success(self, mock_tool):
         """Test successfully calling a tool."""
@@ -101,6 +139,107 @@ class TestToolRegistry:
             tool2.handler.assert_called_once_with({"key": "value"})
             tool1.handler.assert_not_called()
 
+    @pytest.mark.asyncio
+    async def test_call_tool_index_built_once(self):
+        """Test that repeated calls don't rescan the plugins."""
+        registry = ToolRegistry()
+
+        tool1 = Tool(name="tool1", description="T1", input_schema={}, handler=AsyncMock())
+        duplicate = Tool(name="tool1", description="T1 again", input_schema={}, handler=AsyncMock())
+
+        with patch.object(registry.manager, 'get_all_tools', return_value=[tool1, duplicate]) as mock_get_all:
+            await registry.call_tool("tool1", {})
+            await registry.call_tool("tool1", {})
+
+            assert mock_get_all.call_count == 1
+            assert tool1.handler.call_count == 2
+            duplicate.handler.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_call_tool_miss_rebuilds_index(self):
+        """Test that a tool loaded after the index was built is still found."""
+        registry = ToolRegistry()
+
+        tool1 = Tool(name="tool1", description="T1", input_schema={}, handler=AsyncMock())
+        tool2 = Tool(name="tool2", description="T2", input_schema={}, handler=AsyncMock())
+
+        with patch.object(registry.manager, 'get_all_tools', return_value=[tool1]):
+            await registry.call_tool("tool1", {})
+
+        with patch.object(registry.manager, 'get_all_tools', return_value=[tool1, tool2]):
+            await registry.call_tool("tool2", {})
+
+        tool2.handler.assert_called_once_with({})
+
+
+class TestToolManifest:
+    """Test cases for the cached tool manifest."""
+
+    def test_initialize_cached_writes_manifest(self, tmp_path, mock_tool):
+        """Test that a cold start discovers plugins and writes the manifest."""
+        registry = ToolRegistry(manifest_path=str(tmp_path / "tools.json"))
+        tool_obj = Tool(**mock_tool)
+
+        with patch.object(registry.manager, 'fingerprint', return_value="abc"), \
+             patch.object(registry.manager, 'discover_plugins') as mock_discover, \
+             patch.object(registry.manager, 'get_all_tools', return_value=[tool_obj]):
+            registry.initialize_cached()
+
+            mock_discover.assert_called_once()
+            assert (tmp_path / "tools.json").exists()
+
+    def test_initialize_cached_uses_fresh_manifest(self, tmp_path, mock_tool):
+        """Test that a matching manifest skips plugin discovery."""
+        manifest_path = str(tmp_path / "tools.json")
+        tool_obj = Tool(**mock_tool)
+
+        writer = ToolRegistry(manifest_path=manifest_path)
+        with patch.object(writer.manager, 'fingerprint', return_value="abc"), \
+             patch.object(writer.manager, 'discover_plugins'), \
+             patch.object(writer.manager, 'get_all_tools', return_value=[tool_obj]):
+            writer.initialize_cached()
+
+        registry = ToolRegistry(manifest_path=manifest_path)
+        with patch.object(registry.manager, 'fingerprint', return_value="abc"), \
+             patch.object(registry.manager, 'discover_plugins') as mock_discover, \
+             patch.object(registry.manager, 'get_all_tools') as mock_get_all:
+            registry.initialize_cached()
+            tools = registry.list_tools()
+
+            mock_discover.assert_not_called()
+            mock_get_all.assert_not_called()
+            assert tools[0]["name"] == "test_tool"
+
+    def test_initialize_cached_rescans_on_change(self, tmp_path):
+        """Test that a stale manifest triggers a full discovery."""
+        manifest_path = tmp_path / "tools.json"
+        manifest_path.write_text('{"fingerprint": "old", "tools": []}')
+        registry = ToolRegistry(manifest_path=str(manifest_path))
+
+        with patch.object(registry.manager, 'fingerprint', return_value="new"), \
+             patch.object(registry.manager, 'discover_plugins') as mock_discover, \
+             patch.object(registry.manager, 'get_all_tools', return_value=[]):
+            registry.initialize_cached()
+
+            mock_discover.assert_called_once()
+            assert '"new"' in manifest_path.read_text()
+
+    @pytest.mark.asyncio
+    async def test_call_tool_loads_plugins_after_manifest_start(self, tmp_path, mock_tool):
+        """Test that calling a tool loads plugins when started from the manifest."""
+        registry = ToolRegistry(manifest_path=str(tmp_path / "tools.json"))
+        registry._manifest = [{"name": "test_tool", "description": "A test tool", "inputSchema": {}}]
+
+        tool_obj = Tool(**mock_tool)
+        tool_obj.handler = AsyncMock(return_value="tool result")
+
+        with patch.object(registry.manager, 'discover_plugins') as mock_discover, \
+             patch.object(registry.manager, 'get_all_tools', return_value=[tool_obj]):
+            result = await registry.call_tool("test_tool", {})
+
+            assert result == "tool result"
+            mock_discover.assert_called_once()
+
 
 class TestToolRegistrySingleton:
     """Test cases for tool_registry singleton."""
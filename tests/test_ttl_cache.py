@@ -0,0 +1,70 @@
+"""Tests for the in-memory TTL cache."""
+
+from unittest.mock import patch
+from src.core.cache.ttl_cache import TTLCache
+
+
+class TestTTLCache:
+    """Test cases for TTLCache."""
+
+    def test_set_and_get(self):
+        """Test storing and reading a value."""
+        cache = TTLCache()
+        cache.set("key", "value")
+        assert cache.get("key") == "value"
+        assert "key" in cache
+        assert len(cache) == 1
+
+    def test_missing_key_returns_default(self):
+        """Test reading a missing key."""
+        cache = TTLCache()
+        assert cache.get("missing") is None
+        assert cache.get("missing", "default") == "default"
+
+    def test_entries_expire(self):
+        """Test that entries are dropped after their TTL."""
+        cache = TTLCache(ttl=10)
+
+        with patch('src.core.cache.ttl_cache.time.monotonic', return_value=100.0):
+            cache.set("key", "value")
+
+        with patch('src.core.cache.ttl_cache.time.monotonic', return_value=105.0):
+            assert cache.get("key") == "value"
+
+        with patch('src.core.cache.ttl_cache.time.monotonic', return_value=111.0):
+            assert cache.get("key") is None
+            assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self):
+        """Test LRU eviction when the cache is full."""
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_pop_and_clear(self):
+        """Test explicit invalidation."""
+        cache = TTLCache()
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        assert cache.pop("a") == 1
+        assert cache.pop("a") is None
+
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_stats(self):
+        """Test hit/miss accounting."""
+        cache = TTLCache()
+        cache.set("key", "value")
+        cache.get("key")
+        cache.get("missing")
+        assert "key" in cache  # Membership checks are not counted
+
+        assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
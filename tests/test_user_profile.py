@@ -1,5 +1,6 @@
 """Tests for User Profile Manager."""
 
+import asyncio
 import pytest
 import pytest_asyncio
 import os
@@ -215,6 +216,83 @@ class TestUserProfileManager:
             assert "My new information" in prompt
 
 
+class TestProfileUpdateQueue:
+    """Test cases for the background profile update queue."""
+
+    @pytest.mark.asyncio
+    async def test_worker_applies_queued_update(self, tmp_path):
+        """Test that queued updates are applied by the worker."""
+        manager = UserProfileManager(file_path=str(tmp_path / "WHO.md"))
+        manager.update_profile = AsyncMock()
+
+        manager.enqueue_update("I like Python")
+        await manager._queue.join()
+
+        manager.update_profile.assert_called_once_with("I like Python")
+        await manager.stop_worker()
+
+    @pytest.mark.asyncio
+    async def test_worker_survives_update_error(self, tmp_path):
+        """Test that a failing update does not stop the worker."""
+        manager = UserProfileManager(file_path=str(tmp_path / "WHO.md"))
+        manager.update_profile = AsyncMock(side_effect=[Exception("LLM down"), None])
+
+        manager.enqueue_update("first")
+        manager.enqueue_update("second")
+        await manager._queue.join()
+
+        assert manager.update_profile.call_count == 2
+        await manager.stop_worker()
+
+    @pytest.mark.asyncio
+    async def test_full_queue_drops_oldest(self, tmp_path):
+        """Test that a full queue drops the oldest pending update."""
+        manager = UserProfileManager(file_path=str(tmp_path / "WHO.md"))
+        manager.update_profile = AsyncMock()
+
+        with patch('src.core.memory.user_profile.UPDATE_QUEUE_SIZE', 2):
+            for text in ("one", "two", "three"):
+                manager.enqueue_update(text)
+
+        assert manager._queue.qsize() == 2
+        await manager._queue.join()
+
+        calls = [c.args[0] for c in manager.update_profile.call_args_list]
+        assert calls == ["two", "three"]
+        await manager.stop_worker()
+
+    def test_new_event_loop_gets_new_queue(self, tmp_path):
+        """Test that updates still apply after the first event loop is gone."""
+        manager = UserProfileManager(file_path=str(tmp_path / "WHO.md"))
+        manager.update_profile = AsyncMock()
+
+        async def enqueue_and_wait(text):
+            manager.enqueue_update(text)
+            await asyncio.wait_for(manager._queue.join(), timeout=1)
+
+        asyncio.run(enqueue_and_wait("first"))
+        asyncio.run(enqueue_and_wait("second"))
+
+        calls = [c.args[0] for c in manager.update_profile.call_args_list]
+        assert calls == ["first", "second"]
+
+    @pytest.mark.asyncio
+    async def test_stop_worker_resets_queue(self, tmp_path):
+        """Test that stopping the worker drops its queue too."""
+        manager = UserProfileManager(file_path=str(tmp_path / "WHO.md"))
+        manager.update_profile = AsyncMock()
+
+        manager.enqueue_update("first")
+        await manager._queue.join()
+        await manager.stop_worker()
+
+        assert manager._queue is None
+        manager.enqueue_update("second")
+        await manager._queue.join()
+        assert manager.update_profile.call_count == 2
+        await manager.stop_worker()
+
+
 class TestUserProfileManagerSingleton:
     """Test cases for user_profile_manager singleton."""
 